@@ -0,0 +1,128 @@
+"""asyncpg access to the shared models, for the ASGI server.
+
+SQLAlchemy 1.3 has no asyncio support, so statements are still built from
+the models in `app.models` as Core selects, then compiled once into
+asyncpg's `$1, $2, ...` form and run on an asyncpg pool. Because each
+shape compiles to one SQL string, asyncpg's per-connection prepared
+statement cache serves every request after the first.
+
+Pool settings come from the `[asyncpg]` section; the connection details
+are the same `POSTGRES_*` variables the threaded server uses.
+"""
+
+import itertools
+import os
+import re
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Sequence
+
+import asyncpg
+import sqlalchemy
+from sqlalchemy.dialects.postgresql import base as postgresql_base
+
+from app import cache
+from app import settings
+
+
+def pool_settings() -> Dict[str, Any]:
+    """`asyncpg.create_pool` arguments from the `[asyncpg]` settings."""
+    return {
+        "min_size": settings.get_int("asyncpg", "min_size", 10),
+        "max_size": settings.get_int("asyncpg", "max_size", 50),
+        "max_queries": settings.get_int("asyncpg", "max_queries", 50000),
+        "max_inactive_connection_lifetime": settings.get_float(
+            "asyncpg", "max_inactive_connection_lifetime", 300
+        ),
+        "command_timeout": settings.get_float(
+            "asyncpg", "command_timeout", 10
+        ),
+        "statement_cache_size": settings.get_int(
+            "asyncpg", "statement_cache_size", 1024
+        ),
+    }
+
+
+class _AsyncpgCompiler(postgresql_base.PGCompiler):
+    def _apply_numbered_params(self) -> None:
+        positions = itertools.count(1)
+        self.string = re.sub(
+            r":\[_POSITION\]",
+            lambda _: f"${next(positions)}",
+            self.string,
+        )
+
+
+class _AsyncpgDialect(postgresql_base.PGDialect):
+    statement_compiler = _AsyncpgCompiler
+
+
+DIALECT = _AsyncpgDialect(paramstyle="numeric")
+
+
+class Statement:
+    """A Core statement compiled once for asyncpg.
+
+    Build it with `sqlalchemy.bindparam()` placeholders and supply their
+    values by name to `args()`; other bound literals keep the values they
+    were compiled with.
+    """
+
+    def __init__(self, statement: sqlalchemy.sql.ClauseElement) -> None:
+        compiled = statement.compile(dialect=DIALECT)
+        self.sql: str = compiled.string
+        self._names: Sequence[str] = compiled.positiontup
+        self._defaults = {
+            name: bind.effective_value
+            for bind, name in compiled.bind_names.items()
+        }
+
+    def args(self, **params: Any) -> List[Any]:
+        """Positional arguments for `sql`."""
+        values = {**self._defaults, **params}
+        return [values[name] for name in self._names]
+
+
+async def _init_connection(connection: asyncpg.Connection) -> None:
+    # UUIDs as strings, like psycopg2 hands them to the threaded server
+    await connection.set_type_codec(
+        "uuid",
+        schema="pg_catalog",
+        encoder=str,
+        decoder=str,
+        format="text",
+    )
+
+
+async def create_pool() -> asyncpg.Pool:
+    """Open the process's asyncpg pool."""
+    return await asyncpg.create_pool(
+        host=os.environ["POSTGRES_HOST"],
+        port=int(os.environ["POSTGRES_PORT"]),
+        user=os.environ["POSTGRES_USER"],
+        password=os.environ["POSTGRES_PASSWORD"],
+        database=os.environ["POSTGRES_DB"],
+        init=_init_connection,
+        **pool_settings(),
+    )
+
+
+async def listen_for_invalidations(
+    pool: asyncpg.Pool,
+) -> asyncpg.Connection:
+    """Apply cache invalidations published by other processes.
+
+    The asyncio counterpart of `cache.InvalidationListener`. Returns the
+    dedicated connection; release it to stop listening.
+    """
+    connection = await pool.acquire()
+    await connection.add_listener(
+        cache.CHANNEL,
+        lambda _conn, _pid, _channel, payload: cache.apply_notification(
+            payload
+        ),
+    )
+    # Anything published while we weren't listening was missed
+    cache.clear_all()
+    return connection
@@ -26,46 +26,90 @@ branch_labels = None
 depends_on = None
 
 
+# Bulk inserts go through plain tables, not app.models, so this revision
+# doesn't change with the model API.
+member_table = sa.table(
+    "member",
+    sa.column("member_uuid"),
+    sa.column("first_name"),
+    sa.column("last_name"),
+    sa.column("address"),
+    sa.column("email"),
+)
+card_table = sa.table(
+    "card",
+    sa.column("id"),
+    sa.column("member_uuid"),
+    sa.column("is_current"),
+    sa.column("date_activated"),
+)
+transactions_table = sa.table(
+    "transactions",
+    sa.column("card_id"),
+    sa.column("amount"),
+    sa.column("merchant"),
+    sa.column("category"),
+    sa.column("transaction_date"),
+)
+
+
 def upgrade():
 
     members = [
-        models.Member(
-            member_uuid=str(uuid.uuid4()),
-            first_name=faker.first_name(),
-            last_name=faker.last_name(),
-            address=faker.street_address(),
-            email=faker.email(),
-        )
+        {
+            "member_uuid": str(uuid.uuid4()),
+            "first_name": faker.first_name(),
+            "last_name": faker.last_name(),
+            "address": faker.street_address(),
+            "email": faker.email(),
+        }
         for _ in range(0, 1000)
     ]
 
-    for member in members:
-        models.Member.put(member)
-
-    cards = []
-    for member in members:
-        card = models.Card(
-            member_uuid=member.member_uuid,
-            is_current=True,
-            date_activated=faker.date(),
+    op.bulk_insert(member_table, members)
+
+    card_ids = [
+        card_id
+        for (card_id,) in op.get_bind().execute(
+            card_table.insert()
+            .values(
+                [
+                    {
+                        "member_uuid": member["member_uuid"],
+                        "is_current": True,
+                        "date_activated": faker.date(),
+                    }
+                    for member in members
+                ]
+            )
+            .returning(card_table.c.id)
         )
-        models.Card.put(card)
-        cards.append(card)
+    ]
 
-    def create_transaction(card_id, start_date=None, end_date=None, amount = None):
+    def build_transaction(card_id, start_date=None, end_date=None, amount = None):
         start_date = start_date or datetime.date(2021, 9, 1)
         end_date = end_date or datetime.date(2021, 9, 30)
-        transaction = models.Transactions(
+        return dict(
             card_id=card_id,
             amount=amount or round(random.uniform(0.00, 1000.00), 2),
             merchant=faker.word(),
             category=faker.word(),
             transaction_date=faker.date_between_dates(start_date, end_date),
         )
-        models.Transactions.put(transaction)
 
-    for card in cards:
-        transactions = [create_transaction(card.id) for _ in range(0, 10)]
+    def create_transaction(*args, **kwargs):
+        models.Transactions.put(
+            models.Transactions(**build_transaction(*args, **kwargs))
+        )
+
+    op.bulk_insert(
+        transactions_table,
+        [
+            build_transaction(card_id)
+            for card_id in card_ids
+            for _ in range(0, 10)
+        ],
+    )
 
     # Here'BlockingIOError()s the bad
     bad_member_uuid = "992a54a8-3d3d-43de-a852-4aa41f16cc27"
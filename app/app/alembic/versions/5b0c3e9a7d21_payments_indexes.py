@@ -0,0 +1,49 @@
+"""payments_indexes
+
+Revision ID: 5b0c3e9a7d21
+Revises: 1956c88bae29
+Create Date: 2026-10-18 09:12:44.318204+00:00
+
+"""
+
+# Ignores alembic style issues
+# pylint: disable=invalid-name, missing-docstring
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "5b0c3e9a7d21"
+down_revision = "1956c88bae29"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_card_member_uuid_is_current",
+            "card",
+            ["member_uuid", "is_current"],
+            postgresql_concurrently=True,
+        )
+        # INCLUDE isn't supported by Index() on our SQLAlchemy version
+        op.execute(
+            "CREATE INDEX CONCURRENTLY "
+            "ix_transactions_card_id_transaction_date "
+            "ON transactions (card_id, transaction_date) INCLUDE (amount)"
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_transactions_card_id_transaction_date",
+            table_name="transactions",
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_card_member_uuid_is_current",
+            table_name="card",
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,70 @@
+"""transactions_keyset_index
+
+Revision ID: 9c4e1b7a2d58
+Revises: d5e7a9c1b342
+Create Date: 2026-10-18 21:14:37.902518+00:00
+
+"""
+
+# Ignores alembic style issues
+# pylint: disable=invalid-name, missing-docstring
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "9c4e1b7a2d58"
+down_revision = "d5e7a9c1b342"
+branch_labels = None
+depends_on = None
+
+OLD_INDEX = "ix_transactions_card_id_transaction_date"
+NEW_INDEX = "ix_transactions_card_id_transaction_date_id"
+INCLUDE = "amount, category, merchant"
+
+
+def _partitions():
+    return [
+        name
+        for (name,) in op.get_bind().execute(
+            "SELECT inhrelid::regclass::text FROM pg_inherits "
+            "WHERE inhparent = 'transactions'::regclass"
+        )
+    ]
+
+
+def _replace_index(old, new, columns, suffix):
+    """Swap index `old` for `new` on `columns`, without blocking writes.
+
+    CONCURRENTLY can't build an index on a partitioned table, so the
+    parent's index is created invalid (ON ONLY) and becomes valid once
+    every partition's, built concurrently, is attached to it. Only the
+    final DROP briefly locks the table.
+    """
+    op.execute(
+        f"CREATE INDEX {new} ON ONLY transactions ({columns}) "
+        f"INCLUDE ({INCLUDE})"
+    )
+    with op.get_context().autocommit_block():
+        for partition in _partitions():
+            child = f"{partition}_{suffix}_idx"
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY {child} "
+                f"ON {partition} ({columns}) INCLUDE ({INCLUDE})"
+            )
+            op.execute(f"ALTER INDEX {new} ATTACH PARTITION {child}")
+    op.execute(f"DROP INDEX {old}")
+
+
+def upgrade():
+    # GET /api/transactions pages by (transaction_date, id) within a card;
+    # with id in the key the index returns rows in page order, and the
+    # keyset condition becomes an index bound rather than a filter.
+    _replace_index(
+        OLD_INDEX, NEW_INDEX, "card_id, transaction_date, id", "keyset"
+    )
+
+
+def downgrade():
+    _replace_index(
+        NEW_INDEX, OLD_INDEX, "card_id, transaction_date", "breakdown"
+    )
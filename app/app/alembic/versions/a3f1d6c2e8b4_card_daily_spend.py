@@ -0,0 +1,150 @@
+"""card_daily_spend
+
+Revision ID: a3f1d6c2e8b4
+Revises: 5b0c3e9a7d21
+Create Date: 2026-10-18 10:41:05.772913+00:00
+
+"""
+
+# Ignores alembic style issues
+# pylint: disable=invalid-name, missing-docstring
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "a3f1d6c2e8b4"
+down_revision = "5b0c3e9a7d21"
+branch_labels = None
+depends_on = None
+
+# The SQL is inlined so this revision doesn't change with app.models.
+
+# Serializes writers per card so a back-dated insert and a same-day insert
+# can't both read a stale prefix sum. The first key namespaces the lock.
+FUNCTIONS = """
+CREATE OR REPLACE FUNCTION card_daily_spend_apply(
+    p_card_id integer, p_day date, p_delta numeric
+) RETURNS void AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(20211001, p_card_id);
+
+    INSERT INTO card_daily_spend AS s
+        (card_id, spend_date, amount, cumulative_amount)
+    VALUES (
+        p_card_id,
+        p_day,
+        p_delta,
+        p_delta + COALESCE((
+            SELECT cumulative_amount FROM card_daily_spend
+            WHERE card_id = p_card_id AND spend_date < p_day
+            ORDER BY spend_date DESC
+            LIMIT 1
+        ), 0)
+    )
+    ON CONFLICT (card_id, spend_date) DO UPDATE
+    SET amount = s.amount + p_delta,
+        cumulative_amount = s.cumulative_amount + p_delta;
+
+    UPDATE card_daily_spend
+    SET cumulative_amount = cumulative_amount + p_delta
+    WHERE card_id = p_card_id AND spend_date > p_day;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION card_daily_spend_trigger() RETURNS trigger AS $$
+BEGIN
+    -- Moving a row to another card locks both; take the lower card id
+    -- first so two moves in opposite directions can't deadlock.
+    IF TG_OP = 'UPDATE' AND OLD.card_id <> NEW.card_id THEN
+        PERFORM pg_advisory_xact_lock(
+            20211001, LEAST(OLD.card_id, NEW.card_id)
+        );
+        PERFORM pg_advisory_xact_lock(
+            20211001, GREATEST(OLD.card_id, NEW.card_id)
+        );
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM card_daily_spend_apply(
+            OLD.card_id, OLD.transaction_date::date, -OLD.amount
+        );
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM card_daily_spend_apply(
+            NEW.card_id, NEW.transaction_date::date, NEW.amount
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+TRIGGER = """
+CREATE TRIGGER transactions_card_daily_spend
+AFTER INSERT OR DELETE OR UPDATE OF card_id, amount, transaction_date
+ON transactions
+FOR EACH ROW EXECUTE FUNCTION card_daily_spend_trigger()
+"""
+
+REBUILD = [
+    "LOCK TABLE transactions IN SHARE MODE",
+    "DELETE FROM card_daily_spend",
+    """
+INSERT INTO card_daily_spend (card_id, spend_date, amount, cumulative_amount)
+SELECT card_id,
+       spend_date,
+       amount,
+       SUM(amount) OVER (PARTITION BY card_id ORDER BY spend_date)
+FROM (
+    SELECT card_id, transaction_date::date AS spend_date, SUM(amount) AS amount
+    FROM transactions
+    GROUP BY card_id, transaction_date::date
+) AS daily
+""",
+]
+
+
+def upgrade():
+    op.create_table(
+        "card_daily_spend",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(),
+            server_default=sa.text("now()"),
+            nullable=True,
+        ),
+        sa.Column("card_id", sa.Integer(), nullable=False),
+        sa.Column("spend_date", sa.Date(), nullable=False),
+        sa.Column("amount", sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.Column(
+            "cumulative_amount",
+            sa.Numeric(precision=16, scale=2),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(
+            ["card_id"],
+            ["card.id"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "card_id", "spend_date", name="uq_card_daily_spend_card_id_date"
+        ),
+    )
+    op.execute(FUNCTIONS)
+    op.execute(TRIGGER)
+
+    # Backfill; the rebuild holds a SHARE lock on transactions so no rows
+    # land between the trigger going live and the snapshot being summed.
+    for statement in REBUILD:
+        op.execute(statement)
+
+
+def downgrade():
+    op.execute(
+        "DROP TRIGGER IF EXISTS transactions_card_daily_spend ON transactions"
+    )
+    op.execute("DROP FUNCTION IF EXISTS card_daily_spend_trigger()")
+    op.execute(
+        "DROP FUNCTION IF EXISTS card_daily_spend_apply(integer, date, numeric)"
+    )
+    op.drop_table("card_daily_spend")
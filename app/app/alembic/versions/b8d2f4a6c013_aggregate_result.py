@@ -0,0 +1,43 @@
+"""aggregate_result
+
+Revision ID: b8d2f4a6c013
+Revises: f1b6d3a8c529
+Create Date: 2026-10-18 17:48:26.114092+00:00
+
+"""
+
+# Ignores alembic style issues
+# pylint: disable=invalid-name, missing-docstring
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "b8d2f4a6c013"
+down_revision = "f1b6d3a8c529"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "aggregate_result",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(),
+            server_default=sa.text("now()"),
+            nullable=True,
+        ),
+        sa.Column("name", sa.String(length=64), nullable=False),
+        sa.Column("key", sa.String(length=255), nullable=False),
+        sa.Column("value", sa.Text(), nullable=False),
+        sa.Column("computed_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "name", "key", name="uq_aggregate_result_name_key"
+        ),
+    )
+
+
+def downgrade():
+    op.drop_table("aggregate_result")
@@ -0,0 +1,143 @@
+"""partition_transactions
+
+Revision ID: c7e2b9d4f1a6
+Revises: a3f1d6c2e8b4
+Create Date: 2026-10-18 13:05:27.481630+00:00
+
+"""
+
+# Ignores alembic style issues
+# pylint: disable=invalid-name, missing-docstring
+import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "c7e2b9d4f1a6"
+down_revision = "a3f1d6c2e8b4"
+branch_labels = None
+depends_on = None
+
+# The SQL is inlined so this revision doesn't change with app.models or
+# app.partitions.
+
+COLUMNS = (
+    "id, created_at, card_id, amount, merchant, category, transaction_date"
+)
+
+TRIGGER = """
+CREATE TRIGGER transactions_card_daily_spend
+AFTER INSERT OR DELETE OR UPDATE OF card_id, amount, transaction_date
+ON transactions
+FOR EACH ROW EXECUTE FUNCTION card_daily_spend_trigger()
+"""
+
+# Monthly partitions created past the current month
+MONTHS_AHEAD = 3
+
+
+def _add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def _create_partitions(first):
+    """Monthly partitions from `first`'s month to MONTHS_AHEAD past today."""
+    today = datetime.date.today()
+    month = (first or today).replace(day=1)
+    last = _add_months(today.replace(day=1), MONTHS_AHEAD)
+    while month <= last:
+        end = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE transactions_y{month.year:04d}m{month.month:02d} "
+            f"PARTITION OF transactions "
+            f"FOR VALUES FROM ('{month}') TO ('{end}')"
+        )
+        month = end
+
+
+def _set_aside(name):
+    """Rename the current transactions table and its indexes out of the way."""
+    op.execute(
+        "DROP TRIGGER IF EXISTS transactions_card_daily_spend ON transactions"
+    )
+    op.rename_table("transactions", name)
+    op.execute(f"ALTER INDEX transactions_pkey RENAME TO {name}_pkey")
+    op.execute(
+        "ALTER INDEX ix_transactions_card_id_transaction_date "
+        f"RENAME TO ix_{name}_card_id_transaction_date"
+    )
+
+
+def _create_transactions(primary_key, **kwargs):
+    op.create_table(
+        "transactions",
+        sa.Column(
+            "id",
+            sa.Integer(),
+            server_default=sa.text("nextval('transactions_id_seq')"),
+            nullable=False,
+        ),
+        sa.Column(
+            "created_at",
+            sa.DateTime(),
+            server_default=sa.text("now()"),
+            nullable=True,
+        ),
+        sa.Column("card_id", sa.Integer(), nullable=False),
+        sa.Column("amount", sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.Column("merchant", sa.String(length=255), nullable=True),
+        sa.Column("category", sa.String(length=255), nullable=True),
+        sa.Column("transaction_date", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["card_id"],
+            ["card.id"],
+        ),
+        sa.PrimaryKeyConstraint(*primary_key),
+        **kwargs,
+    )
+    op.execute("ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id")
+
+
+def _finish(old_name):
+    op.execute(
+        f"INSERT INTO transactions ({COLUMNS}) "
+        f"SELECT {COLUMNS} FROM {old_name}"
+    )
+    op.drop_table(old_name)
+    # INCLUDE isn't supported by Index() on our SQLAlchemy version
+    op.execute(
+        "CREATE INDEX ix_transactions_card_id_transaction_date "
+        "ON transactions (card_id, transaction_date) INCLUDE (amount)"
+    )
+    # Created after the copy: card_daily_spend already covers these rows
+    op.execute(TRIGGER)
+    op.execute("ANALYZE transactions")
+
+
+def upgrade():
+    # Rewrites the table under an ACCESS EXCLUSIVE lock; run it in a
+    # maintenance window.
+    _set_aside("transactions_unpartitioned")
+    _create_transactions(
+        ["id", "transaction_date"],
+        postgresql_partition_by="RANGE (transaction_date)",
+    )
+
+    connection = op.get_bind()
+    first = connection.execute(
+        "SELECT min(transaction_date) FROM transactions_unpartitioned"
+    ).scalar()
+    op.execute(
+        "CREATE TABLE transactions_default PARTITION OF transactions DEFAULT"
+    )
+    _create_partitions(first and first.date())
+
+    _finish("transactions_unpartitioned")
+
+
+def downgrade():
+    _set_aside("transactions_partitioned")
+    _create_transactions(["id"])
+    _finish("transactions_partitioned")
@@ -0,0 +1,111 @@
+"""spend_breakdown
+
+Revision ID: d5e7a9c1b342
+Revises: b8d2f4a6c013
+Create Date: 2026-10-18 19:06:51.270418+00:00
+
+"""
+
+# Ignores alembic style issues
+# pylint: disable=invalid-name, missing-docstring
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "d5e7a9c1b342"
+down_revision = "b8d2f4a6c013"
+branch_labels = None
+depends_on = None
+
+INDEX = "ix_transactions_card_id_transaction_date"
+WIDE_INDEX = f"{INDEX}_wide"
+COLUMNS = "(card_id, transaction_date)"
+
+# The SQL is inlined so this revision doesn't change with app.models.
+
+# Publishes the members whose transactions a statement changed, so every
+# process drops their cached spend breakdowns
+NOTIFY_FUNCTION = """
+CREATE OR REPLACE FUNCTION spend_breakdown_notify() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM pg_notify('model_cache', 'spend_breakdown:' || member_uuid)
+        FROM (
+            SELECT DISTINCT card.member_uuid
+            FROM new_rows JOIN card ON card.id = new_rows.card_id
+        ) AS changed;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM pg_notify('model_cache', 'spend_breakdown:' || member_uuid)
+        FROM (
+            SELECT DISTINCT card.member_uuid
+            FROM old_rows JOIN card ON card.id = old_rows.card_id
+        ) AS changed;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+# A trigger with transition tables takes a single event, hence three
+NOTIFY_TRIGGERS = {
+    "insert": "REFERENCING NEW TABLE AS new_rows",
+    "update": "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    "delete": "REFERENCING OLD TABLE AS old_rows",
+}
+
+
+def _partitions():
+    return [
+        name
+        for (name,) in op.get_bind().execute(
+            "SELECT inhrelid::regclass::text FROM pg_inherits "
+            "WHERE inhparent = 'transactions'::regclass"
+        )
+    ]
+
+
+def _replace_index(include, suffix):
+    """Swap INDEX for one with `include`, built without blocking writes.
+
+    CONCURRENTLY can't build an index on a partitioned table, so the
+    parent's index is created invalid (ON ONLY) and becomes valid once
+    every partition's, built concurrently, is attached to it. Only the
+    final DROP briefly locks the table.
+    """
+    op.execute(
+        f"CREATE INDEX {WIDE_INDEX} ON ONLY transactions {COLUMNS} "
+        f"INCLUDE ({include})"
+    )
+    with op.get_context().autocommit_block():
+        for partition in _partitions():
+            child = f"{partition}_{suffix}_idx"
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY {child} "
+                f"ON {partition} {COLUMNS} INCLUDE ({include})"
+            )
+            op.execute(f"ALTER INDEX {WIDE_INDEX} ATTACH PARTITION {child}")
+    op.execute(f"DROP INDEX {INDEX}")
+    op.execute(f"ALTER INDEX {WIDE_INDEX} RENAME TO {INDEX}")
+
+
+def upgrade():
+    op.execute(NOTIFY_FUNCTION)
+    for event, referencing in NOTIFY_TRIGGERS.items():
+        op.execute(
+            f"CREATE TRIGGER transactions_spend_breakdown_notify_{event} "
+            f"AFTER {event.upper()} ON transactions {referencing} "
+            "FOR EACH STATEMENT EXECUTE FUNCTION spend_breakdown_notify()"
+        )
+    # Lets the breakdown's GROUPING SETS read only the index
+    _replace_index("amount, category, merchant", "breakdown")
+
+
+def downgrade():
+    _replace_index("amount", "amount")
+    for event in NOTIFY_TRIGGERS:
+        op.execute(
+            "DROP TRIGGER IF EXISTS "
+            f"transactions_spend_breakdown_notify_{event} ON transactions"
+        )
+    op.execute("DROP FUNCTION IF EXISTS spend_breakdown_notify()")
@@ -0,0 +1,39 @@
+"""ingest_key
+
+Revision ID: e4a8c1f7b203
+Revises: c7e2b9d4f1a6
+Create Date: 2026-10-18 15:22:48.903117+00:00
+
+"""
+
+# Ignores alembic style issues
+# pylint: disable=invalid-name, missing-docstring
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "e4a8c1f7b203"
+down_revision = "c7e2b9d4f1a6"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "ingest_key",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(),
+            server_default=sa.text("now()"),
+            nullable=True,
+        ),
+        sa.Column("idempotency_key", sa.String(length=255), nullable=False),
+        sa.Column("transaction_count", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("idempotency_key"),
+    )
+
+
+def downgrade():
+    op.drop_table("ingest_key")
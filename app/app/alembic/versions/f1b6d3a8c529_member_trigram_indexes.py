@@ -0,0 +1,45 @@
+"""member_trigram_indexes
+
+Revision ID: f1b6d3a8c529
+Revises: e4a8c1f7b203
+Create Date: 2026-10-18 16:41:07.552930+00:00
+
+"""
+
+# Ignores alembic style issues
+# pylint: disable=invalid-name, missing-docstring
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "f1b6d3a8c529"
+down_revision = "e4a8c1f7b203"
+branch_labels = None
+depends_on = None
+
+COLUMNS = ("first_name", "last_name", "email")
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        for column in COLUMNS:
+            op.create_index(
+                f"ix_member_{column}_trgm",
+                "member",
+                [column],
+                postgresql_using="gin",
+                postgresql_ops={column: "gin_trgm_ops"},
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for column in COLUMNS:
+            op.drop_index(
+                f"ix_member_{column}_trgm",
+                table_name="member",
+                postgresql_concurrently=True,
+            )
@@ -0,0 +1,276 @@
+"""ASGI entry point: `/api/member` and `/api/payments` on asyncio.
+
+Serves the same contract as the threaded server in `app.main`, but each
+request waits on the database as a coroutine instead of holding an OS
+thread, using the asyncpg pool from `app.aiodb`. Statements come from the
+shared models and are compiled once at import.
+
+Install the `asgi` extra, then run:
+```bash
+% uvicorn app.asgi:app --host 0.0.0.0 --port 8080 --workers 4
+```
+"""
+
+import contextlib
+import datetime
+import decimal
+import json
+import logging
+import uuid
+from typing import Any
+from typing import AsyncIterator
+from typing import Dict
+from typing import Optional
+
+import orjson
+import sqlalchemy
+from starlette import applications
+from starlette import requests
+from starlette import responses
+from starlette import routing
+
+from app import aiodb
+from app import cache
+from app import logconfig
+from app import models
+from app import serializers
+
+LOG = logging.getLogger(__name__)
+
+
+def _param(
+    name: str, type_: Any = None
+) -> sqlalchemy.sql.expression.BindParameter:
+    return sqlalchemy.bindparam(name, type_=type_)
+
+
+# Window bounds are timestamps: asyncpg encodes by the column's type
+_START = _param("start", sqlalchemy.DateTime)
+_END = _param("end", sqlalchemy.DateTime)
+
+MEMBER_ROW = aiodb.Statement(
+    models.Member.member_row_select(_param("member_uuid"))
+)
+INSERT_MEMBER = aiodb.Statement(
+    models.Member.__table__.insert(inline=True).values(
+        member_uuid=_param("member_uuid"),
+        first_name=_param("first_name"),
+        last_name=_param("last_name"),
+        address=_param("address"),
+    )
+)
+NOTIFY = aiodb.Statement(
+    sqlalchemy.select(
+        [sqlalchemy.func.pg_notify(cache.CHANNEL, _param("payload"))]
+    )
+)
+ROLLUP_MONTH_TO_DATE = aiodb.Statement(
+    models.CardDailySpend.month_to_date_select(
+        _param("member_uuid"), _START, _END
+    )
+)
+RAW_MONTH_TO_DATE = aiodb.Statement(
+    models.Transactions.month_to_date_select(
+        _param("member_uuid"), _START, _END
+    )
+)
+
+_UNCACHED = object()
+
+_MISSING = (
+    "Missing required parameter in the JSON body or the post body or the "
+    "query string"
+)
+
+
+class BadRequest(Exception):
+    """An argument is missing or malformed; answered with 400."""
+
+    def __init__(self, name: str, message: str) -> None:
+        super().__init__(message)
+        self.name = name
+        self.message = message
+
+
+def _json(data: Any, status_code: int = 200) -> responses.Response:
+    return responses.Response(
+        serializers.dumps(data),
+        status_code=status_code,
+        media_type="application/json",
+    )
+
+
+async def _arguments(request: requests.Request) -> Dict[str, Any]:
+    """Query string and JSON body arguments, as reqparse reads them."""
+    arguments: Dict[str, Any] = dict(request.query_params)
+    body = await request.body()
+    if body:
+        try:
+            parsed = orjson.loads(body)
+        except orjson.JSONDecodeError as error:
+            raise BadRequest("body", "Failed to decode JSON object") from error
+        if isinstance(parsed, dict):
+            arguments.update(parsed)
+    return arguments
+
+
+def _required(arguments: Dict[str, Any], name: str) -> Any:
+    value = arguments.get(name)
+    if value is None:
+        raise BadRequest(name, _MISSING)
+    return value
+
+
+def _uuid(arguments: Dict[str, Any], name: str) -> str:
+    """A UUID argument in canonical form, like `payments.canonical_uuid`."""
+    value = _required(arguments, name)
+    if not isinstance(value, str):
+        raise BadRequest(name, f"{value!r} is not a UUID")
+    try:
+        return str(uuid.UUID(value))
+    except ValueError as error:
+        raise BadRequest(name, f"{value!r} is not a UUID") from error
+
+
+def _date(arguments: Dict[str, Any], name: str) -> datetime.date:
+    value = _required(arguments, name)
+    try:
+        return datetime.date.fromisoformat(str(value))
+    except ValueError as error:
+        raise BadRequest(name, f"Invalid date: {value}") from error
+
+
+def _boolean(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    if str(value).lower() in ("true", "1"):
+        return True
+    if str(value).lower() in ("false", "0"):
+        return False
+    raise BadRequest("verify", f"Invalid literal for boolean(): {value}")
+
+
+async def get_member(request: requests.Request) -> responses.Response:
+    """Async `MemberResource.get`."""
+    member_uuid = _uuid(await _arguments(request), "member_uuid")
+    models.LOOKUP_LOG.info("Getting member: %s", member_uuid)
+    member = models.Member.__cache__.get(member_uuid, _UNCACHED)
+    if member is _UNCACHED:
+        generation = models.Member.__cache__.generation(member_uuid)
+        row = await request.app.state.pool.fetchrow(
+            MEMBER_ROW.sql, *MEMBER_ROW.args(member_uuid=member_uuid)
+        )
+        member = (
+            None
+            if row is None
+            else serializers.serializer_for(models.Member).row(row)
+        )
+        models.Member.__cache__.set(member_uuid, member, generation)
+    return _json({} if member is None else member)
+
+
+async def post_member(request: requests.Request) -> responses.Response:
+    """Async `MemberResource.post`."""
+    arguments = await _arguments(request)
+    member_uuid = str(uuid.uuid4())
+    values = {
+        "member_uuid": member_uuid,
+        "first_name": _required(arguments, "first_name"),
+        "last_name": _required(arguments, "last_name"),
+        "address": arguments.get("address"),
+    }
+    async with request.app.state.pool.acquire() as connection:
+        async with connection.transaction():
+            await connection.execute(
+                INSERT_MEMBER.sql, *INSERT_MEMBER.args(**values)
+            )
+            await connection.execute(
+                NOTIFY.sql,
+                *NOTIFY.args(
+                    payload=f"{models.Member.__cache__.name}:{member_uuid}"
+                ),
+            )
+    models.Member.__cache__.invalidate(member_uuid)
+    return _json(member_uuid)
+
+
+async def _month_to_date(
+    pool: Any,
+    statement: aiodb.Statement,
+    member_uuid: str,
+    date: datetime.date,
+) -> Optional[decimal.Decimal]:
+    start = datetime.datetime(date.year, date.month, 1)
+    end = datetime.datetime(date.year, date.month, date.day)
+    cards, total = await pool.fetchrow(
+        statement.sql,
+        *statement.args(
+            member_uuid=member_uuid,
+            start=start,
+            end=end + datetime.timedelta(days=1),
+        ),
+    )
+    return total if cards else None
+
+
+async def get_payments(request: requests.Request) -> responses.Response:
+    """Async `PaymentsResource.get`."""
+    arguments = await _arguments(request)
+    member_uuid = _uuid(arguments, "member_uuid")
+    date = _date(arguments, "date")
+    pool = request.app.state.pool
+
+    total_amount = await _month_to_date(
+        pool, ROLLUP_MONTH_TO_DATE, member_uuid, date
+    )
+    if _boolean(arguments.get("verify", False)):
+        raw_amount = await _month_to_date(
+            pool, RAW_MONTH_TO_DATE, member_uuid, date
+        )
+        if raw_amount != total_amount:
+            LOG.warning(
+                f"card_daily_spend mismatch for member {member_uuid}: "
+                f"rollup={total_amount} raw={raw_amount}"
+            )
+        total_amount = raw_amount
+
+    if total_amount is not None:
+        return _json(json.dumps(float(total_amount)))
+    return _json({})
+
+
+async def bad_request(
+    _request: requests.Request, error: BadRequest
+) -> responses.Response:
+    """Answer like flask_restful's reqparse does."""
+    return _json({"message": {error.name: error.message}}, 400)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(asgi_app: applications.Starlette) -> AsyncIterator[None]:
+    """Open the pool and cache listener for the life of the process."""
+    asgi_app.state.pool = await aiodb.create_pool()
+    listener = await aiodb.listen_for_invalidations(asgi_app.state.pool)
+    try:
+        yield
+    finally:
+        await asgi_app.state.pool.release(listener)
+        await asgi_app.state.pool.close()
+
+
+def create_app() -> applications.Starlette:
+    """Build the ASGI application."""
+    return applications.Starlette(
+        routes=[
+            routing.Route("/api/member", get_member, methods=["GET"]),
+            routing.Route("/api/member", post_member, methods=["POST"]),
+            routing.Route("/api/payments", get_payments, methods=["GET"]),
+        ],
+        exception_handlers={BadRequest: bad_request},
+        lifespan=lifespan,
+    )
+
+
+logconfig.configure()
+
+app = create_app()  # pylint: disable=invalid-name
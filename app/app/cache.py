@@ -0,0 +1,310 @@
+"""In-process caching for hot model lookups.
+
+Each process keeps its own bounded LRU/TTL caches. Writes made through
+`models.Base.put` invalidate the local entry and publish the key with
+Postgres `NOTIFY`; every process runs an `InvalidationListener` that
+`LISTEN`s on the same channel and drops its copy.
+"""
+
+import collections
+import logging
+import select
+import threading
+import time
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Hashable
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+import sqlalchemy
+from sqlalchemy import orm
+
+from app import settings
+
+LOG = logging.getLogger(__name__)
+
+CHANNEL = "model_cache"
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Bounded, thread-safe LRU cache with a per-entry TTL.
+
+    Loaders read the database before storing what they read, so an
+    invalidation can land in between. Each key has a generation that
+    `invalidate` bumps (and `clear` bumps for every key): take it with
+    `generation()` before reading and pass it to `set()`, which then drops
+    the value if the key was invalidated in the meantime.
+
+    With `group`, keys are invalidated a group at a time: `invalidate(g)`
+    drops every entry whose `group(key)` is `g`, and the generation is
+    kept per group. E.g. results keyed `(member, start, end)` grouped by
+    member, so one notification drops all of a member's periods.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        maxsize: int = None,
+        ttl: float = None,
+        group: Callable[[Hashable], Hashable] = None,
+    ) -> None:
+        self.name = name
+        self.maxsize = maxsize or settings.get_int("cache", "maxsize", 10000)
+        self.ttl = ttl or settings.get_float("cache", "ttl", 300.0)
+
+        self._entries: "collections.OrderedDict[Hashable, Any]" = (
+            collections.OrderedDict()
+        )
+        self._lock = threading.Lock()
+        # Bumped per key by `invalidate`; `_epoch` is bumped by `clear` and
+        # whenever `_generations` is pruned, which voids every generation
+        self._generations: Dict[Hashable, int] = {}
+        self._epoch = 0
+        # Cached keys by group, when entries are grouped
+        self._group = group
+        self._grouped: Dict[Hashable, Set[Hashable]] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_loads = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get a live entry, or `default` if absent or expired."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self._ungroup(key)
+                self.expirations += 1
+            self.misses += 1
+            return default
+
+    def generation(self, key: Hashable) -> Tuple[int, int]:
+        """Token for `set`, taken before reading the value to store."""
+        with self._lock:
+            return self._epoch, self._generations.get(self._group_of(key), 0)
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        generation: Optional[Tuple[int, int]] = None,
+    ) -> bool:
+        """Store an entry, evicting the least recently used if full.
+
+        With `generation`, the entry is only stored if the key hasn't been
+        invalidated since it was taken. Returns whether it was stored.
+        """
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            if generation is not None and generation != (
+                self._epoch,
+                self._generations.get(self._group_of(key), 0),
+            ):
+                self.stale_loads += 1
+                return False
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            if self._group is not None:
+                self._grouped.setdefault(self._group(key), set()).add(key)
+            while len(self._entries) > self.maxsize:
+                evicted, _ = self._entries.popitem(last=False)
+                self._ungroup(evicted)
+                self.evictions += 1
+        return True
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Get an entry, calling `loader` and caching its result on a miss.
+
+        `None` results are cached too, so unknown keys don't hit the
+        database on every request.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            generation = self.generation(key)
+            value = loader()
+            self.set(key, value, generation)
+        return value
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drop an entry (or group) if present, and void loads under way."""
+        with self._lock:
+            if len(self._generations) >= self.maxsize:
+                self._generations.clear()
+                self._epoch += 1
+            self._generations[key] = self._generations.get(key, 0) + 1
+            keys = (
+                (key,) if self._group is None else self._grouped.pop(key, ())
+            )
+            for entry_key in keys:
+                if self._entries.pop(entry_key, _MISSING) is not _MISSING:
+                    self.invalidations += 1
+
+    def clear(self) -> None:
+        """Drop every entry, and void loads already under way."""
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._grouped.clear()
+            self._generations.clear()
+            self._epoch += 1
+
+    def _group_of(self, key: Hashable) -> Hashable:
+        return key if self._group is None else self._group(key)
+
+    def _ungroup(self, key: Hashable) -> None:
+        """Forget a removed entry's group membership; needs `_lock`."""
+        if self._group is None:
+            return
+        group = self._group(key)
+        keys = self._grouped.get(group)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._grouped[group]
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for sizing the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "stale_loads": self.stale_loads,
+            }
+
+
+CACHES: Dict[str, LRUCache] = {}
+
+
+def register(cache: LRUCache) -> LRUCache:
+    """Make a cache reachable by name for cross-process invalidation."""
+    CACHES[cache.name] = cache
+    return cache
+
+
+def clear_all() -> None:
+    """Drop every entry from every registered cache."""
+    for cache in CACHES.values():
+        cache.clear()
+
+
+def stats() -> List[Dict[str, Any]]:
+    """Counters for every registered cache."""
+    return [cache.stats() for cache in CACHES.values()]
+
+
+def notify(session: orm.Session, name: str, key: Hashable) -> None:
+    """Tell every process to invalidate `key` once `session` commits."""
+    session.execute(
+        sqlalchemy.select(
+            [sqlalchemy.func.pg_notify(CHANNEL, f"{name}:{key}")]
+        )
+    )
+
+
+def notify_many(
+    session: orm.Session, name: str, keys: Iterable[Hashable]
+) -> None:
+    """Like `notify`, for many keys in one statement."""
+    session.execute(
+        sqlalchemy.text(
+            "SELECT pg_notify(:channel, payload) "
+            "FROM unnest(CAST(:payloads AS text[])) AS payload"
+        ),
+        {
+            "channel": CHANNEL,
+            "payloads": [f"{name}:{key}" for key in set(keys)],
+        },
+    )
+
+
+def apply_notification(payload: str) -> None:
+    """Invalidate the entry named by a `notify` payload."""
+    name, _, key = payload.partition(":")
+    cache = CACHES.get(name)
+    if cache is not None:
+        cache.invalidate(key)
+
+
+class InvalidationListener(threading.Thread):
+    """Background thread applying invalidations published by any process."""
+
+    def __init__(
+        self,
+        engine: sqlalchemy.engine.Engine,
+        poll_interval: float = 5.0,
+        reconnect_delay: float = 1.0,
+    ) -> None:
+        super().__init__(name="cache-invalidation", daemon=True)
+        self.engine = engine
+        self.poll_interval = poll_interval
+        self.reconnect_delay = reconnect_delay
+        # Set while LISTENing; until then invalidations may be missed
+        self.listening = threading.Event()
+        self._stopping = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                self._listen()
+            except Exception:  # pylint: disable=broad-except
+                self.listening.clear()
+                LOG.exception("Cache invalidation listener failed")
+                self._stopping.wait(self.reconnect_delay)
+
+    def stop(self) -> None:
+        """Ask the listener to exit after its current poll."""
+        self._stopping.set()
+
+    def _listen(self) -> None:
+        # A dedicated connection, detached so it never returns to the pool
+        fairy = self.engine.raw_connection()
+        fairy.detach()
+        dbapi_conn = fairy.connection
+        try:
+            dbapi_conn.rollback()
+            dbapi_conn.autocommit = True
+            with dbapi_conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            LOG.info(f"Listening for cache invalidations on {CHANNEL}")
+
+            # Anything published while we weren't listening was missed
+            clear_all()
+            self.listening.set()
+
+            while not self._stopping.is_set():
+                readable, _, _ = select.select(
+                    [dbapi_conn], [], [], self.poll_interval
+                )
+                if not readable:
+                    continue
+                dbapi_conn.poll()
+                while dbapi_conn.notifies:
+                    apply_notification(dbapi_conn.notifies.pop(0).payload)
+        finally:
+            dbapi_conn.close()
@@ -0,0 +1,365 @@
+"""Synthetic data generator for benchmark-sized databases.
+
+Seeds members, cards and transactions straight into Postgres with
+`COPY ... FROM STDIN`, independent of alembic. Work is split into chunks of
+members; each chunk gets its own NumPy generator derived from `--seed` and
+its chunk index, so output is deterministic however chunks are scheduled
+across worker processes.
+
+Example:
+```bash
+% app-datagen --members 2000000 --transactions-per-card 150 --workers 8
+```
+"""
+
+import argparse
+import calendar
+import datetime
+import io
+import logging
+import math
+import multiprocessing
+import time
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import faker
+import numpy as np
+
+from app import models
+from app import partitions
+from app import postgres
+from app import singleflight
+
+LOG = logging.getLogger(__name__)
+
+VOCABULARY_SIZE = 2000
+CATEGORIES = [
+    "groceries",
+    "restaurants",
+    "gas",
+    "travel",
+    "entertainment",
+    "utilities",
+    "shopping",
+    "health",
+    "services",
+    "other",
+]
+
+# Per-process connection, opened by `_init_worker`
+_conn: Optional[postgres.DatabaseConnection] = None
+
+
+def _zipf_weights(size: int, exponent: float) -> np.ndarray:
+    weights = 1.0 / np.arange(1, size + 1) ** exponent
+    return weights / weights.sum()
+
+
+def build_vocabulary(seed: int) -> Dict[str, List[str]]:
+    """Names and merchants drawn once with Faker and shared by workers."""
+    fake = faker.Faker()
+    fake.seed_instance(seed)
+    return {
+        "first_names": [fake.first_name() for _ in range(VOCABULARY_SIZE)],
+        "last_names": [fake.last_name() for _ in range(VOCABULARY_SIZE)],
+        "streets": [fake.street_name() for _ in range(VOCABULARY_SIZE)],
+        "merchants": [fake.company() for _ in range(VOCABULARY_SIZE)],
+    }
+
+
+def generate_chunk(
+    options: argparse.Namespace,
+    vocabulary: Dict[str, List[str]],
+    card_id_base: int,
+    chunk_index: int,
+) -> Tuple[str, str, str, int]:
+    """Build TSV payloads for one chunk of members.
+
+    Returns `(members, cards, transactions, transaction_count)`.
+    """
+    rng = np.random.default_rng([options.seed, chunk_index])
+    first_member = chunk_index * options.chunk_size
+    count = min(options.chunk_size, options.members - first_member)
+    member_index = np.arange(first_member, first_member + count)
+
+    # Members
+    digits = rng.bytes(16 * count).hex()
+    member_uuids = [
+        f"{h[:8]}-{h[8:12]}-4{h[13:16]}-a{h[17:20]}-{h[20:]}"
+        for h in (digits[i : i + 32] for i in range(0, 32 * count, 32))
+    ]
+    first = np.array(vocabulary["first_names"], dtype=object)[
+        rng.integers(0, VOCABULARY_SIZE, count)
+    ]
+    last = np.array(vocabulary["last_names"], dtype=object)[
+        rng.integers(0, VOCABULARY_SIZE, count)
+    ]
+    streets = np.array(vocabulary["streets"], dtype=object)[
+        rng.integers(0, VOCABULARY_SIZE, count)
+    ]
+    house_numbers = rng.integers(1, 9999, count).astype(str)
+    members = "".join(
+        f"{member_uuid}\t{f}\t{l}\t{n} {s}\t"
+        f"{f.lower()}.{l.lower()}{i}@example.com\n"
+        for member_uuid, f, l, n, s, i in zip(
+            member_uuids, first, last, house_numbers, streets, member_index
+        )
+    )
+
+    # Cards: two ids are reserved per member; the second is only used when
+    # the card is reissued during the month.
+    month_start = options.month
+    _, days_in_month = calendar.monthrange(month_start.year, month_start.month)
+    reissued = rng.random(count) < options.reissue_rate
+    reissue_day = rng.integers(1, days_in_month, count)
+    first_card = card_id_base + 2 * member_index
+    card_lines = []
+    for card_id, member_uuid, is_reissued, day in zip(
+        first_card.tolist(), member_uuids, reissued, reissue_day.tolist()
+    ):
+        if is_reissued:
+            activated = month_start + datetime.timedelta(days=day)
+            card_lines.append(f"{card_id}\t{member_uuid}\t\\N\tf\n")
+            card_lines.append(
+                f"{card_id + 1}\t{member_uuid}\t{activated}\tt\n"
+            )
+        else:
+            card_lines.append(f"{card_id}\t{member_uuid}\t\\N\tt\n")
+    cards = "".join(card_lines)
+
+    # Transactions: a lognormal-Poisson mixture skews activity per member,
+    # and amounts are lognormal, so a few cards carry most of the spend.
+    sigma = options.activity_sigma
+    activity = rng.lognormal(
+        math.log(options.transactions_per_card) - sigma**2 / 2, sigma, count
+    )
+    per_member = rng.poisson(activity)
+    total = int(per_member.sum())
+    owner = np.repeat(np.arange(count), per_member)
+
+    seconds = rng.integers(0, days_in_month * 86400, total)
+    on_new_card = reissued[owner] & (seconds >= reissue_day[owner] * 86400)
+    card_ids = first_card[owner] + on_new_card
+    amounts = np.round(
+        rng.lognormal(options.amount_mu, options.amount_sigma, total), 2
+    )
+    merchants = np.array(vocabulary["merchants"], dtype=object)[
+        rng.choice(
+            VOCABULARY_SIZE,
+            total,
+            p=_zipf_weights(VOCABULARY_SIZE, options.merchant_skew),
+        )
+    ]
+    categories = np.array(CATEGORIES, dtype=object)[
+        rng.choice(
+            len(CATEGORIES), total, p=_zipf_weights(len(CATEGORIES), 1.0)
+        )
+    ]
+    timestamps = (
+        np.datetime64(month_start, "s") + seconds.astype("timedelta64[s]")
+    ).astype(str)
+    transactions = "".join(
+        f"{c}\t{a}\t{m}\t{g}\t{t}\n"
+        for c, a, m, g, t in zip(
+            card_ids.tolist(),
+            amounts.tolist(),
+            merchants,
+            categories,
+            timestamps.tolist(),
+        )
+    )
+    return members, cards, transactions, total
+
+
+def _init_worker() -> None:
+    global _conn  # pylint: disable=global-statement
+    _conn = postgres.DatabaseConnection()
+
+
+def _copy(cursor: Any, table: str, columns: str, payload: str) -> None:
+    cursor.copy_expert(
+        f"COPY {table} ({columns}) FROM STDIN", io.StringIO(payload)
+    )
+
+
+def load_chunk(args: Tuple[Any, ...]) -> Tuple[int, int, int]:
+    """Generate one chunk and COPY it in a single transaction.
+
+    Returns `(chunk_index, members, transactions)`.
+    """
+    options, vocabulary, card_id_base, chunk_index = args
+    members, cards, transactions, transaction_count = generate_chunk(
+        options, vocabulary, card_id_base, chunk_index
+    )
+
+    raw = _conn.engine.raw_connection()
+    try:
+        with raw.cursor() as cursor:
+            _copy(
+                cursor,
+                "member",
+                "member_uuid, first_name, last_name, address, email",
+                members,
+            )
+            _copy(
+                cursor,
+                "card",
+                "id, member_uuid, date_activated, is_current",
+                cards,
+            )
+            _copy(
+                cursor,
+                "transactions",
+                "card_id, amount, merchant, category, transaction_date",
+                transactions,
+            )
+        raw.commit()
+    finally:
+        raw.close()
+
+    return chunk_index, members.count("\n"), transaction_count
+
+
+def reserve_card_ids(conn: postgres.DatabaseConnection, count: int) -> int:
+    """Advance the card id sequence past `count` ids and return the first."""
+    with conn.engine.begin() as db:
+        first = db.execute(
+            "SELECT nextval(pg_get_serial_sequence('card', 'id'))"
+        ).scalar()
+        db.execute(
+            "SELECT setval(pg_get_serial_sequence('card', 'id'), %(last)s)",
+            {"last": first + count - 1},
+        )
+    return first
+
+
+def generate(options: argparse.Namespace) -> None:
+    """Seed the database described by the `POSTGRES_*` environment."""
+    conn = postgres.DatabaseConnection()
+    vocabulary = build_vocabulary(options.seed)
+    card_id_base = reserve_card_ids(conn, 2 * options.members)
+    chunks = math.ceil(options.members / options.chunk_size)
+    with conn.engine.begin() as db:
+        partitions.ensure_partitions(db, options.month)
+
+    if options.defer_rollup:
+        # Row triggers dominate COPY time; rebuild the rollup once instead
+        conn.engine.execute(
+            "ALTER TABLE transactions "
+            "DISABLE TRIGGER transactions_card_daily_spend"
+        )
+
+    started = time.monotonic()
+    loaded_members = loaded_transactions = 0
+    try:
+        with multiprocessing.Pool(
+            options.workers, initializer=_init_worker
+        ) as pool:
+            work = (
+                (options, vocabulary, card_id_base, index)
+                for index in range(chunks)
+            )
+            for index, members, transactions in pool.imap_unordered(
+                load_chunk, work
+            ):
+                loaded_members += members
+                loaded_transactions += transactions
+                elapsed = time.monotonic() - started
+                LOG.info(
+                    f"chunk {index + 1}/{chunks}: "
+                    f"{loaded_members} members, "
+                    f"{loaded_transactions} transactions, "
+                    f"{loaded_transactions / elapsed:.0f} transactions/s"
+                )
+    finally:
+        if options.defer_rollup:
+            conn.engine.execute(
+                "ALTER TABLE transactions "
+                "ENABLE TRIGGER transactions_card_daily_spend"
+            )
+
+    if options.defer_rollup:
+        # Loaders seeding in parallel share one rebuild
+        singleflight.run_once(
+            "card_daily_spend_rebuild", models.CardDailySpend.rebuild
+        )
+
+    LOG.info("Analyzing")
+    conn.engine.execution_options(isolation_level="AUTOCOMMIT").execute(
+        "ANALYZE member, card, transactions, card_daily_spend"
+    )
+    LOG.info(
+        f"Loaded {loaded_members} members and {loaded_transactions} "
+        f"transactions in {time.monotonic() - started:.1f}s"
+    )
+
+
+def _month(value: str) -> datetime.date:
+    return datetime.datetime.strptime(value, "%Y-%m").date()
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--members", type=int, default=1_000_000)
+    parser.add_argument(
+        "--transactions-per-card",
+        type=float,
+        default=100.0,
+        help=(
+            "mean transactions per card for the month; a member whose card "
+            "is reissued has theirs split over both cards"
+        ),
+    )
+    parser.add_argument(
+        "--month",
+        type=_month,
+        default=datetime.date(2021, 9, 1),
+        help="month to generate transactions for, as YYYY-MM",
+    )
+    parser.add_argument(
+        "--reissue-rate",
+        type=float,
+        default=0.05,
+        help="fraction of members whose card is replaced mid-month",
+    )
+    parser.add_argument(
+        "--activity-sigma",
+        type=float,
+        default=1.0,
+        help="lognormal sigma of per-member activity; higher is more skewed",
+    )
+    parser.add_argument("--amount-mu", type=float, default=3.0)
+    parser.add_argument("--amount-sigma", type=float, default=1.0)
+    parser.add_argument(
+        "--merchant-skew",
+        type=float,
+        default=1.1,
+        help="Zipf exponent for merchant popularity",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=10_000)
+    parser.add_argument(
+        "--workers", type=int, default=multiprocessing.cpu_count()
+    )
+    parser.add_argument(
+        "--no-defer-rollup",
+        dest="defer_rollup",
+        action="store_false",
+        help="keep the card_daily_spend trigger enabled while loading",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> None:
+    """Run the generator."""
+    logging.basicConfig(level=logging.INFO)
+    generate(parse_args(argv))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""Hooks for running under a preforking server.
+
+uWSGI imports the app once in its master and forks workers from it
+unless `lazy-apps` is set. Connections and threads made in the master
+must not be used by the workers: a socket shared by two processes
+interleaves their protocol traffic, and threads don't survive a fork.
+Code that opens either at import asks `in_prefork_master()` and, if so,
+defers the work to an `after_fork()` callback.
+"""
+
+import os
+from typing import Callable
+from typing import Optional
+
+try:
+    import uwsgi  # pylint: disable=import-error
+    import uwsgidecorators  # pylint: disable=import-error
+except ImportError:
+    uwsgi = None
+    uwsgidecorators = None
+
+
+def in_prefork_master() -> bool:
+    """True while the uWSGI master imports the app, before any fork."""
+    return uwsgi is not None and uwsgi.worker_id() == 0
+
+
+def threads() -> Optional[int]:
+    """Request threads per uWSGI worker, or None outside uWSGI."""
+    if uwsgi is None:
+        return None
+    return int(uwsgi.opt.get("threads") or 1)
+
+
+def after_fork(callback: Callable[[], None]) -> None:
+    """Run `callback` in each worker (child) process after it forks."""
+    if uwsgidecorators is not None:
+        uwsgidecorators.postfork(callback)
+    else:
+        os.register_at_fork(after_in_child=callback)
@@ -0,0 +1,345 @@
+"""Write-behind transaction ingest with group commit.
+
+`POST /api/transactions` hands each request's rows to the process-wide
+`IngestBuffer` and waits. A single flusher thread drains the buffer in
+groups, up to `max_batch_rows` rows or `max_delay_ms` after the oldest
+submission, and writes each group in one transaction, so many requests
+share one commit. A request is acknowledged only once its group has
+committed.
+
+Backpressure: the buffer holds at most `max_pending_rows`. Submitting to
+a full buffer waits up to `enqueue_timeout_s`, then fails with
+`BufferFull`. `start()` refuses a `max_request_rows` larger than that, as
+such a request could never fit.
+
+Idempotency: a submission may carry a key. Keys are recorded in
+`ingest_key` in the same transaction as the rows, and a key that's
+already there (or earlier in the same group) is acknowledged as a
+duplicate without writing anything.
+
+If a group fails on bad data (say, an unknown `card_id`), its submissions
+are retried one transaction each so only the bad one fails. A group that
+loses a deadlock is retried once as a whole.
+
+Rows are inserted in `(card_id, transaction_date)` order. The
+`card_daily_spend` trigger locks each card it touches until commit, so
+groups committing at once from several processes take those locks in the
+same order and wait for each other instead of deadlocking.
+"""
+
+import collections
+import concurrent.futures
+import logging
+import threading
+import time
+from typing import Any
+from typing import Deque
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+
+import sqlalchemy
+from psycopg2 import errors
+from sqlalchemy import exc
+from sqlalchemy.dialects import postgresql
+
+from app import metrics
+from app import models
+from app import settings
+
+LOG = logging.getLogger(__name__)
+
+MAX_BATCH_ROWS = settings.get_int("ingest", "max_batch_rows", 5000)
+MAX_DELAY = settings.get_float("ingest", "max_delay_ms", 10) / 1000
+MAX_PENDING_ROWS = settings.get_int("ingest", "max_pending_rows", 50000)
+MAX_REQUEST_ROWS = settings.get_int("ingest", "max_request_rows", 10000)
+ENQUEUE_TIMEOUT = settings.get_float("ingest", "enqueue_timeout_s", 1)
+ACK_TIMEOUT = settings.get_float("ingest", "ack_timeout_s", 30)
+
+# Rows per multi-row INSERT within a group
+INSERT_CHUNK_ROWS = 1000
+
+FLUSH_DURATION = metrics.Histogram(
+    "app_ingest_flush_seconds",
+    "Time to write and commit one ingest group.",
+    [],
+)
+FLUSH_ROWS = metrics.Histogram(
+    "app_ingest_flush_rows",
+    "Transactions written per ingest group commit.",
+    [],
+    buckets=(1, 10, 50, 100, 500, 1000, 5000, 10000),
+)
+metrics.HISTOGRAMS.extend([FLUSH_DURATION, FLUSH_ROWS])
+
+
+class BufferFull(Exception):
+    """The ingest buffer stayed full for the whole enqueue timeout."""
+
+
+class IngestResult(NamedTuple):
+    """Outcome of one committed submission."""
+
+    accepted: int
+    duplicate: bool
+
+
+class Submission:
+    """Rows from one request, waiting for their group to commit."""
+
+    __slots__ = ("rows", "key", "future", "enqueued_at")
+
+    def __init__(self, rows: List[Dict[str, Any]], key: Optional[str]) -> None:
+        self.rows = rows
+        self.key = key
+        self.future: "concurrent.futures.Future[IngestResult]" = (
+            concurrent.futures.Future()
+        )
+        self.enqueued_at = time.monotonic()
+
+
+class IngestBuffer(threading.Thread):
+    """Bounded write-behind buffer and the thread that flushes it."""
+
+    def __init__(
+        self,
+        engine: sqlalchemy.engine.Engine,
+        max_batch_rows: int = MAX_BATCH_ROWS,
+        max_delay: float = MAX_DELAY,
+        max_pending_rows: int = MAX_PENDING_ROWS,
+    ) -> None:
+        super().__init__(name="ingest-flusher", daemon=True)
+        self.engine = engine
+        self.max_batch_rows = max_batch_rows
+        self.max_delay = max_delay
+        self.max_pending_rows = max_pending_rows
+
+        self.pending_rows = 0
+        self._pending: Deque[Submission] = collections.deque()
+        self._condition = threading.Condition()
+        self._stopping = False
+
+    def submit(
+        self,
+        rows: List[Dict[str, Any]],
+        key: Optional[str] = None,
+        timeout: float = ENQUEUE_TIMEOUT,
+    ) -> "concurrent.futures.Future[IngestResult]":
+        """Queue rows for the next group commit.
+
+        Raises `BufferFull` if there's no room within `timeout` seconds.
+        """
+        if len(rows) > self.max_pending_rows:
+            raise ValueError(
+                f"{len(rows)} rows exceed the buffer's {self.max_pending_rows}"
+            )
+        submission = Submission(rows, key)
+        with self._condition:
+            has_room = self._condition.wait_for(
+                lambda: self.pending_rows + len(rows) <= self.max_pending_rows,
+                timeout,
+            )
+            if not has_room:
+                raise BufferFull(f"{self.pending_rows} rows already pending")
+            self._pending.append(submission)
+            self.pending_rows += len(rows)
+            self._condition.notify_all()
+        return submission.future
+
+    def stop(self) -> None:
+        """Flush what's pending, then exit."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        self.join()
+
+    def run(self) -> None:
+        while True:
+            group = self._take_group()
+            if not group:
+                return
+            self._flush(group)
+
+    def _take_group(self) -> List[Submission]:
+        """Wait for a full group, or for the oldest submission to age out."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._pending or self._stopping)
+            if not self._pending:
+                return []
+            deadline = self._pending[0].enqueued_at + self.max_delay
+            self._condition.wait_for(
+                lambda: self.pending_rows >= self.max_batch_rows
+                or self._stopping,
+                max(deadline - time.monotonic(), 0),
+            )
+
+            group = [self._pending.popleft()]
+            rows = len(group[0].rows)
+            while (
+                self._pending
+                and rows + len(self._pending[0].rows) <= self.max_batch_rows
+            ):
+                submission = self._pending.popleft()
+                rows += len(submission.rows)
+                group.append(submission)
+            self.pending_rows -= rows
+            # wake submitters waiting for room
+            self._condition.notify_all()
+        return group
+
+    def _flush(self, group: List[Submission]) -> None:
+        started = time.perf_counter()
+        try:
+            results = self._commit_retrying_deadlock(group)
+        except (exc.IntegrityError, exc.DataError) as error:
+            if len(group) == 1:
+                group[0].future.set_exception(error)
+                return
+            LOG.warning(
+                "Ingest group of %d failed (%s); "
+                "retrying submissions one by one",
+                len(group),
+                error.orig,
+            )
+            for submission in group:
+                self._flush([submission])
+            return
+        except Exception as error:  # pylint: disable=broad-except
+            LOG.exception("Ingest group of %d failed", len(group))
+            for submission in group:
+                submission.future.set_exception(error)
+            return
+
+        FLUSH_DURATION.labels().observe(time.perf_counter() - started)
+        FLUSH_ROWS.labels().observe(
+            sum(result.accepted for result in results if not result.duplicate)
+        )
+        for submission, result in zip(group, results):
+            submission.future.set_result(result)
+
+    def _commit_retrying_deadlock(
+        self, group: List[Submission]
+    ) -> List[IngestResult]:
+        """`_commit`, run a second time if it loses a deadlock."""
+        try:
+            return self._commit(group)
+        except exc.OperationalError as error:
+            if not isinstance(error.orig, errors.DeadlockDetected):
+                raise
+            LOG.warning("Ingest group of %d deadlocked; retrying", len(group))
+            return self._commit(group)
+
+    def _commit(self, group: List[Submission]) -> List[IngestResult]:
+        """Write a group in one transaction; results are in group order."""
+        first_with_key: Dict[str, Submission] = {}
+        for submission in group:
+            if submission.key is not None:
+                first_with_key.setdefault(submission.key, submission)
+
+        with self.engine.begin() as db:
+            recorded = self._record_keys(db, first_with_key.values())
+            to_write = [
+                submission
+                for submission in group
+                if submission.key is None
+                or (
+                    first_with_key[submission.key] is submission
+                    and submission.key not in recorded
+                )
+            ]
+            rows = sorted(
+                (row for submission in to_write for row in submission.rows),
+                key=lambda row: (row["card_id"], row["transaction_date"]),
+            )
+            table = models.Transactions.__table__
+            for offset in range(0, len(rows), INSERT_CHUNK_ROWS):
+                db.execute(
+                    table.insert().values(
+                        rows[offset : offset + INSERT_CHUNK_ROWS]
+                    )
+                )
+
+        written = set(map(id, to_write))
+        results = []
+        for submission in group:
+            if id(submission) in written:
+                results.append(IngestResult(len(submission.rows), False))
+            elif submission.key in recorded:
+                results.append(IngestResult(recorded[submission.key], True))
+            else:
+                # repeated within this group
+                first = first_with_key[submission.key]
+                results.append(IngestResult(len(first.rows), True))
+        return results
+
+    @staticmethod
+    def _record_keys(
+        db: sqlalchemy.engine.Connection, submissions: Any
+    ) -> Dict[str, int]:
+        """Insert new keys; returns `{key: transaction_count}` of old ones."""
+        submissions = list(submissions)
+        if not submissions:
+            return {}
+        table = models.IngestKey.__table__
+        inserted = {
+            row[0]
+            for row in db.execute(
+                postgresql.insert(table)
+                .values(
+                    [
+                        {
+                            "idempotency_key": submission.key,
+                            "transaction_count": len(submission.rows),
+                        }
+                        for submission in submissions
+                    ]
+                )
+                .on_conflict_do_nothing(index_elements=["idempotency_key"])
+                .returning(table.c.idempotency_key)
+            )
+        }
+        existing = [
+            submission.key
+            for submission in submissions
+            if submission.key not in inserted
+        ]
+        if not existing:
+            return {}
+        return dict(
+            db.execute(
+                sqlalchemy.select(
+                    [table.c.idempotency_key, table.c.transaction_count]
+                ).where(table.c.idempotency_key.in_(existing))
+            ).fetchall()
+        )
+
+
+BUFFER: Optional[IngestBuffer] = None
+
+
+def start(engine: sqlalchemy.engine.Engine) -> IngestBuffer:
+    """Start the process-wide buffer, replacing any earlier one."""
+    global BUFFER  # pylint: disable=global-statement
+    if MAX_REQUEST_ROWS > MAX_PENDING_ROWS:
+        # a request that large could never be buffered
+        raise ValueError(
+            f"[ingest] max_request_rows ({MAX_REQUEST_ROWS}) exceeds "
+            f"max_pending_rows ({MAX_PENDING_ROWS})"
+        )
+    if BUFFER is not None:
+        BUFFER.stop()
+    BUFFER = IngestBuffer(engine)
+    BUFFER.start()
+    return BUFFER
+
+
+def _ingest_metrics() -> List[str]:
+    pending = BUFFER.pending_rows if BUFFER is not None else 0
+    return [
+        "# TYPE app_ingest_pending_rows gauge",
+        f"app_ingest_pending_rows {pending}",
+    ]
+
+
+metrics.COLLECTORS.append(_ingest_metrics)
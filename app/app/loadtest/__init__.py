@@ -0,0 +1,6 @@
+"""HTTP load testing.
+
+Scenarios are discovered through the `loadtest.scenario` entry point group,
+so other packages can ship their own; see `app.loadtest.scenarios` for the
+built-in ones and `app.loadtest.harness` for the runner.
+"""
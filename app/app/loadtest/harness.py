@@ -0,0 +1,361 @@
+"""Load-test runner.
+
+Runs scenarios registered under the `loadtest.scenario` entry point group
+against a running server (or one it spawns under uWSGI or uvicorn) and
+prints a JSON report with throughput and latency percentiles. Pass a
+previous report as `--baseline` to compare runs across commits.
+
+Example:
+```bash
+% app-loadtest --spawn --concurrency 64 --duration 30 \\
+      member-get payments-get > after.json
+% app-loadtest --concurrency 64 --duration 30 --baseline after.json \\
+      member-get payments-get
+```
+"""
+
+import argparse
+import datetime
+import http.client
+import importlib.metadata
+import json
+import logging
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Type
+
+from app.loadtest import scenarios
+
+LOG = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = "loadtest.scenario"
+
+PERCENTILES = (50, 95, 99)
+
+
+def discover() -> Dict[str, Type[scenarios.Scenario]]:
+    """Load every registered scenario class, keyed by entry point name."""
+    entry_points = importlib.metadata.entry_points()
+    if hasattr(entry_points, "select"):
+        group = entry_points.select(group=ENTRY_POINT_GROUP)
+    else:
+        group = entry_points.get(ENTRY_POINT_GROUP, [])
+    return {entry_point.name: entry_point.load() for entry_point in group}
+
+
+def percentile(ordered: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    # pct * n before dividing keeps e.g. p7 of 100 samples exactly 7
+    rank = math.ceil(pct * len(ordered) / 100) - 1
+    return ordered[max(0, min(len(ordered) - 1, rank))]
+
+
+class Worker(threading.Thread):
+    """Issue requests on one keep-alive connection until told to stop."""
+
+    def __init__(
+        self,
+        scenario: scenarios.Scenario,
+        host: str,
+        port: int,
+        seed: int,
+        measure_from: float,
+        stop_at: float,
+    ) -> None:
+        super().__init__(daemon=True)
+        self.scenario = scenario
+        self.host = host
+        self.port = port
+        self.rng = random.Random(seed)
+        self.measure_from = measure_from
+        self.stop_at = stop_at
+
+        self.latencies: List[float] = []
+        self.statuses: Dict[int, int] = {}
+        self.errors = 0
+
+    def run(self) -> None:
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        while time.perf_counter() < self.stop_at:
+            request = self.scenario.next_request(self.rng)
+            path = request.path
+            if request.params:
+                path = f"{path}?{urllib.parse.urlencode(request.params)}"
+            body = None
+            headers = {}
+            if request.body is not None:
+                body = json.dumps(request.body)
+                headers["Content-Type"] = "application/json"
+
+            started = time.perf_counter()
+            try:
+                conn.request(request.method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection(
+                    self.host, self.port, timeout=30
+                )
+                status = 0
+            elapsed = time.perf_counter() - started
+
+            if started < self.measure_from:
+                continue
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            if status == 0 or status >= 500:
+                self.errors += 1
+            else:
+                self.latencies.append(elapsed)
+        conn.close()
+
+
+def run_scenario(
+    scenario: scenarios.Scenario, options: argparse.Namespace
+) -> Dict[str, Any]:
+    """Drive one scenario and summarize it."""
+    scenario.setup()
+
+    started = time.perf_counter()
+    measure_from = started + options.warmup
+    stop_at = measure_from + options.duration
+    workers = [
+        Worker(
+            scenario,
+            options.host,
+            options.port,
+            options.seed + index,
+            measure_from,
+            stop_at,
+        )
+        for index in range(options.concurrency)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    latencies = sorted(
+        latency for worker in workers for latency in worker.latencies
+    )
+    statuses: Dict[str, int] = {}
+    for worker in workers:
+        for status, count in worker.statuses.items():
+            statuses[str(status)] = statuses.get(str(status), 0) + count
+    errors = sum(worker.errors for worker in workers)
+
+    return {
+        "scenario": scenario.name,
+        "concurrency": options.concurrency,
+        "duration_s": options.duration,
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "statuses": statuses,
+        "throughput_rps": len(latencies) / options.duration,
+        "latency_ms": {
+            **{
+                f"p{pct}": percentile(latencies, pct) * 1000
+                for pct in PERCENTILES
+            },
+            "mean": (
+                (sum(latencies) / len(latencies) * 1000) if latencies else 0.0
+            ),
+            "max": latencies[-1] * 1000 if latencies else 0.0,
+        },
+    }
+
+
+def compare(
+    results: List[Dict[str, Any]], baseline: Dict[str, Any]
+) -> List[Dict[str, Any]]:
+    """Relative change of each metric against a baseline report."""
+    previous = {result["scenario"]: result for result in baseline["results"]}
+    comparisons = []
+    for result in results:
+        before = previous.get(result["scenario"])
+        if before is None:
+            continue
+
+        def change(after_value: float, before_value: float) -> float:
+            if not before_value:
+                return 0.0
+            return (after_value - before_value) / before_value
+
+        comparisons.append(
+            {
+                "scenario": result["scenario"],
+                "baseline_commit": baseline.get("commit"),
+                "throughput_rps": change(
+                    result["throughput_rps"], before["throughput_rps"]
+                ),
+                "latency_ms": {
+                    key: change(value, before["latency_ms"][key])
+                    for key, value in result["latency_ms"].items()
+                },
+            }
+        )
+    return comparisons
+
+
+def git_commit() -> str:
+    """Current commit, so reports can be compared across commits."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _wait_for_port(host: str, port: int, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server did not start on {host}:{port}")
+
+
+class spawn_uwsgi:  # pylint: disable=invalid-name
+    """Context manager running the app server for the test.
+
+    uWSGI by default; `--server asgi` runs `app.asgi` under uvicorn.
+    """
+
+    def __init__(self, options: argparse.Namespace) -> None:
+        self.options = options
+        self.process: subprocess.Popen = None
+
+    def command(self) -> List[str]:
+        """Command line for the selected server."""
+        if self.options.server == "asgi":
+            return [
+                "uvicorn",
+                "app.asgi:app",
+                "--host",
+                self.options.host,
+                "--port",
+                str(self.options.port),
+                "--workers",
+                str(self.options.asgi_workers),
+                "--no-access-log",
+            ]
+        return ["uwsgi", "--ini", self.options.uwsgi_ini]
+
+    def __enter__(self) -> "spawn_uwsgi":
+        env = dict(os.environ, UWSGI_PORT=str(self.options.port))
+        env.pop("UWSGI_AUTORELOAD", None)
+        self.process = subprocess.Popen(self.command(), env=env)
+        _wait_for_port(self.options.host, self.options.port, timeout=60)
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.process.terminate()
+        self.process.wait(timeout=30)
+
+
+def run(options: argparse.Namespace) -> Dict[str, Any]:
+    """Run every requested scenario and build the report."""
+    available = discover()
+    unknown = set(options.scenarios).difference(available)
+    if unknown:
+        raise SystemExit(
+            f"unknown scenarios {sorted(unknown)}; "
+            f"available: {sorted(available)}"
+        )
+
+    def results() -> Iterator[Dict[str, Any]]:
+        for name in options.scenarios:
+            LOG.info(f"Running {name}")
+            yield run_scenario(available[name](options), options)
+
+    if options.spawn:
+        with spawn_uwsgi(options):
+            report_results = list(results())
+    else:
+        report_results = list(results())
+
+    report: Dict[str, Any] = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.utcnow().isoformat(),
+        "results": report_results,
+    }
+    if options.baseline:
+        with open(options.baseline) as baseline:
+            report["comparison"] = compare(report_results, json.load(baseline))
+    return report
+
+
+def _month(value: str) -> datetime.date:
+    return datetime.datetime.strptime(value, "%Y-%m").date()
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "scenarios", nargs="*", help="scenario names; default is all"
+    )
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument(
+        "--duration", type=float, default=30.0, help="measured seconds"
+    )
+    parser.add_argument(
+        "--warmup", type=float, default=5.0, help="unmeasured seconds first"
+    )
+    parser.add_argument(
+        "--keys", type=int, default=10000, help="member_uuids to sample"
+    )
+    parser.add_argument("--zipf-exponent", type=float, default=1.1)
+    parser.add_argument("--month", type=_month, default="2021-09")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--spawn",
+        action="store_true",
+        help="start the app under uWSGI for the duration of the run",
+    )
+    parser.add_argument(
+        "--server",
+        choices=("uwsgi", "asgi"),
+        default="uwsgi",
+        help="server to spawn: threaded under uWSGI or app.asgi on uvicorn",
+    )
+    parser.add_argument("--uwsgi-ini", default="uwsgi.ini")
+    parser.add_argument("--asgi-workers", type=int, default=4)
+    parser.add_argument("--baseline", help="previous report to compare with")
+    options = parser.parse_args(argv)
+    if not options.scenarios:
+        options.scenarios = sorted(discover())
+    return options
+
+
+def main(argv: List[str] = None) -> None:
+    """Run the load test and print the JSON report."""
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    json.dump(run(parse_args(argv)), sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
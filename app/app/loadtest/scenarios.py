@@ -0,0 +1,142 @@
+"""Built-in load-test scenarios."""
+
+import bisect
+import datetime
+import itertools
+import random
+import uuid
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+
+import sqlalchemy
+
+from app import models
+from app import postgres
+
+
+class Request(NamedTuple):
+    """A single HTTP request to issue."""
+
+    method: str
+    path: str
+    params: Optional[Dict[str, Any]] = None
+    body: Optional[Dict[str, Any]] = None
+
+
+class ZipfKeys:
+    """Draw keys with Zipf-distributed popularity.
+
+    A handful of keys take most of the traffic, the way a few active
+    members dominate production reads. Keys are shuffled first so the hot
+    set isn't correlated with insertion order.
+    """
+
+    def __init__(
+        self, keys: List[str], exponent: float = 1.1, seed: int = 0
+    ) -> None:
+        if not keys:
+            raise ValueError("no keys to draw from")
+        self.keys = list(keys)
+        random.Random(seed).shuffle(self.keys)
+        weights = (1.0 / rank**exponent for rank in range(1, len(keys) + 1))
+        self._cumulative = list(itertools.accumulate(weights))
+
+    def draw(self, rng: random.Random) -> str:
+        """Pick one key."""
+        point = rng.random() * self._cumulative[-1]
+        return self.keys[bisect.bisect(self._cumulative, point)]
+
+
+class Scenario:
+    """Base class for load-test scenarios.
+
+    `setup` runs once before load starts and `next_request` is called from
+    every worker thread, each with its own `random.Random`.
+    """
+
+    name = ""
+
+    def __init__(self, options: Any) -> None:
+        self.options = options
+
+    def setup(self) -> None:
+        """Prepare any state the scenario needs, e.g. keys to request."""
+
+    def next_request(self, rng: random.Random) -> Request:
+        """Build the next request to send."""
+        raise NotImplementedError
+
+
+class MemberKeysScenario(Scenario):
+    """Scenario drawing existing member_uuids from the database."""
+
+    def setup(self) -> None:
+        conn = postgres.DatabaseConnection()
+        try:
+            member_uuids = [
+                member_uuid
+                for (member_uuid,) in conn.engine.execute(
+                    sqlalchemy.select([models.Member.member_uuid])
+                    .order_by(sqlalchemy.func.random())
+                    .limit(self.options.keys)
+                )
+            ]
+        finally:
+            conn.engine.dispose()
+        self.member_uuids = ZipfKeys(
+            member_uuids, self.options.zipf_exponent, self.options.seed
+        )
+
+
+class MemberGet(MemberKeysScenario):
+    """`GET /api/member` for existing members."""
+
+    name = "member-get"
+
+    def next_request(self, rng: random.Random) -> Request:
+        return Request(
+            "GET",
+            "/api/member",
+            params={"member_uuid": self.member_uuids.draw(rng)},
+        )
+
+
+class MemberPost(Scenario):
+    """`POST /api/member` creating new members."""
+
+    name = "member-post"
+
+    def next_request(self, rng: random.Random) -> Request:
+        suffix = uuid.UUID(int=rng.getrandbits(128)).hex[:8]
+        return Request(
+            "POST",
+            "/api/member",
+            body={
+                "first_name": f"Load{suffix}",
+                "last_name": f"Test{suffix}",
+                "address": f"{rng.randint(1, 9999)} Main Street",
+            },
+        )
+
+
+class PaymentsGet(MemberKeysScenario):
+    """`GET /api/payments` for existing members on a day in `--month`."""
+
+    name = "payments-get"
+
+    def next_request(self, rng: random.Random) -> Request:
+        month = self.options.month
+        day = rng.randint(1, 28)
+        return Request(
+            "GET",
+            "/api/payments",
+            params={
+                "member_uuid": self.member_uuids.draw(rng),
+                "date": datetime.date(
+                    month.year, month.month, day
+                ).isoformat(),
+            },
+        )
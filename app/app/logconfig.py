@@ -0,0 +1,144 @@
+"""Process-wide logging setup.
+
+Request threads only put records on a queue (`QueueHandler`); a single
+`QueueListener` thread formats them and does the blocking writes. Levels
+come from the `[logging]` section of `config.ini`, and noisy hot-path
+loggers can be sampled or rate-limited there, so dropped records are
+thrown away before they're queued:
+
+```ini
+[logging]
+level = INFO
+levels = sqlalchemy.engine:WARNING
+sample = app.models.lookups:0.01
+rate_limit = app.cache:10
+```
+
+`sample` keeps that fraction of a logger's records; `rate_limit` keeps at
+most that many records per second. Warnings and errors are never dropped.
+"""
+
+import atexit
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+import time
+from typing import Dict
+from typing import Optional
+
+from app import settings
+
+FORMAT = "%(asctime)s %(levelname)s [%(threadName)s] %(name)s: %(message)s"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _pairs(option: str) -> Dict[str, str]:
+    """Parse a `name:value, name:value` setting."""
+    value = settings.get("logging", option) or ""
+    pairs = {}
+    for entry in value.split(","):
+        name, _, setting = entry.strip().rpartition(":")
+        if name:
+            pairs[name] = setting
+    return pairs
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a random `rate` fraction of records below WARNING."""
+
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+class RateLimitFilter(logging.Filter):
+    """Keep at most `per_second` records below WARNING each second."""
+
+    def __init__(self, per_second: float) -> None:
+        super().__init__()
+        self.per_second = per_second
+        self._allowance = per_second
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(
+                self.per_second,
+                self._allowance + (now - self._last) * self.per_second,
+            )
+            self._last = now
+            if self._allowance < 1:
+                return False
+            self._allowance -= 1
+            return True
+
+
+def _set_filter(name: str, new_filter: logging.Filter) -> None:
+    # replace rather than stack filters when reconfigured
+    logger = logging.getLogger(name)
+    for existing in list(logger.filters):
+        if type(existing) is type(new_filter):
+            logger.removeFilter(existing)
+    logger.addFilter(new_filter)
+
+
+def configure() -> None:
+    """Route all logging through a queue and apply the configured levels.
+
+    Does nothing while the listener is running; call `stop()` first to
+    reconfigure.
+    """
+    global _listener  # pylint: disable=global-statement
+    if _listener is not None:
+        return
+
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter(FORMAT))
+    records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(records)]
+    root.setLevel(settings.get("logging", "level", "INFO").upper())
+    for name, level in _pairs("levels").items():
+        logging.getLogger(name).setLevel(level.upper())
+    for name, rate in _pairs("sample").items():
+        _set_filter(name, SamplingFilter(float(rate)))
+    for name, per_second in _pairs("rate_limit").items():
+        _set_filter(name, RateLimitFilter(float(per_second)))
+
+    _listener = logging.handlers.QueueListener(
+        records, handler, respect_handler_level=True
+    )
+    _listener.start()
+    atexit.unregister(stop)
+    atexit.register(stop)
+
+
+def stop() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener  # pylint: disable=global-statement
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def after_fork() -> None:
+    """Start a fresh queue and listener in a forked child.
+
+    The parent's listener thread doesn't survive the fork, and its queue
+    may have been mid-operation when it happened.
+    """
+    global _listener  # pylint: disable=global-statement
+    _listener = None
+    configure()
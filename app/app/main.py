@@ -4,16 +4,22 @@ import logging
 
 import flask
 
+from app import forking
+from app import logconfig
 from app.resources import server
 
-
 LOG = logging.getLogger(__name__)
 
-logging.basicConfig(level=logging.DEBUG)
+logconfig.configure()
+if forking.in_prefork_master():
+    forking.after_fork(logconfig.after_fork)
 
 app = flask.Flask(__name__)  # pylint: disable=invalid-name
 
 api = server.InterviewsServer(app=app)  # pylint: disable=invalid-name
+if not forking.in_prefork_master():
+    # Off the import path; uWSGI workers warm up after forking instead
+    api.warmup_in_background()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,285 @@
+"""In-process metrics in Prometheus text format.
+
+Histograms are plain bucket counters behind a per-series lock, cheap enough
+to leave on under uWSGI's request threads. Per-request SQL statement counts
+and DB time are collected by engine event hooks into a thread-local that
+`resources.base.BasePetalResource` opens and closes around each request.
+"""
+
+import bisect
+import threading
+import time
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+import sqlalchemy
+
+from app import cache
+
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class _Series:
+    """One labelled histogram series."""
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self.lock:
+            return list(self.counts), self.sum
+
+
+class Histogram:
+    """Histogram family keyed by label values."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], _Series] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str) -> _Series:
+        """Get the series for these label values, creating it if needed."""
+        series = self._series.get(values)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(values, _Series(self.buckets))
+        return series
+
+    def render(self) -> List[str]:
+        """Prometheus exposition lines for every series."""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for values, series in sorted(self._series.items()):
+            pairs = list(zip(self.labelnames, values))
+            labels = _labels(pairs)
+            counts, total = series.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = _labels(pairs + [("le", bound)])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def _labels(pairs: Sequence[Tuple[str, Any]]) -> str:
+    if not pairs:
+        return ""
+    rendered = ",".join(f'{name}="{value}"' for name, value in pairs)
+    return f"{{{rendered}}}"
+
+
+REQUEST_DURATION = Histogram(
+    "app_request_duration_seconds",
+    "Wall time spent handling a request.",
+    ["resource", "method"],
+)
+REQUEST_DB_DURATION = Histogram(
+    "app_request_db_duration_seconds",
+    "Time a request spent executing SQL statements.",
+    ["resource", "method"],
+)
+REQUEST_DB_STATEMENTS = Histogram(
+    "app_request_db_statements",
+    "SQL statements executed per request.",
+    ["resource", "method"],
+    buckets=COUNT_BUCKETS,
+)
+POOL_WAIT = Histogram(
+    "app_db_pool_wait_seconds",
+    "Time spent waiting to check a connection out of the pool.",
+    ["pool"],
+)
+HISTOGRAMS = [
+    REQUEST_DURATION,
+    REQUEST_DB_DURATION,
+    REQUEST_DB_STATEMENTS,
+    POOL_WAIT,
+]
+
+# Extra exposition sources, each returning Prometheus text lines
+COLLECTORS: List[Callable[[], List[str]]] = []
+
+
+def render() -> str:
+    """Every metric in Prometheus text format."""
+    lines: List[str] = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    for collector in COLLECTORS:
+        lines.extend(collector())
+    return "\n".join(lines) + "\n"
+
+
+def _cache_metrics() -> List[str]:
+    lines = []
+    all_stats = cache.stats()
+    for counter in (
+        "hits",
+        "misses",
+        "evictions",
+        "invalidations",
+        "stale_loads",
+    ):
+        name = f"app_cache_{counter}_total"
+        lines.append(f"# TYPE {name} counter")
+        for stats in all_stats:
+            labels = _labels([("cache", stats["name"])])
+            lines.append(f"{name}{labels} {stats[counter]}")
+    lines.append("# TYPE app_cache_size gauge")
+    for stats in all_stats:
+        labels = _labels([("cache", stats["name"])])
+        lines.append(f"app_cache_size{labels} {stats['size']}")
+    return lines
+
+
+COLLECTORS.append(_cache_metrics)
+
+# Engines whose connection pools are reported, by name, e.g. "primary"
+POOLS: Dict[str, Any] = {}
+
+
+def register_pool(name: str, engine: Any) -> None:
+    """Expose an engine's connection pool state."""
+    engine.pool.metrics_name = name
+    POOLS[name] = engine
+
+
+def pool_status(pool: Any) -> Dict[str, Any]:
+    """Size, checked-out and overflow counts of a QueuePool."""
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": pool._max_overflow,  # pylint: disable=protected-access
+    }
+
+
+def _pool_metrics() -> List[str]:
+    statuses = {
+        name: pool_status(engine.pool) for name, engine in POOLS.items()
+    }
+    lines = []
+    for field in ("size", "checked_in", "checked_out", "overflow"):
+        name = f"app_db_pool_{field}"
+        lines.append(f"# TYPE {name} gauge")
+        for pool_name, status in statuses.items():
+            labels = _labels([("pool", pool_name)])
+            lines.append(f"{name}{labels} {status[field]}")
+    return lines
+
+
+COLLECTORS.append(_pool_metrics)
+
+
+class RequestStats:
+    """SQL activity of the request running on this thread."""
+
+    __slots__ = ("statements", "db_time")
+
+    def __init__(self) -> None:
+        self.statements = 0
+        self.db_time = 0.0
+
+
+_local = threading.local()
+
+
+def start_request() -> RequestStats:
+    """Begin collecting SQL activity for this thread's request."""
+    stats = RequestStats()
+    _local.request = stats
+    return stats
+
+
+def finish_request(
+    resource: str, method: str, elapsed: float, stats: RequestStats
+) -> None:
+    """Record a finished request."""
+    _local.request = None
+    REQUEST_DURATION.labels(resource, method).observe(elapsed)
+    REQUEST_DB_DURATION.labels(resource, method).observe(stats.db_time)
+    REQUEST_DB_STATEMENTS.labels(resource, method).observe(stats.statements)
+
+
+def current_request() -> Optional[RequestStats]:
+    """Stats for this thread's request, if one is being measured."""
+    return getattr(_local, "request", None)
+
+
+def _before_cursor_execute(
+    conn: Any, *args: Any  # pylint: disable=unused-argument
+) -> None:
+    conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(
+    conn: Any, *args: Any  # pylint: disable=unused-argument
+) -> None:
+    elapsed = time.perf_counter() - conn.info["metrics_started"].pop()
+    stats = current_request()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_time += elapsed
+
+
+def _handle_error(context: Any) -> None:
+    # after_cursor_execute doesn't fire for failed statements
+    if context.connection is not None:
+        started = context.connection.info.get("metrics_started")
+        if started:
+            started.pop()
+
+
+def instrument_engine(engine: sqlalchemy.engine.Engine) -> None:
+    """Count statements and DB time against the current request."""
+    sqlalchemy.event.listen(
+        engine, "before_cursor_execute", _before_cursor_execute
+    )
+    sqlalchemy.event.listen(
+        engine, "after_cursor_execute", _after_cursor_execute
+    )
+    sqlalchemy.event.listen(engine, "handle_error", _handle_error)
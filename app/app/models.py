@@ -1,20 +1,36 @@
 """Database models."""
 
-import sqlalchemy
-from sqlalchemy.dialects import postgresql
-from sqlalchemy.sql import func
-
+import datetime
+import decimal
 import logging
+import operator
 from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Sequence
 from typing import Type
 from typing import TypeVar
+from typing import Union
 
 import dictalchemy
+import pals
 import sqlalchemy
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.ext import declarative
 from sqlalchemy.sql import func
 
+from app import cache
+from app import serializers
+from app import settings
+
 LOG = logging.getLogger(__name__)
+# Per-request lookups; sample or rate-limit it in `[logging]`
+LOOKUP_LOG = logging.getLogger(f"{__name__}.lookups")
+
+BULK_BATCH_SIZE = settings.get_int("bulk", "batch_size", 1000)
+BULK_COMMIT_EVERY = settings.get_int("bulk", "commit_every", 0)
 
 
 # pylint: disable=invalid-name
@@ -32,6 +48,14 @@ class Base(DeclarativeBase):  # type:ignore
     # Annotates query property
     query: sqlalchemy.orm.query.Query = None
 
+    # Advisory lock factory, set when the database connects; see
+    # `app.singleflight`
+    locker: Optional[pals.Locker] = None
+
+    # Models with a lookup cache set these; see `app.cache`
+    __cache__: Optional[cache.LRUCache] = None
+    __cache_key__: Optional[str] = None
+
     id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
     created_at = sqlalchemy.Column(
         sqlalchemy.DateTime, server_default=func.now(), nullable=True
@@ -44,22 +68,223 @@ class Base(DeclarativeBase):  # type:ignore
 
     @classmethod
     def put(cls: Type[ModelType], row: Type[ModelType]) -> Type[ModelType]:
-        """Convenience method to put an object in the database."""
-        cls.query.session.add(row)
-        cls.query.session.commit()
+        """Convenience method to put an object in the database.
+
+        Cached rows are invalidated locally, and in other processes once the
+        write commits.
+        """
+        session = cls.query.session
+        session.add(row)
+        cache_key = cls.cache_key(row)
+        if cache_key is not None:
+            cache.notify(session, cls.__cache__.name, cache_key)
+        session.commit()
+        if cache_key is not None:
+            cls.__cache__.invalidate(cache_key)
         return row
 
     @classmethod
-    def as_dict(self) -> dict:
+    def put_many(
+        cls: Type[ModelType],
+        rows: Iterable[Union[ModelType, Dict[str, Any]]],
+        batch_size: int = None,
+        commit_every: int = None,
+        return_ids: bool = False,
+    ) -> List[Union[ModelType, Dict[str, Any]]]:
+        """Put many objects in the database with multi-row INSERTs.
+
+        Rows may be model instances or dicts of column values. They are
+        written `batch_size` at a time as one `INSERT ... VALUES` statement
+        and committed every `commit_every` rows (0 commits once, at the end).
+        Columns a row doesn't set get their default; ones set to `None` are
+        written as NULL.
+
+        With `return_ids`, primary keys are drawn from the table's sequence
+        up front and set on each row, so instances can be used to build
+        dependent rows the same way as after `put`.
+        """
+        return cls._write_many(
+            sqlalchemy.insert(cls.__table__),
+            rows,
+            batch_size,
+            commit_every,
+            return_ids,
+        )
+
+    @classmethod
+    def upsert_many(
+        cls: Type[ModelType],
+        rows: Iterable[Union[ModelType, Dict[str, Any]]],
+        index_elements: Sequence[str],
+        update_columns: Sequence[str] = None,
+        batch_size: int = None,
+        commit_every: int = None,
+    ) -> List[Union[ModelType, Dict[str, Any]]]:
+        """Like `put_many`, but update rows that conflict on `index_elements`.
+
+        Only `update_columns` are overwritten from the incoming row; with
+        none given, conflicting rows are left untouched.
+        """
+        statement = postgresql.insert(cls.__table__)
+        if update_columns:
+            statement = statement.on_conflict_do_update(
+                index_elements=index_elements,
+                set_={
+                    column: statement.excluded[column]
+                    for column in update_columns
+                },
+            )
+        else:
+            statement = statement.on_conflict_do_nothing(
+                index_elements=index_elements
+            )
+        return cls._write_many(
+            statement, rows, batch_size, commit_every, return_ids=False
+        )
+
+    @classmethod
+    def _write_many(
+        cls: Type[ModelType],
+        statement: sqlalchemy.sql.Insert,
+        rows: Iterable[Union[ModelType, Dict[str, Any]]],
+        batch_size: Optional[int],
+        commit_every: Optional[int],
+        return_ids: bool,
+    ) -> List[Union[ModelType, Dict[str, Any]]]:
+        batch_size = batch_size or BULK_BATCH_SIZE
+        commit_every = (
+            BULK_COMMIT_EVERY if commit_every is None else commit_every
+        )
+        session = cls.query.session
+        rows = list(rows)
+
+        uncommitted_keys: List[str] = []
+        since_commit = 0
+        for offset in range(0, len(rows), batch_size):
+            batch = rows[offset : offset + batch_size]
+            if return_ids:
+                ids = session.execute(
+                    sqlalchemy.text(
+                        "SELECT nextval(pg_get_serial_sequence(:table, 'id')) "
+                        "FROM generate_series(1, :count)"
+                    ),
+                    {"table": cls.__tablename__, "count": len(batch)},
+                ).fetchall()
+                for row, (row_id,) in zip(batch, ids):
+                    cls._set_value(row, "id", row_id)
+
+            session.execute(statement.values(cls._values_for(batch)))
+
+            if cls.__cache__ is not None:
+                keys = [cls.cache_key(row) for row in batch]
+                cache.notify_many(session, cls.__cache__.name, keys)
+                uncommitted_keys.extend(keys)
+
+            since_commit += len(batch)
+            if commit_every and since_commit >= commit_every:
+                cls._commit_many(session, uncommitted_keys)
+                since_commit = 0
+
+        cls._commit_many(session, uncommitted_keys)
+        return rows
+
+    @classmethod
+    def _commit_many(
+        cls: Type[ModelType], session: sqlalchemy.orm.Session, keys: List[str]
+    ) -> None:
+        session.commit()
+        for key in keys:
+            cls.__cache__.invalidate(key)
+        keys.clear()
+
+    @classmethod
+    def _values_for(
+        cls: Type[ModelType], batch: List[Union[ModelType, Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        """Column values for a multi-row INSERT.
+
+        Every row needs the same keys. SQLAlchemy fills in columns with a
+        Python-side default itself; any other column set on some rows is
+        sent as `DEFAULT` on the rest, so server defaults still apply.
+        """
+        values = [cls._row_values(row) for row in batch]
+        columns = {
+            name
+            for row_values in values
+            for name in row_values
+            if cls.__table__.columns[name].default is None
+        }
+        for row_values in values:
+            for name in columns.difference(row_values):
+                row_values[name] = sqlalchemy.literal_column("DEFAULT")
+        return values
+
+    @classmethod
+    def _row_values(
+        cls: Type[ModelType], row: Union[ModelType, Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Columns set on `row`, explicit `None`s included."""
+        values = row if isinstance(row, dict) else row.__dict__
         return {
-            c.name: str(getattr(self, c.name)) for c in self.__table__.columns
+            name: values[name]
+            for name in cls.__table__.columns.keys()
+            if name in values
         }
 
+    @staticmethod
+    def _set_value(
+        row: Union[ModelType, Dict[str, Any]], name: str, value: Any
+    ) -> None:
+        if isinstance(row, dict):
+            row[name] = value
+        else:
+            setattr(row, name, value)
+
+    @classmethod
+    def cache_key(
+        cls: Type[ModelType], row: Union[ModelType, Dict[str, Any]]
+    ) -> Optional[str]:
+        """Key `row` is cached under, if this model is cached."""
+        if cls.__cache__ is None:
+            return None
+        if isinstance(row, dict):
+            return row.get(cls.__cache_key__)
+        return getattr(row, cls.__cache_key__)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """JSON-ready dict of this row's columns; see `app.serializers`."""
+        return serializers.serializer_for(type(self)).instance(self)
+
+
+def _trigram_index(column: str) -> sqlalchemy.Index:
+    """GIN trigram index for `ILIKE` and `%` (similarity) on a column."""
+    return sqlalchemy.Index(
+        f"ix_member_{column}_trgm",
+        column,
+        postgresql_using="gin",
+        postgresql_ops={column: "gin_trgm_ops"},
+    )
+
+
+def _escape_like(value: str) -> str:
+    return (
+        value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    )
+
 
 class Member(Base):
     """Member table."""
 
     __tablename__ = "member"
+    __cache__ = cache.register(cache.LRUCache("member"))
+    __cache_key__ = "member_uuid"
+    __table_args__ = tuple(
+        _trigram_index(column)
+        for column in ("first_name", "last_name", "email")
+    )
+
+    # Trigrams need at least this many characters to narrow the index scan
+    SEARCH_MIN_LENGTH = 3
 
     member_uuid = sqlalchemy.Column(
         postgresql.UUID, nullable=False, unique=True
@@ -75,14 +300,107 @@ class Member(Base):
         member_uuid: str,
     ) -> ModelType:
         """Convenience method to get one member record."""
-        LOG.info(f"Getting member: {member_uuid}")
+        LOOKUP_LOG.info("Getting member: %s", member_uuid)
         return cls.query.filter(cls.member_uuid == member_uuid)
 
+    @classmethod
+    def get_member_row(
+        cls: Type[ModelType],
+        member_uuid: str,
+        bind: Any = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Get one member as a JSON-ready dict.
+
+        Selects the columns as a Core row, skipping ORM hydration and the
+        identity map. `bind` overrides the session's choice of database.
+        """
+        row = cls.query.session.execute(
+            cls.member_row_select(member_uuid), bind=bind
+        ).first()
+        return (
+            None if row is None else serializers.serializer_for(cls).row(row)
+        )
+
+    @classmethod
+    def member_row_select(
+        cls: Type[ModelType], member_uuid: Any
+    ) -> sqlalchemy.sql.Select:
+        """Core SELECT behind `get_member_row`."""
+        return (
+            serializers.serializer_for(cls)
+            .select()
+            .where(cls.member_uuid == member_uuid)
+        )
+
+    @classmethod
+    def get_cached_member(
+        cls: Type[ModelType],
+        member_uuid: str,
+    ) -> Optional[Dict[str, Any]]:
+        """Get one member as a JSON-ready dict through the member cache.
+
+        Misses are read from the primary even when the session reads from a
+        replica: a replica may not have replayed a change whose invalidation
+        has already arrived, and the stale row would stay cached until it
+        expires.
+        """
+        LOOKUP_LOG.info("Getting member: %s", member_uuid)
+        primary = cls.query.session.primary
+        return cls.__cache__.get_or_load(
+            member_uuid, lambda: cls.get_member_row(member_uuid, primary)
+        )
+
+    @classmethod
+    def search(
+        cls: Type[ModelType],
+        text: str,
+        limit: int,
+    ) -> List[Dict[str, Any]]:
+        """Members whose first name, last name or email match `text`.
+
+        A column matches if it starts with `text` (case-insensitively) or is
+        trigram-similar to it (`pg_trgm.similarity_threshold`, 0.3 by
+        default). Prefix matches come first, then the rest by their best
+        similarity. Both predicates are served by the trigram indexes.
+        """
+        LOOKUP_LOG.info("Searching members: %s", text)
+        columns = [cls.first_name, cls.last_name, cls.email]
+        prefix = _escape_like(text) + "%"
+        # `column % text` is pg_trgm's similarity operator; the built-in
+        # modulo operator compiles with the `%%` escaping psycopg2 needs.
+        # `email` is often NULL, and NULL OR false is NULL, which would
+        # sort ahead of true
+        is_prefix = func.coalesce(
+            sqlalchemy.or_(*[column.ilike(prefix) for column in columns]),
+            sqlalchemy.false(),
+        )
+        score = func.greatest(
+            *[func.similarity(column, text) for column in columns]
+        )
+
+        serializer = serializers.serializer_for(cls)
+        rows = cls.query.session.execute(
+            serializer.select()
+            .where(
+                sqlalchemy.or_(
+                    is_prefix, *[column % text for column in columns]
+                )
+            )
+            .order_by(is_prefix.desc(), score.desc(), cls.id)
+            .limit(limit)
+        )
+        return [serializer.row(row) for row in rows]
+
 
 class Card(Base):
     """Card table."""
 
     __tablename__ = "card"
+    __table_args__ = (
+        sqlalchemy.Index(
+            "ix_card_member_uuid_is_current", "member_uuid", "is_current"
+        ),
+    )
 
     member_uuid = sqlalchemy.Column(
         postgresql.UUID,
@@ -101,17 +419,43 @@ class Card(Base):
         member_uuid: str,
     ) -> ModelType:
         """Convenience method to get one alias record."""
-        LOG.info(f"Getting member: {member_uuid}")
+        LOOKUP_LOG.info("Getting card for member: %s", member_uuid)
         return cls.query.filter(cls.member_uuid == member_uuid).filter(
             cls.is_current == True
         )
 
 
+def active_during(end: datetime.date) -> sqlalchemy.sql.ColumnElement:
+    """Filter for cards activated before `end` (or never dated)."""
+    return sqlalchemy.or_(
+        Card.date_activated.is_(None), Card.date_activated < end
+    )
+
+
 class Transactions(Base):
     """Transactions table."""
 
     __tablename__ = "transactions"
+    # The migration also adds ``INCLUDE (amount, category, merchant)`` so
+    # the month-to-date SUM and the spend breakdown can be answered from an
+    # index-only scan.
+    #
+    # Partitioned by month on transaction_date; see `app.partitions`. The
+    # partition key has to be part of the primary key.
+    __table_args__ = (
+        # id makes it match `history`'s keyset order within a card
+        sqlalchemy.Index(
+            "ix_transactions_card_id_transaction_date_id",
+            "card_id",
+            "transaction_date",
+            "id",
+        ),
+        {"postgresql_partition_by": "RANGE (transaction_date)"},
+    )
 
+    id = sqlalchemy.Column(
+        sqlalchemy.Integer, primary_key=True, autoincrement=True
+    )
     card_id = sqlalchemy.Column(
         sqlalchemy.Integer, sqlalchemy.ForeignKey("card.id"), nullable=False
     )
@@ -121,12 +465,670 @@ class Transactions(Base):
     )
     merchant = sqlalchemy.Column(sqlalchemy.String(255), nullable=True)
     category = sqlalchemy.Column(sqlalchemy.String(255), nullable=True)
-    transaction_date = sqlalchemy.Column(sqlalchemy.DateTime, nullable=False)
+    transaction_date = sqlalchemy.Column(
+        sqlalchemy.DateTime, primary_key=True, nullable=False
+    )
+
+    # Columns returned by `history`
+    HISTORY_COLUMNS = (
+        "id",
+        "card_id",
+        "transaction_date",
+        "amount",
+        "merchant",
+        "category",
+    )
 
     @classmethod
     def get_transactions_by_card(
         cls: Type[ModelType],
         card_id: str,
+        start: Optional[datetime.date] = None,
+        end: Optional[datetime.date] = None,
     ) -> ModelType:
-        """Convenience method to get the transasctions for a particular card."""
-        return cls.query.filter(cls.card_id == card_id)
+        """Convenience method to get the transasctions for a particular card.
+
+        Pass `start` and/or `end` (inclusive dates) so only the partitions
+        for those months are scanned.
+        """
+        query = cls.query.filter(cls.card_id == card_id)
+        if start is not None:
+            query = query.filter(cls.transaction_date >= start)
+        if end is not None:
+            query = query.filter(
+                cls.transaction_date < end + datetime.timedelta(days=1)
+            )
+        return query
+
+    @classmethod
+    def spend_between(
+        cls: Type[ModelType],
+        card_id: int,
+        start: datetime.date,
+        end: datetime.date,
+    ) -> decimal.Decimal:
+        """Sum a card's raw transactions from `start` through `end`."""
+        total = (
+            cls.get_transactions_by_card(card_id, start, end)
+            .with_entities(func.sum(cls.amount))
+            .scalar()
+        )
+        return total or decimal.Decimal("0.00")
+
+    @classmethod
+    def month_to_date_for_member(
+        cls: Type[ModelType],
+        member_uuid: str,
+        date: datetime.date,
+    ) -> Optional[decimal.Decimal]:
+        """Sum a member's raw transactions for the month through `date`.
+
+        Joins member, card and transactions in one statement and covers
+        every card active during the window, so spend on a card reissued
+        mid-month is counted. Returns None if the member has no card.
+        """
+        LOOKUP_LOG.info("Getting month to date for member: %s", member_uuid)
+        start = datetime.date(date.year, date.month, 1)
+        end = date + datetime.timedelta(days=1)
+        cards, total = cls.query.session.execute(
+            cls.month_to_date_select(member_uuid, start, end)
+        ).first()
+        return total if cards else None
+
+    @classmethod
+    def month_to_date_select(
+        cls: Type[ModelType], member_uuid: Any, start: Any, end: Any
+    ) -> sqlalchemy.sql.Select:
+        """Core SELECT of `(cards, total)` from `start` up to `end`."""
+        return (
+            sqlalchemy.select(
+                [
+                    func.count(sqlalchemy.distinct(Card.id)),
+                    func.coalesce(func.sum(cls.amount), 0),
+                ]
+            )
+            .select_from(
+                Member.__table__.join(
+                    Card.__table__, Card.member_uuid == Member.member_uuid
+                ).outerjoin(
+                    cls.__table__,
+                    sqlalchemy.and_(
+                        cls.card_id == Card.id,
+                        cls.transaction_date >= start,
+                        cls.transaction_date < end,
+                    ),
+                )
+            )
+            .where(Member.member_uuid == member_uuid)
+            .where(active_during(end))
+        )
+
+    @classmethod
+    def spend_between_by_member(
+        cls: Type[ModelType],
+        member_uuids: List[str],
+        start: datetime.date,
+        end: datetime.date,
+    ) -> List[Any]:
+        """Total spend from `start` through `end` for many members at once.
+
+        Returns `(member_uuid, total)` rows for each member that has a card,
+        summed over all of their cards in a single grouped query.
+        """
+        return (
+            cls.query.session.query(
+                Card.member_uuid,
+                func.coalesce(func.sum(cls.amount), 0).label("total"),
+            )
+            .outerjoin(
+                cls,
+                sqlalchemy.and_(
+                    cls.card_id == Card.id,
+                    cls.transaction_date >= start,
+                    cls.transaction_date < end + datetime.timedelta(days=1),
+                ),
+            )
+            .filter(Card.member_uuid.in_(member_uuids))
+            .filter(active_during(end + datetime.timedelta(days=1)))
+            .group_by(Card.member_uuid)
+            .all()
+        )
+
+    # Spend breakdowns by `(member_uuid, start, end)`, dropped for the whole
+    # member when any of their transactions change (SPEND_BREAKDOWN_NOTIFY)
+    BREAKDOWN_CACHE = cache.register(
+        cache.LRUCache("spend_breakdown", group=operator.itemgetter(0))
+    )
+
+    @classmethod
+    def breakdown_select(
+        cls: Type[ModelType], member_uuid: Any, start: Any, end: Any
+    ) -> sqlalchemy.sql.Select:
+        """Core SELECT of spend by category and by merchant, and in total.
+
+        One pass over the member's transactions from `start` up to (not
+        including) `end`, grouped by `GROUPING SETS ((), category,
+        merchant)`. `grouping_set` tells the rows apart: 3 is the total, 1
+        a category and 2 a merchant.
+        """
+        return (
+            sqlalchemy.select(
+                [
+                    func.grouping(cls.category, cls.merchant).label(
+                        "grouping_set"
+                    ),
+                    cls.category,
+                    cls.merchant,
+                    func.count().label("transactions"),
+                    func.coalesce(func.sum(cls.amount), 0).label("total"),
+                ]
+            )
+            .select_from(
+                cls.__table__.join(Card.__table__, Card.id == cls.card_id)
+            )
+            .where(Card.member_uuid == member_uuid)
+            .where(cls.transaction_date >= start)
+            .where(cls.transaction_date < end)
+            .group_by(
+                func.grouping_sets(
+                    sqlalchemy.tuple_(), cls.category, cls.merchant
+                )
+            )
+        )
+
+    @classmethod
+    def breakdown(
+        cls: Type[ModelType],
+        member_uuid: str,
+        start: datetime.date,
+        end: datetime.date,
+        top: int = 10,
+    ) -> Dict[str, Any]:
+        """Spend from `start` through `end`: total, by category and merchant.
+
+        Categories and merchants are ordered by total, largest first;
+        `top_merchants` is the first `top` of them. Cached per member and
+        period until one of the member's transactions changes; misses are
+        read from the primary, as in `Member.get_cached_member`.
+        """
+        LOOKUP_LOG.info("Getting spend breakdown for member: %s", member_uuid)
+        primary = cls.query.session.primary
+        breakdown = cls.BREAKDOWN_CACHE.get_or_load(
+            (member_uuid, start, end),
+            lambda: cls.load_breakdown(member_uuid, start, end, primary),
+        )
+        return {**breakdown, "top_merchants": breakdown["merchants"][:top]}
+
+    @classmethod
+    def load_breakdown(
+        cls: Type[ModelType],
+        member_uuid: str,
+        start: datetime.date,
+        end: datetime.date,
+        bind: Any = None,
+    ) -> Dict[str, Any]:
+        """Uncached `breakdown`, without `top_merchants`."""
+        rows = cls.query.session.execute(
+            cls.breakdown_select(
+                member_uuid, start, end + datetime.timedelta(days=1)
+            ),
+            bind=bind,
+        ).fetchall()
+        breakdown: Dict[str, Any] = {"total": 0, "transactions": 0}
+        categories, merchants = [], []
+        for grouping_set, category, merchant, transactions, total in rows:
+            spend = {"transactions": transactions, "total": total}
+            if grouping_set == 3:
+                breakdown.update(spend)
+            elif grouping_set == 1:
+                categories.append({"category": category, **spend})
+            else:
+                merchants.append({"merchant": merchant, **spend})
+        breakdown["categories"] = sorted(
+            categories, key=lambda row: row["total"], reverse=True
+        )
+        breakdown["merchants"] = sorted(
+            merchants, key=lambda row: row["total"], reverse=True
+        )
+        return breakdown
+
+    @classmethod
+    def statement_select(
+        cls: Type[ModelType],
+        start: datetime.date,
+        end: datetime.date,
+        low: Optional[str] = None,
+        high: Optional[str] = None,
+    ) -> sqlalchemy.sql.Select:
+        """Core SELECT of statement totals for a range of members.
+
+        Rows are `(member_uuid, card_id, category, transactions, total)`
+        over transactions from `start` up to (not including) `end`, for
+        members with `low <= member_uuid < high`, in that order. Either
+        bound may be `None` to leave that end of the range open.
+        """
+        query = (
+            sqlalchemy.select(
+                [
+                    Card.member_uuid,
+                    cls.card_id,
+                    cls.category,
+                    func.count().label("transactions"),
+                    func.sum(cls.amount).label("total"),
+                ]
+            )
+            .select_from(
+                cls.__table__.join(Card.__table__, Card.id == cls.card_id)
+            )
+            .where(cls.transaction_date >= start)
+            .where(cls.transaction_date < end)
+        )
+        if low is not None:
+            query = query.where(Card.member_uuid >= low)
+        if high is not None:
+            query = query.where(Card.member_uuid < high)
+        grouping = (Card.member_uuid, cls.card_id, cls.category)
+        return query.group_by(*grouping).order_by(*grouping)
+
+    @classmethod
+    def history(
+        cls: Type[ModelType],
+        member_uuid: Optional[str] = None,
+        card_id: Optional[int] = None,
+        start: Optional[datetime.date] = None,
+        end: Optional[datetime.date] = None,
+        category: Optional[str] = None,
+        after: Optional[Sequence[Any]] = None,
+    ) -> sqlalchemy.orm.Query:
+        """Transaction rows in `(transaction_date, id)` order.
+
+        Pages by keyset: pass the `(transaction_date, id)` of the last row
+        seen as `after` to continue from it. Rows are `HISTORY_COLUMNS`
+        tuples rather than model instances, ready to be streamed with
+        `yield_per`.
+        """
+        query = cls.query.session.query(
+            *serializers.serializer_for(cls, cls.HISTORY_COLUMNS).columns
+        )
+        if member_uuid is not None:
+            query = query.join(Card, Card.id == cls.card_id).filter(
+                Card.member_uuid == member_uuid
+            )
+        if card_id is not None:
+            query = query.filter(cls.card_id == card_id)
+        if start is not None:
+            query = query.filter(cls.transaction_date >= start)
+        if end is not None:
+            query = query.filter(
+                cls.transaction_date < end + datetime.timedelta(days=1)
+            )
+        if category is not None:
+            query = query.filter(cls.category == category)
+        if after is not None:
+            query = query.filter(
+                sqlalchemy.tuple_(cls.transaction_date, cls.id)
+                > sqlalchemy.tuple_(*after)
+            )
+        return query.order_by(cls.transaction_date, cls.id)
+
+
+class CardDailySpend(Base):
+    """Daily spend rollup per card.
+
+    Maintained by a trigger on `transactions`, so every write path (ORM,
+    bulk insert or COPY) keeps it current. `cumulative_amount` is the card's
+    running total through `spend_date`, which turns any date range into the
+    difference of two prefix sums.
+    """
+
+    __tablename__ = "card_daily_spend"
+    __table_args__ = (
+        sqlalchemy.UniqueConstraint(
+            "card_id", "spend_date", name="uq_card_daily_spend_card_id_date"
+        ),
+    )
+
+    card_id = sqlalchemy.Column(
+        sqlalchemy.Integer, sqlalchemy.ForeignKey("card.id"), nullable=False
+    )
+    spend_date = sqlalchemy.Column(sqlalchemy.Date, nullable=False)
+    amount = sqlalchemy.Column(
+        sqlalchemy.Numeric(precision=14, scale=2), nullable=False
+    )
+    cumulative_amount = sqlalchemy.Column(
+        sqlalchemy.Numeric(precision=16, scale=2), nullable=False
+    )
+
+    @classmethod
+    def prefix_sum(
+        cls: Type[ModelType], card_id: Any, before: datetime.date
+    ) -> sqlalchemy.sql.ColumnElement:
+        """Scalar expression for a card's total spend before `before`."""
+        return func.coalesce(
+            sqlalchemy.select([cls.cumulative_amount])
+            .where(cls.card_id == card_id)
+            .where(cls.spend_date < before)
+            .order_by(cls.spend_date.desc())
+            .limit(1)
+            .as_scalar(),
+            0,
+        )
+
+    @classmethod
+    def spend_between(
+        cls: Type[ModelType],
+        card_id: int,
+        start: datetime.date,
+        end: datetime.date,
+    ) -> decimal.Decimal:
+        """Total a card's spend from `start` through `end` using the rollup."""
+        return cls.query.session.query(
+            cls.prefix_sum(card_id, end + datetime.timedelta(days=1))
+            - cls.prefix_sum(card_id, start)
+        ).scalar()
+
+    @classmethod
+    def month_to_date_for_member(
+        cls: Type[ModelType],
+        member_uuid: str,
+        date: datetime.date,
+    ) -> Optional[decimal.Decimal]:
+        """Rollup equivalent of `Transactions.month_to_date_for_member`.
+
+        Two prefix-sum lookups per card the member held during the month,
+        all in one statement. Returns None if the member has no card.
+        """
+        LOOKUP_LOG.info("Getting month to date for member: %s", member_uuid)
+        start = datetime.date(date.year, date.month, 1)
+        end = date + datetime.timedelta(days=1)
+        cards, total = cls.query.session.execute(
+            cls.month_to_date_select(member_uuid, start, end)
+        ).first()
+        return total if cards else None
+
+    @classmethod
+    def month_to_date_select(
+        cls: Type[ModelType], member_uuid: Any, start: Any, end: Any
+    ) -> sqlalchemy.sql.Select:
+        """Core SELECT of `(cards, total)` from `start` up to `end`."""
+        return (
+            sqlalchemy.select(
+                [
+                    func.count(Card.id),
+                    func.coalesce(
+                        func.sum(
+                            cls.prefix_sum(Card.id, end)
+                            - cls.prefix_sum(Card.id, start)
+                        ),
+                        0,
+                    ),
+                ]
+            )
+            .select_from(
+                Member.__table__.join(
+                    Card.__table__, Card.member_uuid == Member.member_uuid
+                )
+            )
+            .where(Member.member_uuid == member_uuid)
+            .where(active_during(end))
+        )
+
+    @classmethod
+    def rebuild(cls: Type[ModelType]) -> None:
+        """Recompute the rollup from raw transactions."""
+        LOG.info("Rebuilding card_daily_spend")
+        session = cls.query.session
+        for statement in CARD_DAILY_SPEND_REBUILD:
+            session.execute(statement)
+        session.commit()
+
+    @classmethod
+    def check_consistency(
+        cls: Type[ModelType], card_id: Optional[int] = None
+    ) -> List[Any]:
+        """Compare the rollup against raw transactions.
+
+        Returns one row per `(card_id, spend_date)` whose daily or cumulative
+        amount disagrees; an empty list means the rollup is consistent.
+        """
+        return cls.query.session.execute(
+            CARD_DAILY_SPEND_CHECK, {"card_id": card_id}
+        ).fetchall()
+
+
+class IngestKey(Base):
+    """Idempotency keys of committed ingest submissions; see `app.ingest`."""
+
+    __tablename__ = "ingest_key"
+
+    idempotency_key = sqlalchemy.Column(
+        sqlalchemy.String(255), nullable=False, unique=True
+    )
+    transaction_count = sqlalchemy.Column(sqlalchemy.Integer, nullable=False)
+
+
+class AggregateResult(Base):
+    """Latest value of each single-flight aggregate, shared by processes.
+
+    `value` is JSON text from `serializers.dumps`; see `app.singleflight`.
+    """
+
+    __tablename__ = "aggregate_result"
+    __table_args__ = (
+        sqlalchemy.UniqueConstraint(
+            "name", "key", name="uq_aggregate_result_name_key"
+        ),
+    )
+
+    name = sqlalchemy.Column(sqlalchemy.String(64), nullable=False)
+    key = sqlalchemy.Column(sqlalchemy.String(255), nullable=False)
+    value = sqlalchemy.Column(sqlalchemy.Text, nullable=False)
+    computed_at = sqlalchemy.Column(sqlalchemy.DateTime, nullable=False)
+
+
+# Serializes writers per card so a back-dated insert and a same-day insert
+# can't both read a stale prefix sum. The first key namespaces the lock.
+CARD_DAILY_SPEND_FUNCTIONS = sqlalchemy.DDL(
+    """
+CREATE OR REPLACE FUNCTION card_daily_spend_apply(
+    p_card_id integer, p_day date, p_delta numeric
+) RETURNS void AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(20211001, p_card_id);
+
+    INSERT INTO card_daily_spend AS s
+        (card_id, spend_date, amount, cumulative_amount)
+    VALUES (
+        p_card_id,
+        p_day,
+        p_delta,
+        p_delta + COALESCE((
+            SELECT cumulative_amount FROM card_daily_spend
+            WHERE card_id = p_card_id AND spend_date < p_day
+            ORDER BY spend_date DESC
+            LIMIT 1
+        ), 0)
+    )
+    ON CONFLICT (card_id, spend_date) DO UPDATE
+    SET amount = s.amount + p_delta,
+        cumulative_amount = s.cumulative_amount + p_delta;
+
+    UPDATE card_daily_spend
+    SET cumulative_amount = cumulative_amount + p_delta
+    WHERE card_id = p_card_id AND spend_date > p_day;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION card_daily_spend_trigger() RETURNS trigger AS $$
+BEGIN
+    -- Moving a row to another card locks both; take the lower card id
+    -- first so two moves in opposite directions can't deadlock.
+    IF TG_OP = 'UPDATE' AND OLD.card_id <> NEW.card_id THEN
+        PERFORM pg_advisory_xact_lock(
+            20211001, LEAST(OLD.card_id, NEW.card_id)
+        );
+        PERFORM pg_advisory_xact_lock(
+            20211001, GREATEST(OLD.card_id, NEW.card_id)
+        );
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM card_daily_spend_apply(
+            OLD.card_id, OLD.transaction_date::date, -OLD.amount
+        );
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM card_daily_spend_apply(
+            NEW.card_id, NEW.transaction_date::date, NEW.amount
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+)
+
+CARD_DAILY_SPEND_TRIGGER = sqlalchemy.DDL(
+    """
+CREATE TRIGGER transactions_card_daily_spend
+AFTER INSERT OR DELETE OR UPDATE OF card_id, amount, transaction_date
+ON transactions
+FOR EACH ROW EXECUTE FUNCTION card_daily_spend_trigger()
+"""
+)
+
+# Publishes the members whose transactions a statement changed on the
+# model cache channel, so every process drops their cached spend
+# breakdowns. Statement-level, reading the transition tables, so a bulk
+# insert does one card lookup rather than one per row. Postgres sends each
+# distinct payload once per transaction.
+SPEND_BREAKDOWN_NOTIFY_FUNCTION = sqlalchemy.DDL(
+    f"""
+CREATE OR REPLACE FUNCTION spend_breakdown_notify() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM pg_notify(
+            '{cache.CHANNEL}',
+            '{Transactions.BREAKDOWN_CACHE.name}:' || member_uuid
+        )
+        FROM (
+            SELECT DISTINCT card.member_uuid
+            FROM new_rows JOIN card ON card.id = new_rows.card_id
+        ) AS changed;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM pg_notify(
+            '{cache.CHANNEL}',
+            '{Transactions.BREAKDOWN_CACHE.name}:' || member_uuid
+        )
+        FROM (
+            SELECT DISTINCT card.member_uuid
+            FROM old_rows JOIN card ON card.id = old_rows.card_id
+        ) AS changed;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+)
+
+# A trigger with transition tables takes a single event, hence three
+SPEND_BREAKDOWN_NOTIFY = sqlalchemy.DDL(
+    """
+CREATE TRIGGER transactions_spend_breakdown_notify_insert
+AFTER INSERT ON transactions
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION spend_breakdown_notify();
+
+CREATE TRIGGER transactions_spend_breakdown_notify_update
+AFTER UPDATE ON transactions
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION spend_breakdown_notify();
+
+CREATE TRIGGER transactions_spend_breakdown_notify_delete
+AFTER DELETE ON transactions
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION spend_breakdown_notify();
+"""
+)
+
+CARD_DAILY_SPEND_REBUILD = [
+    sqlalchemy.text("LOCK TABLE transactions IN SHARE MODE"),
+    sqlalchemy.text("DELETE FROM card_daily_spend"),
+    sqlalchemy.text(
+        """
+INSERT INTO card_daily_spend (card_id, spend_date, amount, cumulative_amount)
+SELECT card_id,
+       spend_date,
+       amount,
+       SUM(amount) OVER (PARTITION BY card_id ORDER BY spend_date)
+FROM (
+    SELECT card_id, transaction_date::date AS spend_date, SUM(amount) AS amount
+    FROM transactions
+    GROUP BY card_id, transaction_date::date
+) AS daily
+"""
+    ),
+]
+
+CARD_DAILY_SPEND_CHECK = sqlalchemy.text(
+    """
+WITH raw AS (
+    SELECT card_id,
+           spend_date,
+           amount,
+           SUM(amount) OVER (PARTITION BY card_id ORDER BY spend_date)
+               AS cumulative_amount
+    FROM (
+        SELECT card_id,
+               transaction_date::date AS spend_date,
+               SUM(amount) AS amount
+        FROM transactions
+        WHERE CAST(:card_id AS integer) IS NULL OR card_id = :card_id
+        GROUP BY card_id, transaction_date::date
+    ) AS daily
+), rollup AS (
+    SELECT card_id, spend_date, amount, cumulative_amount
+    FROM card_daily_spend
+    WHERE CAST(:card_id AS integer) IS NULL OR card_id = :card_id
+)
+SELECT COALESCE(raw.card_id, rollup.card_id) AS card_id,
+       COALESCE(raw.spend_date, rollup.spend_date) AS spend_date,
+       raw.amount AS raw_amount,
+       rollup.amount AS rollup_amount,
+       raw.cumulative_amount AS raw_cumulative_amount,
+       rollup.cumulative_amount AS rollup_cumulative_amount
+FROM raw
+FULL OUTER JOIN rollup USING (card_id, spend_date)
+WHERE raw.amount IS DISTINCT FROM rollup.amount
+   OR raw.cumulative_amount IS DISTINCT FROM rollup.cumulative_amount
+ORDER BY 1, 2
+"""
+)
+
+# Keep `create_all` (tests, fresh databases) in step with the migrations.
+sqlalchemy.event.listen(
+    Member.__table__,
+    "before_create",
+    sqlalchemy.DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"),
+)
+sqlalchemy.event.listen(
+    Transactions.__table__, "after_create", CARD_DAILY_SPEND_FUNCTIONS
+)
+sqlalchemy.event.listen(
+    Transactions.__table__, "after_create", CARD_DAILY_SPEND_TRIGGER
+)
+sqlalchemy.event.listen(
+    Transactions.__table__, "after_create", SPEND_BREAKDOWN_NOTIFY_FUNCTION
+)
+sqlalchemy.event.listen(
+    Transactions.__table__, "after_create", SPEND_BREAKDOWN_NOTIFY
+)
+# Monthly partitions are created by `app.partitions`; until then rows land
+# here.
+sqlalchemy.event.listen(
+    Transactions.__table__,
+    "after_create",
+    sqlalchemy.DDL(
+        "CREATE TABLE transactions_default PARTITION OF transactions DEFAULT"
+    ),
+)
@@ -0,0 +1,237 @@
+"""Monthly range partitions of the `transactions` table.
+
+`transactions` is partitioned by month on `transaction_date`, one partition
+per month named `transactions_yYYYYmMM`, plus `transactions_default` for
+anything outside them. Partitions are created ahead of time (`ensure`) so
+rows never land in the default partition, and old months can be detached
+(and optionally dropped) once they're no longer queried.
+
+New partitions are created as standalone tables and then attached, which
+only takes a SHARE UPDATE EXCLUSIVE lock on `transactions`, so it's safe to
+run while the app is serving traffic.
+
+`card_daily_spend` keeps the history of detached months, so payments for
+them still answer; `CardDailySpend.check_consistency` will report those
+days until the rollup is rebuilt.
+
+Example:
+```bash
+% app-partitions ensure --months-ahead 3
+% app-partitions detach --retain-months 24 --drop
+```
+"""
+
+import argparse
+import datetime
+import logging
+import re
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import sqlalchemy
+
+from app import postgres
+from app import settings
+
+LOG = logging.getLogger(__name__)
+
+PARENT = "transactions"
+DEFAULT_PARTITION = "transactions_default"
+
+MONTHS_AHEAD = settings.get_int("partitions", "months_ahead", 3)
+RETAIN_MONTHS = settings.get_int("partitions", "retain_months", 0)
+LOCK_TIMEOUT = settings.get("partitions", "lock_timeout", "5s")
+
+_NAME = re.compile(rf"^{PARENT}_y(\d{{4}})m(\d{{2}})$")
+
+
+def month_start(value: datetime.date) -> datetime.date:
+    """First day of the month containing `value`."""
+    return datetime.date(value.year, value.month, 1)
+
+
+def add_months(month: datetime.date, months: int) -> datetime.date:
+    """First day of the month `months` after `month`'s."""
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: datetime.date) -> str:
+    """Name of the partition holding `month`."""
+    return f"{PARENT}_y{month.year:04d}m{month.month:02d}"
+
+
+def list_partitions(
+    connection: sqlalchemy.engine.Connection,
+) -> List[Tuple[str, Optional[datetime.date]]]:
+    """Attached partitions as `(name, month)`; month is None for default."""
+    rows = connection.execute(
+        sqlalchemy.text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = CAST(:parent AS regclass) "
+            "ORDER BY child.relname"
+        ),
+        {"parent": PARENT},
+    )
+    partitions = []
+    for (name,) in rows:
+        match = _NAME.match(name)
+        month = None
+        if match:
+            month = datetime.date(int(match.group(1)), int(match.group(2)), 1)
+        partitions.append((name, month))
+    return partitions
+
+
+def create_partition(
+    connection: sqlalchemy.engine.Connection, month: datetime.date
+) -> bool:
+    """Create and attach the partition for `month`.
+
+    Returns False if it already exists. Fails if the default partition
+    already holds rows for the month; move them out first.
+    """
+    name = partition_name(month)
+    exists = connection.execute(
+        sqlalchemy.text("SELECT to_regclass(:name) IS NOT NULL"),
+        {"name": name},
+    ).scalar()
+    if exists:
+        return False
+
+    start, end = month, add_months(month, 1)
+    misplaced = connection.execute(
+        sqlalchemy.text(
+            f"SELECT count(*) FROM {DEFAULT_PARTITION} "
+            "WHERE transaction_date >= :start AND transaction_date < :end"
+        ),
+        {"start": start, "end": end},
+    ).scalar()
+    if misplaced:
+        raise RuntimeError(
+            f"{DEFAULT_PARTITION} holds {misplaced} rows for {start:%Y-%m}; "
+            f"move them before creating {name}"
+        )
+
+    # DDL can't take bind parameters; names and bounds are built from dates
+    connection.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+    connection.execute(
+        f"CREATE TABLE {name} "
+        f"(LIKE {PARENT} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+    )
+    connection.execute(
+        f"ALTER TABLE {PARENT} ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{start}') TO ('{end}')"
+    )
+    LOG.info(f"Created partition {name}")
+    return True
+
+
+def ensure_partitions(
+    connection: sqlalchemy.engine.Connection,
+    start: datetime.date = None,
+    months_ahead: int = MONTHS_AHEAD,
+) -> List[str]:
+    """Create missing partitions from `start` through `months_ahead` months
+    past the current one. Returns the names created.
+    """
+    current = month_start(datetime.date.today())
+    month = month_start(start or current)
+    last = add_months(current, months_ahead)
+    created = []
+    while month <= last:
+        if create_partition(connection, month):
+            created.append(partition_name(month))
+        month = add_months(month, 1)
+    return created
+
+
+def detach_partitions(
+    connection: sqlalchemy.engine.Connection,
+    before: datetime.date,
+    drop: bool = False,
+) -> List[str]:
+    """Detach (and optionally drop) partitions for months before `before`.
+
+    Returns the names detached.
+    """
+    detached = []
+    connection.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+    for name, month in list_partitions(connection):
+        if month is None or month >= month_start(before):
+            continue
+        connection.execute(f"ALTER TABLE {PARENT} DETACH PARTITION {name}")
+        if drop:
+            connection.execute(f"DROP TABLE {name}")
+        LOG.info(f"{'Dropped' if drop else 'Detached'} partition {name}")
+        detached.append(name)
+    return detached
+
+
+def _month(value: str) -> datetime.date:
+    return datetime.datetime.strptime(value, "%Y-%m").date()
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("list", help="show attached partitions")
+
+    ensure = commands.add_parser("ensure", help="create future partitions")
+    ensure.add_argument(
+        "--from",
+        dest="start",
+        type=_month,
+        help="first month to create, as YYYY-MM; default is this month",
+    )
+    ensure.add_argument("--months-ahead", type=int, default=MONTHS_AHEAD)
+
+    detach = commands.add_parser("detach", help="detach old partitions")
+    cutoff = detach.add_mutually_exclusive_group()
+    cutoff.add_argument(
+        "--before", type=_month, help="detach months before YYYY-MM"
+    )
+    cutoff.add_argument(
+        "--retain-months",
+        type=int,
+        default=RETAIN_MONTHS or None,
+        help="keep this many months before the current one",
+    )
+    detach.add_argument(
+        "--drop", action="store_true", help="drop detached partitions"
+    )
+    options = parser.parse_args(argv)
+    if (
+        options.command == "detach"
+        and options.before is None
+        and options.retain_months is None
+    ):
+        parser.error("detach needs --before or --retain-months")
+    return options
+
+
+def main(argv: List[str] = None) -> None:
+    """Run a partition maintenance command."""
+    logging.basicConfig(level=logging.INFO)
+    options = parse_args(argv)
+    conn = postgres.DatabaseConnection()
+
+    with conn.engine.begin() as connection:
+        if options.command == "list":
+            for name, _ in list_partitions(connection):
+                print(name)
+        elif options.command == "ensure":
+            ensure_partitions(connection, options.start, options.months_ahead)
+        else:
+            before = options.before or add_months(
+                month_start(datetime.date.today()), -options.retain_months
+            )
+            detach_partitions(connection, before, options.drop)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,196 @@
 """Postgres connection utilities."""
 
+import concurrent.futures
+import contextlib
 import copy
+import itertools
 import logging
+import math
 import os
+import threading
+import time
 from typing import Any
 from typing import Dict
+from typing import Iterator
+from typing import List
 
+import flask
 import pals
 import sqlalchemy
+from sqlalchemy import exc
 from sqlalchemy import orm
+from sqlalchemy import pool
+from sqlalchemy.sql import expression
 
+from app import cache
+from app import forking
+from app import ingest
+from app import metrics
 from app import models
+from app import settings
+from app import sqlstats
 
 LOG = logging.getLogger(__name__)
 
+# Probes answer without waiting for (or triggering) `PostgresMixin.warmup`
+WARMUP_EXEMPT_PATHS = ("/_mgmt/ready", "/_mgmt/health")
+
+# Seconds before retrying a failed warmup, doubling per failure up to the max
+WARMUP_BACKOFF_S = 1.0
+WARMUP_BACKOFF_MAX_S = 30.0
+
+
+class WarmupPending(Exception):
+    """Warmup failed recently and won't be retried for `retry_after` s."""
+
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(f"Database warmup retries in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+def guard_fork(engine: sqlalchemy.engine.Engine) -> None:
+    """Refuse pooled connections opened by another process.
+
+    A backstop for forks nobody called `DatabaseConnection.after_fork()`
+    for: the inherited connection is dropped without being closed (closing
+    would end the parent's session) and the pool opens a fresh one.
+    """
+
+    @sqlalchemy.event.listens_for(engine, "connect")
+    def _record_pid(_dbapi_connection: Any, record: Any) -> None:
+        record.info["pid"] = os.getpid()
+
+    @sqlalchemy.event.listens_for(engine, "checkout")
+    def _check_pid(_dbapi_connection: Any, record: Any, proxy: Any) -> None:
+        pid = os.getpid()
+        if record.info["pid"] != pid:
+            record.connection = proxy.connection = None
+            raise exc.DisconnectionError(
+                f"Connection opened in pid {record.info['pid']}, "
+                f"checked out in pid {pid}"
+            )
+
+
+def pool_settings() -> Dict[str, Any]:
+    """Engine pool arguments from the `[postgres]` settings.
+
+    `pool_size` defaults to the uWSGI threads per worker (20 outside
+    uWSGI), so every request thread can hold a connection at once;
+    `max_overflow` covers the background threads.
+    """
+    return {
+        "pool_size": settings.get_int(
+            "postgres", "pool_size", forking.threads() or 20
+        ),
+        "max_overflow": settings.get_int("postgres", "max_overflow", 10),
+        "pool_timeout": settings.get_float("postgres", "pool_timeout", 10),
+        "pool_recycle": settings.get_int("postgres", "pool_recycle", 1800),
+        "pool_pre_ping": settings.get_bool("postgres", "pool_pre_ping", True),
+        "pool_use_lifo": settings.get_bool("postgres", "pool_use_lifo", True),
+    }
+
+
+class ObservableQueuePool(pool.QueuePool):
+    """QueuePool that records how long each checkout waits."""
+
+    def _do_get(self) -> Any:
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.POOL_WAIT.labels(self._metrics_name).observe(
+                time.perf_counter() - started
+            )
+
+    def recreate(self) -> "ObservableQueuePool":
+        # Engine.dispose() swaps in a fresh pool; keep reporting under the
+        # same name
+        new_pool = super().recreate()
+        new_pool.metrics_name = self._metrics_name
+        return new_pool
+
+    @property
+    def _metrics_name(self) -> str:
+        return getattr(self, "metrics_name", "primary")
+
+
+def replica_settings() -> List[Dict[str, str]]:
+    """Replica locations from the `[postgres]` `replicas` setting.
+
+    A comma separated list of `host[:port][/database]`; missing parts
+    default to the primary's. Replicas use the primary's credentials.
+    """
+    replicas = []
+    for entry in (settings.get("postgres", "replicas") or "").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        address, _, db_name = entry.partition("/")
+        hostname, _, port = address.partition(":")
+        replicas.append(
+            {
+                "hostname": hostname or os.environ["POSTGRES_HOST"],
+                "port": port or os.environ["POSTGRES_PORT"],
+                "db_name": db_name or os.environ["POSTGRES_DB"],
+            }
+        )
+    return replicas
+
+
+class RoutingSession(orm.Session):
+    """Session that sends reads to a replica once marked read-only.
+
+    Sessions start on the primary. After `route_reads()`, plain `SELECT`s
+    (ORM queries included) go to one replica, picked round-robin per
+    session. Flushes, DML and textual SQL always use the primary, and the
+    first of them pins the session to the primary for the rest of its
+    life, so a request reads its own writes. `use_primary()` pins it
+    explicitly.
+
+    Replica lag is not tracked; callers that can't tolerate it should not
+    route reads.
+    """
+
+    _SELECTS = (expression.Select, expression.CompoundSelect)
+
+    def __init__(
+        self,
+        primary: sqlalchemy.engine.Engine = None,
+        replicas: List[sqlalchemy.engine.Engine] = None,
+        counter: Iterator[int] = None,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(**kwargs)
+        self.primary = primary
+        self.replicas = replicas or []
+        self._counter = counter or itertools.count()
+
+    def route_reads(self) -> None:
+        """Send this session's reads to a replica, if any are configured."""
+        if self.replicas:
+            self.info.setdefault("read_only", True)
+
+    def use_primary(self) -> None:
+        """Use the primary for everything from now on."""
+        self.info["read_only"] = False
+
+    @property
+    def reads_from_replica(self) -> bool:
+        """Whether the next `SELECT` will go to a replica."""
+        return bool(self.info.get("read_only"))
+
+    def get_bind(self, mapper: Any = None, clause: Any = None) -> Any:
+        if not self.reads_from_replica:
+            return self.primary
+        if self._flushing or not isinstance(clause, self._SELECTS):
+            self.use_primary()
+            return self.primary
+        replica = self.info.get("replica")
+        if replica is None:
+            replica = self.replicas[next(self._counter) % len(self.replicas)]
+            self.info["replica"] = replica
+        return replica
+
 
 class DatabaseConnection:
     """Make a SQLAlchemy connection."""
@@ -32,10 +209,13 @@ class DatabaseConnection:
         self.password = os.environ["POSTGRES_PASSWORD"]
 
         self.connect_args: Dict[str, str] = {"sslmode": "prefer"}
-        self.engine_args: Dict[str, Any] = engine_args or {}
-        self.engine_args.setdefault("max_overflow", -1)
+        self.engine_args: Dict[str, Any] = pool_settings()
+        self.engine_args.update(engine_args or {})
+
+        self.replicas = replica_settings()
 
         self.engine: sqlalchemy.engine.Engine = None
+        self.replica_engines: List[sqlalchemy.engine.Engine] = []
         self.session: orm.scoping.ScopedSession = None
 
         self._locker: pals.core.Locker = None
@@ -45,24 +225,37 @@ class DatabaseConnection:
 
     def connect(self, engine_args: Dict[str, Any] = None) -> None:
         """Initialize a database connection."""
-        if engine_args:
-            final_engine_args = copy.deepcopy(self.engine_args)
-            final_engine_args.update(engine_args)
-        else:
-            final_engine_args = {}
+        final_engine_args = copy.deepcopy(self.engine_args)
+        final_engine_args.update(engine_args or {})
+        final_engine_args.setdefault("poolclass", ObservableQueuePool)
 
         if self.engine is None or self.session is None:
             LOG.info(f"Connecting to database at {self.safe_uri}")
 
-            self.engine = sqlalchemy.create_engine(
-                self.uri,
-                connect_args=self.connect_args,
-                **final_engine_args,
+            self.engine = self._create_engine(
+                "primary", self.uri, final_engine_args
             )
-
             LOG.info(f"Successfully connected to database at {self.safe_uri}")
+
+            self.replica_engines = []
+            for index, replica in enumerate(self.replicas, start=1):
+                LOG.info(
+                    f"Connecting to replica at {self._uri(replica, True)}"
+                )
+                self.replica_engines.append(
+                    self._create_engine(
+                        f"replica-{index}",
+                        self._uri(replica),
+                        final_engine_args,
+                    )
+                )
+
             self.session = orm.scoped_session(
                 orm.sessionmaker(
+                    class_=RoutingSession,
+                    primary=self.engine,
+                    replicas=self.replica_engines,
+                    counter=itertools.count(),
                     autocommit=False,
                     autoflush=False,
                     bind=self.engine,
@@ -74,26 +267,115 @@ class DatabaseConnection:
             self._locker = pals.Locker(
                 self.db_name, create_engine_callable=lambda: self.engine
             )
+            models.Base.locker = self._locker
 
     @property
-    def uri(self) -> str:
-        """Get a fully-formed URI from the details of this connection."""
+    def locker(self) -> pals.core.Locker:
+        """Advisory lock factory on the primary engine."""
+        return self._locker
+
+    def _create_engine(
+        self, name: str, uri: str, engine_args: Dict[str, Any]
+    ) -> sqlalchemy.engine.Engine:
+        engine = sqlalchemy.create_engine(
+            uri, connect_args=self.connect_args, **engine_args
+        )
+        guard_fork(engine)
+        metrics.instrument_engine(engine)
+        metrics.register_pool(name, engine)
+        if sqlstats.ENABLED:
+            sqlstats.instrument_engine(engine)
+        return engine
+
+    def _uri(self, location: Dict[str, str], safe: bool = False) -> str:
+        password = "***" if safe else self.password
         return (
-            f"{self.schema}://{self.username}:{self.password}@"
-            f"{self.hostname}:{self.port}/{self.db_name}"
+            f"{self.schema}://{self.username}:{password}@"
+            f"{location['hostname']}:{location['port']}/"
+            f"{location['db_name']}"
         )
 
+    @property
+    def uri(self) -> str:
+        """Get a fully-formed URI from the details of this connection."""
+        return self._uri(self._location)
+
     @property
     def safe_uri(self) -> str:
         """Get a URI with password scrubbed."""
-        return (
-            f"{self.schema}://{self.username}:***@"
-            f"{self.hostname}:{self.port}/{self.db_name}"
+        return self._uri(self._location, safe=True)
+
+    @property
+    def _location(self) -> Dict[str, str]:
+        return {
+            "hostname": self.hostname,
+            "port": self.port,
+            "db_name": self.db_name,
+        }
+
+    @contextlib.contextmanager
+    def primary(self) -> Iterator[orm.Session]:
+        """Pin the current session to the primary, e.g. after a write."""
+        session = self.session()
+        session.use_primary()
+        yield session
+
+    def prewarm(
+        self, count: int = None, engine: sqlalchemy.engine.Engine = None
+    ) -> None:
+        """Open `count` connections (default: the pool size) in parallel.
+
+        They go straight back to the pool, so the first burst of traffic
+        doesn't pay for connection setup. Defaults to the primary engine.
+        """
+        engine = engine or self.engine
+        if count is None:
+            count = self.engine_args.get("pool_size", 5)
+        if count <= 0:
+            return
+        started = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(count) as executor:
+            connections = list(
+                executor.map(lambda _: engine.raw_connection(), range(count))
+            )
+        for connection in connections:
+            connection.close()
+        LOG.info(
+            f"Pre-warmed {count} {engine.pool.metrics_name} connections in "
+            f"{time.perf_counter() - started:.2f}s"
         )
 
+    def pool_status(self) -> Dict[str, Any]:
+        """Live state of the primary connection pool."""
+        return metrics.pool_status(self.engine.pool)
+
+    @property
+    def engines(self) -> List[sqlalchemy.engine.Engine]:
+        """The primary engine, then the replicas'."""
+        return [self.engine, *self.replica_engines]
+
+    def dispose(self) -> None:
+        """Close every pooled connection this process opened."""
+        for engine in self.engines:
+            engine.dispose()
+
+    def after_fork(self) -> None:
+        """Give a forked child its own, empty connection pools.
+
+        The inherited pools are replaced rather than disposed: disposing
+        would close connections the parent may still be using. Pool event
+        listeners (metrics, the pals locker's unlock on checkin) carry over
+        to the new pools.
+        """
+        for engine in self.engines:
+            engine.pool = engine.pool.recreate()
+        # drop, don't close, any session inherited from the parent
+        self.session.registry.clear()
+
     def shutdown(self) -> None:
         """Cleanly shutdown the database session."""
-        self.session.remove()
+        if self.session is not None:
+            self.session.remove()
 
 
 class PostgresMixin:
@@ -101,14 +383,109 @@ class PostgresMixin:
 
     Call `db_connect()` in your `__init__`:
 
-    This will initialize the database (if necessary), connect to it.
+    This sets up the database connection without opening it, so importing
+    the app stays fast and works while Postgres is unreachable. `warmup()`
+    then connects, prewarms the pools, starts listening for model cache
+    invalidations from other processes and starts the transaction ingest
+    buffer. It runs once: in each uWSGI worker after the fork, from
+    `warmup_in_background()`, or at the latest before the first request.
+    `ready` is set once it has finished. After a failure, requests get a
+    503 until a backoff has passed rather than each retrying in turn.
     """
 
     def db_connect(
         self,
     ) -> None:
-        """Initialize a database connection."""
-        self.conn = DatabaseConnection()  # type: ignore
+        """Set up the database connection; `warmup()` opens it.
+
+        In a preforking uWSGI master, each worker warms up after the fork;
+        see `app.forking`.
+        """
+        self.conn = DatabaseConnection(delay_connect=True)  # type: ignore
+        self.ready = threading.Event()
+        self._warmup_lock = threading.Lock()
+        self._warmup_failures = 0
+        self._warmup_retry_at = 0.0
         self.app.teardown_appcontext(  # type: ignore
             lambda _: self.conn.shutdown()
         )
+        self.app.before_request(self._warmup_before_request)  # type: ignore
+        if forking.in_prefork_master():
+            LOG.info("Deferring database startup until workers fork")
+            forking.after_fork(self.db_after_fork)
+
+    def db_after_fork(self) -> None:
+        """Reset any inherited connections, then warm up this worker."""
+        if self.conn.engine is not None:
+            self.conn.after_fork()
+        self._try_warmup()
+
+    def warmup(self) -> None:
+        """Connect and start the database machinery, if not yet done.
+
+        Raises `WarmupPending` while backing off from a failed attempt.
+        """
+        if self.ready.is_set():
+            return
+        self._check_warmup_backoff()
+        with self._warmup_lock:
+            if self.ready.is_set():
+                return
+            # callers that waited out a failed attempt don't repeat it
+            self._check_warmup_backoff()
+            started = time.perf_counter()
+            try:
+                self.conn.connect()
+                self.db_start()
+            except Exception:
+                self._warmup_failures += 1
+                backoff = min(
+                    WARMUP_BACKOFF_S * 2 ** (self._warmup_failures - 1),
+                    WARMUP_BACKOFF_MAX_S,
+                )
+                self._warmup_retry_at = time.monotonic() + backoff
+                raise
+            self.ready.set()
+            LOG.info(f"Warmed up in {time.perf_counter() - started:.2f}s")
+
+    def _check_warmup_backoff(self) -> None:
+        retry_after = self._warmup_retry_at - time.monotonic()
+        if retry_after > 0:
+            raise WarmupPending(retry_after)
+
+    def warmup_in_background(self) -> threading.Thread:
+        """Run `warmup()` on a thread; requests that arrive first wait."""
+        thread = threading.Thread(
+            target=self._try_warmup, name="db-warmup", daemon=True
+        )
+        thread.start()
+        return thread
+
+    def _try_warmup(self) -> None:
+        try:
+            self.warmup()
+        except Exception:  # pylint: disable=broad-except
+            # the process still serves; its first request retries
+            LOG.exception("Database warmup failed")
+
+    def _warmup_before_request(self) -> Any:
+        if flask.request.path in WARMUP_EXEMPT_PATHS:
+            return None
+        try:
+            self.warmup()
+        except WarmupPending as error:
+            return (
+                {"message": "database unavailable, retry"},
+                503,
+                {"Retry-After": str(math.ceil(error.retry_after))},
+            )
+        return None
+
+    def db_start(self) -> None:
+        """Prewarm the pools and start the background database threads."""
+        if settings.get_bool("postgres", "pool_prewarm", True):
+            for engine in self.conn.engines:
+                self.conn.prewarm(engine=engine)
+        self.cache_listener = cache.InvalidationListener(self.conn.engine)
+        self.cache_listener.start()
+        self.ingest_buffer = ingest.start(self.conn.engine)
@@ -1,14 +1,77 @@
 """ Base Resource and Authenticated Resource definitions. """
 
+import time
 from typing import Any
+from typing import Tuple
 
 import flask
 import flask_restful
+from flask_restful import inputs
+from sqlalchemy import exc
+
+from app import metrics
+from app import models
+
+# Request header asking for reads from the primary, e.g. right after a write
+READ_YOUR_WRITES_HEADER = "X-Read-Your-Writes"
 
 
 class BasePetalResource(flask_restful.Resource):
-    """Petal API Resource base class."""
+    """Petal API Resource base class.
+
+    Records wall time, SQL statement count and DB time for every request,
+    by resource and method; see `app.metrics`. Streamed responses are
+    measured until the server closes them, so the work done while sending
+    the body is counted. A request that times out waiting for a pooled
+    connection gets a 503 with `Retry-After`.
+
+    Methods in `read_only_methods` read from a replica when any are
+    configured (see `postgres.RoutingSession`), unless the client sends
+    `X-Read-Your-Writes: true`.
+    """
+
+    read_only_methods: Tuple[str, ...] = ("GET",)
 
     def dispatch_request(self, *args: Any, **kwargs: Any) -> Any:
-        flask.g.resource = self.__class__.__name__
-        return super().dispatch_request(*args, **kwargs)
+        resource = flask.g.resource = self.__class__.__name__
+        method = flask.request.method
+        if method in self.read_only_methods:
+            self.route_reads()
+        stats = metrics.start_request()
+        started = time.perf_counter()
+
+        def finish() -> None:
+            metrics.finish_request(
+                resource, method, time.perf_counter() - started, stats
+            )
+
+        try:
+            response = super().dispatch_request(*args, **kwargs)
+        except exc.TimeoutError:
+            # Every pooled connection stayed busy for `pool_timeout`
+            finish()
+            return (
+                {"message": "database busy, retry"},
+                503,
+                {"Retry-After": "1"},
+            )
+        except BaseException:
+            finish()
+            raise
+        if isinstance(response, flask.Response) and response.is_streamed:
+            # The body does its queries as it's sent; measure until then
+            response.call_on_close(finish)
+        else:
+            finish()
+        return response
+
+    @staticmethod
+    def route_reads() -> None:
+        """Send this request's reads to a replica, if it allows it."""
+        header = flask.request.headers.get(READ_YOUR_WRITES_HEADER, "false")
+        try:
+            read_your_writes = inputs.boolean(header)
+        except ValueError:
+            read_your_writes = False
+        if not read_your_writes:
+            models.Base.query.session.route_reads()
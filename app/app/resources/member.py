@@ -5,14 +5,20 @@ import uuid
 
 import flask
 import flask_restful
+from flask_restful import inputs
 from flask_restful import reqparse
 
 from app import models
+from app.resources import base
+from app.resources import payments
 
 LOG = logging.getLogger(__name__)
 
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
 
-class MemberResource(flask_restful.Resource):
+
+class MemberResource(base.BasePetalResource):
     """Top-level password policy endpoint."""
 
     def get(self) -> flask.Response:  # pylint: disable=no-self-use
@@ -35,12 +41,17 @@ class MemberResource(flask_restful.Resource):
         """
 
         parser = flask_restful.reqparse.RequestParser()
-        parser.add_argument("member_uuid", required=True)
+        # canonical, so it's the key the cache's invalidations use
+        parser.add_argument(
+            "member_uuid", required=True, type=payments.canonical_uuid
+        )
         args = parser.parse_args()
 
-        member = models.Member.get_member(
+        member = models.Member.get_cached_member(
             member_uuid=args["member_uuid"]
-        ).first()
+        )
+        if member is None:
+            return {}
 
         return member
 
@@ -73,3 +84,41 @@ class MemberResource(flask_restful.Resource):
             )
         )
         return member_uuid
+
+
+class MemberSearchResource(base.BasePetalResource):
+    """Member search endpoint."""
+
+    def get(self) -> flask.Response:  # pylint: disable=no-self-use
+        """Find members by first name, last name or email.
+
+        Matches prefixes and near spellings, best matches first; see
+        `models.Member.search`. `limit` defaults to 20, at most 100.
+
+        Example:
+        ```bash
+        % curl 'http://localhost:8080/api/member/search?q=bobby&limit=5'
+        [{"id": 1, "member_uuid": "992a54a8-...", "first_name": "Bobby", ...}]
+        ```
+        """
+
+        parser = reqparse.RequestParser()
+        parser.add_argument("q", required=True, location="args")
+        parser.add_argument(
+            "limit",
+            type=inputs.int_range(1, SEARCH_MAX_LIMIT),
+            default=SEARCH_DEFAULT_LIMIT,
+            location="args",
+        )
+        args = parser.parse_args()
+
+        text = args["q"].strip()
+        if len(text) < models.Member.SEARCH_MIN_LENGTH:
+            flask_restful.abort(
+                400,
+                message=(
+                    f"q needs at least {models.Member.SEARCH_MIN_LENGTH} "
+                    "characters"
+                ),
+            )
+        return models.Member.search(text, args["limit"])
@@ -0,0 +1,118 @@
+"""Management endpoints."""
+
+import logging
+
+import flask
+import flask_restful
+from flask_restful import reqparse
+
+from app import cache
+from app import metrics
+from app import singleflight
+from app import sqlstats
+
+LOG = logging.getLogger(__name__)
+
+
+class CacheStatsResource(flask_restful.Resource):
+    """Model cache counters."""
+
+    def get(self) -> flask.Response:  # pylint: disable=no-self-use
+        """Get hit/miss/eviction counters for each model cache.
+
+        Example:
+        ```bash
+        % curl http://localhost:8080/_mgmt/cache
+        ```
+        """
+        return cache.stats()
+
+
+class MetricsResource(flask_restful.Resource):
+    """Prometheus metrics."""
+
+    def get(self) -> flask.Response:  # pylint: disable=no-self-use
+        """Get request, SQL and cache metrics in Prometheus text format.
+
+        Example:
+        ```bash
+        % curl http://localhost:8080/_mgmt/metrics
+        ```
+        """
+        return flask.Response(
+            metrics.render(), mimetype="text/plain; version=0.0.4"
+        )
+
+
+class TopQueriesResource(flask_restful.Resource):
+    """Per-fingerprint SQL statistics for this process."""
+
+    def get(self) -> flask.Response:  # pylint: disable=no-self-use
+        """Get the top statements, ranked by total time by default.
+
+        Only populated when `[sqlstats] enabled` is set.
+
+        Example:
+        ```bash
+        % curl 'http://localhost:8080/_mgmt/queries?order_by=p95_ms&limit=10'
+        ```
+        """
+        parser = reqparse.RequestParser()
+        parser.add_argument("limit", type=int, default=20, location="args")
+        parser.add_argument(
+            "order_by",
+            default="total_ms",
+            location="args",
+            choices=(
+                "total_ms",
+                "calls",
+                "mean_ms",
+                "p95_ms",
+                "max_ms",
+                "rows",
+                "slow_calls",
+            ),
+        )
+        args = parser.parse_args()
+        return {
+            "enabled": sqlstats.ENABLED,
+            "dropped": sqlstats.REGISTRY.dropped,
+            "queries": sqlstats.REGISTRY.top(args["limit"], args["order_by"]),
+        }
+
+
+class PoolResource(flask_restful.Resource):
+    """Database connection pool state."""
+
+    def get(self) -> flask.Response:  # pylint: disable=no-self-use
+        """Get checked-out and overflow counts for each connection pool.
+
+        Checkout wait times are in `/_mgmt/metrics` as
+        `app_db_pool_wait_seconds`.
+
+        Example:
+        ```bash
+        % curl http://localhost:8080/_mgmt/pool
+        ```
+        """
+        return {
+            name: metrics.pool_status(engine.pool)
+            for name, engine in metrics.POOLS.items()
+        }
+
+
+class SingleFlightStatsResource(flask_restful.Resource):
+    """Single-flight contention counters."""
+
+    def get(self) -> flask.Response:  # pylint: disable=no-self-use
+        """Get hit, contention and wait counters for each single flight.
+
+        Wait times are in `/_mgmt/metrics` as
+        `app_singleflight_wait_seconds`.
+
+        Example:
+        ```bash
+        % curl http://localhost:8080/_mgmt/singleflight
+        ```
+        """
+        return singleflight.stats()
@@ -3,26 +3,64 @@
 import datetime
 import json
 import logging
+import uuid
+from typing import Any
+from typing import List
 
 import flask
 import flask_restful
 from flask_restful import reqparse
 from flask_restful import inputs
-from sqlalchemy.sql import func
 
 from app import models
+from app import settings
+from app import singleflight
+from app.resources import base
 
 LOG = logging.getLogger(__name__)
 
+# Rollup totals shared between concurrent requests; a TTL of 0 turns it off
+MONTH_TO_DATE = singleflight.register(
+    singleflight.SingleFlight(
+        "month_to_date",
+        ttl=settings.get_float("singleflight", "month_to_date_ttl_s", 0),
+    )
+)
 
-class PaymentsResource(flask_restful.Resource):
+# Upper bound on member_uuids bound into a single batch query
+BATCH_CHUNK_SIZE = 1000
+
+# Largest `top` accepted by the breakdown endpoint
+BREAKDOWN_MAX_TOP = 100
+
+
+def canonical_uuid(value: Any) -> str:
+    """reqparse type: a UUID, in the canonical lowercase form."""
+    if not isinstance(value, str):
+        raise ValueError(f"{value!r} is not a UUID")
+    return str(uuid.UUID(value))
+
+
+def canonical_uuid_list(value: Any) -> List[str]:
+    """reqparse type: a JSON list of UUIDs, each normalized."""
+    if not isinstance(value, list):
+        raise ValueError("expected a list of member UUIDs")
+    return [canonical_uuid(item) for item in value]
+
+
+class PaymentsResource(base.BasePetalResource):
     """Top-level password policy endpoint."""
 
     def get(self) -> flask.Response:  # pylint: disable=no-self-use
         """Get the payment amount for a customer.
         
         The payment amount will be that month's payment until (and including) 
-        the given date.
+        the given date, across every card the member held during the month.
+
+        Totals are read from the `card_daily_spend` rollup. Pass
+        `"verify": true` to also sum the raw transactions; the raw total is
+        returned and any disagreement with the rollup is logged. Without it,
+        totals may be up to `[singleflight] month_to_date_ttl_s` old.
 
         Example:
         ```bash
@@ -31,31 +69,151 @@ class PaymentsResource(flask_restful.Resource):
         """
 
         parser = flask_restful.reqparse.RequestParser()
-        parser.add_argument("member_uuid", required=True)
+        parser.add_argument("member_uuid", required=True, type=canonical_uuid)
         parser.add_argument(
             "date", required=True, type=flask_restful.inputs.date
         )
+        parser.add_argument(
+            "verify", default=False, type=flask_restful.inputs.boolean
+        )
         args = parser.parse_args()
         member_uuid = args["member_uuid"]
         date = args["date"]
 
+        def rollup_total():
+            return models.CardDailySpend.month_to_date_for_member(
+                member_uuid, date
+            )
+
+        if args["verify"] or not MONTH_TO_DATE.ttl:
+            total_amount = rollup_total()
+        else:
+            total_amount = MONTH_TO_DATE.get(
+                f"{member_uuid}:{date.date().isoformat()}", rollup_total
+            )
+        if args["verify"]:
+            raw_amount = models.Transactions.month_to_date_for_member(
+                member_uuid, date
+            )
+            if raw_amount != total_amount:
+                LOG.warning(
+                    f"card_daily_spend mismatch for member {member_uuid}: "
+                    f"rollup={total_amount} raw={raw_amount}"
+                )
+            total_amount = raw_amount
+
+        if total_amount is not None:
+            return json.dumps(float(total_amount))
+
+        return {}
+
+
+class PaymentsBatchResource(base.BasePetalResource):
+    """Month-to-date payment amounts for many members."""
+
+    # POST only because the member list is too long for a query string
+    read_only_methods = ("POST",)
+
+    def post(self) -> flask.Response:  # pylint: disable=no-self-use
+        """Get the payment amount for each of a list of members.
+
+        Members are looked up in chunks of `BATCH_CHUNK_SIZE`, one grouped
+        query per chunk, and results are streamed back as newline-delimited
+        JSON in request order. `total` is `null` for members with no card.
+        Every member_uuid is checked before the stream starts: a malformed
+        one fails the whole request with 400. They're echoed back in their
+        canonical lowercase form.
+
+        Example:
+        ```bash
+        % curl -X POST -H Content-Type:application/json \\
+               -d '{"member_uuids": ["992a54a8-3d3d-43de-a852-4aa41f16cc27"], "date": "2021-09-28"}' \\
+               http://localhost:8080/api/payments/batch
+        {"member_uuid": "992a54a8-3d3d-43de-a852-4aa41f16cc27", "total": 535.33}
+        ```
+        """
+
+        parser = reqparse.RequestParser()
+        parser.add_argument(
+            "member_uuids",
+            required=True,
+            type=canonical_uuid_list,
+            location="json",
+        )
+        parser.add_argument(
+            "date", required=True, type=inputs.date, location="json"
+        )
+        args = parser.parse_args()
+        member_uuids = args["member_uuids"]
+        date = args["date"]
+
         month_start = datetime.date(date.year, date.month, 1)
         month_end = date
 
-        card = models.Card.get_card_by_member(member_uuid).first()
-        if card:
-            total_amount = (
-                models.Transactions.get_transactions_by_card(card.idd)
-                .filter(
-                    models.Transactions.transaction_date.between(
-                        month_start, month_end
+        def generate():
+            for offset in range(0, len(member_uuids), BATCH_CHUNK_SIZE):
+                chunk = member_uuids[offset : offset + BATCH_CHUNK_SIZE]
+                totals = dict(
+                    models.Transactions.spend_between_by_member(
+                        chunk, month_start, month_end
                     )
                 )
-                .with_entities(
-                    func.sum(models.Transactions.amount).label("sum")
-                )
-                .scalar()
-            )
-            return json.dumps(float(total_amount))
+                for member_uuid in chunk:
+                    total = totals.get(member_uuid)
+                    yield json.dumps(
+                        {
+                            "member_uuid": member_uuid,
+                            "total": None if total is None else float(total),
+                        }
+                    ) + "\n"
 
-        return {}
+        return flask.Response(
+            flask.stream_with_context(generate()),
+            mimetype="application/x-ndjson",
+        )
+
+
+class PaymentsBreakdownResource(base.BasePetalResource):
+    """Spend by category and merchant."""
+
+    def get(self) -> flask.Response:  # pylint: disable=no-self-use
+        """Get a member's spend between two dates, broken down.
+
+        Returns the total, the total per category and per merchant (largest
+        first), and the `top` merchants (default 10), all from one
+        `GROUPING SETS` query. `start` and `end` are inclusive. Results are
+        cached until one of the member's transactions changes.
+
+        Example:
+        ```bash
+        % curl 'http://localhost:8080/api/payments/breakdown?member_uuid=992a54a8-3d3d-43de-a852-4aa41f16cc27&start=2021-09-01&end=2021-09-30&top=3'
+        {"total": 535.33, "transactions": 6, "categories": [{"category": "gas", "transactions": 2, "total": 354.31}, ...], "merchants": [...], "top_merchants": [...]}
+        ```
+        """
+        parser = reqparse.RequestParser()
+        parser.add_argument(
+            "member_uuid",
+            required=True,
+            type=canonical_uuid,
+            location="args",
+        )
+        parser.add_argument(
+            "start", required=True, type=inputs.date, location="args"
+        )
+        parser.add_argument(
+            "end", required=True, type=inputs.date, location="args"
+        )
+        parser.add_argument(
+            "top",
+            type=inputs.int_range(1, BREAKDOWN_MAX_TOP),
+            default=10,
+            location="args",
+        )
+        args = parser.parse_args()
+        start, end = args["start"].date(), args["end"].date()
+        if start > end:
+            flask_restful.abort(400, message="end is before start")
+
+        return models.Transactions.breakdown(
+            args["member_uuid"], start, end, args["top"]
+        )
@@ -5,17 +5,17 @@ from typing import Any
 
 import flask
 import flask_restful
-from healthcheck import HealthCheck
 
 from app import postgres
+from app import serializers
 from app.resources import member
+from app.resources import mgmt
+from app.resources import payments
+from app.resources import transactions
 
 LOG = logging.getLogger(__name__)
 
 
-health = HealthCheck()
-
-
 class InterviewsServer(postgres.PostgresMixin):
     """Instantiates Flask application which when run acts as a server."""
 
@@ -25,6 +25,9 @@ class InterviewsServer(postgres.PostgresMixin):
         self.app = app
 
         self._api = flask_restful.Api(app=self.app)
+        self._api.representation("application/json")(serializers.output_json)
+
+        self._health: Any = None
 
         self.db_connect()
         self.add_resources()
@@ -32,7 +35,60 @@ class InterviewsServer(postgres.PostgresMixin):
     def add_resources(self, *args: Any, **kwargs: Any) -> None:
         """Mount resources to the server."""
         self.api.add_resource(member.MemberResource, "/api/member")
+        self.api.add_resource(
+            member.MemberSearchResource, "/api/member/search"
+        )
         self.api.add_resource(payments.PaymentsResource, "/api/payments")
+        self.api.add_resource(
+            payments.PaymentsBatchResource, "/api/payments/batch"
+        )
+        self.api.add_resource(
+            payments.PaymentsBreakdownResource, "/api/payments/breakdown"
+        )
+        self.api.add_resource(
+            transactions.TransactionsResource, "/api/transactions"
+        )
+        self.api.add_resource(mgmt.CacheStatsResource, "/_mgmt/cache")
+        self.api.add_resource(mgmt.MetricsResource, "/_mgmt/metrics")
+        self.api.add_resource(mgmt.TopQueriesResource, "/_mgmt/queries")
+        self.api.add_resource(mgmt.PoolResource, "/_mgmt/pool")
+        self.api.add_resource(
+            mgmt.SingleFlightStatsResource, "/_mgmt/singleflight"
+        )
+        self.app.add_url_rule("/_mgmt/ready", "ready", self.readiness)
+        self.app.add_url_rule("/_mgmt/health", "health", self.health)
+
+    def readiness(self) -> flask.Response:
+        """200 once `warmup()` has finished, 503 until then.
+
+        Example:
+        ```bash
+        % curl http://localhost:8080/_mgmt/ready
+        ```
+        """
+        if self.ready.is_set():
+            return flask.jsonify(ready=True)
+        return flask.jsonify(ready=False), 503
+
+    def health(self) -> flask.Response:
+        """Check the database answers, through the `healthcheck` package.
+
+        Example:
+        ```bash
+        % curl http://localhost:8080/_mgmt/health
+        ```
+        """
+        if self._health is None:
+            # imported on first use, to keep it off the startup path
+            import healthcheck  # pylint: disable=import-outside-toplevel
+
+            self._health = healthcheck.HealthCheck(checkers=[self._database])
+        return self._health.check()
+
+    def _database(self) -> Any:
+        self.conn.connect()
+        self.conn.engine.execute("SELECT 1")
+        return True, "database ok"
 
     def run(self) -> None:
         """Run the server with thread support."""
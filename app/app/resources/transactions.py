@@ -0,0 +1,208 @@
+"""Transaction history endpoints."""
+
+import concurrent.futures
+import datetime
+import decimal
+import itertools
+import logging
+from typing import Any
+from typing import Dict
+from typing import List
+
+import flask
+import flask_restful
+import orjson
+from flask_restful import inputs
+from flask_restful import reqparse
+from sqlalchemy import exc
+
+from app import ingest
+from app import models
+from app import serializers
+from app.resources import base
+from app.resources import payments
+
+LOG = logging.getLogger(__name__)
+
+# Rows fetched per round trip from the server-side cursor
+STREAM_BATCH_SIZE = 1000
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+
+
+def _parse_row(value: Any) -> Dict[str, Any]:
+    """Validate one posted transaction into an insertable row."""
+    if not isinstance(value, dict):
+        raise ValueError("expected a JSON object")
+    transaction_date = datetime.datetime.fromisoformat(
+        value["transaction_date"]
+    )
+    if transaction_date.tzinfo is not None:
+        transaction_date = transaction_date.astimezone(
+            datetime.timezone.utc
+        ).replace(tzinfo=None)
+    card_id = value["card_id"]
+    # bool is an int, and int() would truncate 1.9
+    if not isinstance(card_id, int) or isinstance(card_id, bool):
+        raise ValueError(f"card_id must be an integer, not {card_id!r}")
+    return {
+        "card_id": card_id,
+        "amount": decimal.Decimal(str(value["amount"])),
+        "merchant": value.get("merchant"),
+        "category": value.get("category"),
+        "transaction_date": transaction_date,
+    }
+
+
+def parse_rows(body: bytes, mimetype: str) -> List[Dict[str, Any]]:
+    """Rows from a JSON object or list, or from NDJSON, one per line."""
+    if mimetype == "application/x-ndjson":
+        values = [
+            serializers.loads(line) for line in body.splitlines() if line
+        ]
+    else:
+        values = serializers.loads(body)
+        if not isinstance(values, list):
+            values = [values]
+
+    rows = []
+    for number, value in enumerate(values, start=1):
+        try:
+            rows.append(_parse_row(value))
+        except (
+            KeyError,
+            TypeError,
+            ValueError,
+            decimal.InvalidOperation,
+        ) as error:
+            raise ValueError(f"transaction {number}: {error!r}") from error
+    return rows
+
+
+class TransactionsResource(base.BasePetalResource):
+    """Transaction history and ingest endpoint."""
+
+    def get(self) -> flask.Response:  # pylint: disable=no-self-use
+        """Stream a member's or card's transactions as newline-delimited JSON.
+
+        Rows come oldest first, ordered by `(transaction_date, id)`, and can
+        be narrowed by `start`/`end` dates (inclusive) and `category`. To
+        page, pass `limit`, then the last row's `transaction_date` and `id`
+        as `after_date` and `after_id` to get the next page. Rows are read
+        from a server-side cursor and written out as they arrive, so memory
+        use doesn't grow with the length of the history.
+
+        Example:
+        ```bash
+        % curl 'http://localhost:8080/api/transactions?member_uuid=992a54a8-3d3d-43de-a852-4aa41f16cc27&start=2021-09-01&limit=2'
+        {"id": 10021, "card_id": 1001, "transaction_date": "2021-09-02T00:00:00", "amount": 100.05, "merchant": "Acme", "category": "gas"}
+        {"id": 10022, "card_id": 1001, "transaction_date": "2021-09-14T00:00:00", "amount": 14.32, "merchant": "Acme", "category": "gas"}
+        % curl 'http://localhost:8080/api/transactions?member_uuid=992a54a8-3d3d-43de-a852-4aa41f16cc27&start=2021-09-01&limit=2&after_date=2021-09-14T00:00:00&after_id=10022'
+        ```
+        """
+
+        parser = reqparse.RequestParser()
+        parser.add_argument("member_uuid", type=payments.canonical_uuid)
+        parser.add_argument("card_id", type=int)
+        parser.add_argument("start", type=inputs.date)
+        parser.add_argument("end", type=inputs.date)
+        parser.add_argument("category")
+        parser.add_argument("after_date", type=inputs.datetime_from_iso8601)
+        parser.add_argument("after_id", type=int)
+        parser.add_argument("limit", type=inputs.positive)
+        args = parser.parse_args()
+
+        if args["member_uuid"] is None and args["card_id"] is None:
+            flask_restful.abort(400, message="member_uuid or card_id required")
+        if (args["after_date"] is None) != (args["after_id"] is None):
+            flask_restful.abort(
+                400, message="after_date and after_id go together"
+            )
+
+        after = None
+        if args["after_date"] is not None:
+            after = (args["after_date"], args["after_id"])
+
+        query = models.Transactions.history(
+            member_uuid=args["member_uuid"],
+            card_id=args["card_id"],
+            start=args["start"],
+            end=args["end"],
+            category=args["category"],
+            after=after,
+        )
+        if args["limit"] is not None:
+            query = query.limit(args["limit"])
+
+        serializer = serializers.serializer_for(
+            models.Transactions, models.Transactions.HISTORY_COLUMNS
+        )
+
+        # Run the query, and fetch its first batch, before the 200 goes out:
+        # once streaming has started an error can only truncate the body.
+        rows = iter(query.yield_per(STREAM_BATCH_SIZE))
+        first = list(itertools.islice(rows, 1))
+
+        def generate():
+            for row in itertools.chain(first, rows):
+                yield serializers.dumps(serializer.row(row)) + b"\n"
+
+        return flask.Response(
+            flask.stream_with_context(generate()),
+            mimetype="application/x-ndjson",
+        )
+
+    def post(self) -> flask.Response:  # pylint: disable=no-self-use
+        """Record one transaction, a JSON list, or an NDJSON batch.
+
+        Rows join the write-behind buffer and are committed together with
+        other requests' (see `app.ingest`); the response is sent only once
+        they're durable. Send an `Idempotency-Key` header to make retries
+        safe: a key that was already committed is acknowledged with
+        `"duplicate": true` and nothing is written. A full buffer answers
+        503 with `Retry-After`.
+
+        Example:
+        ```bash
+        % curl -X POST -H Content-Type:application/x-ndjson \\
+               -H 'Idempotency-Key: 6f1c0e1e-batch-42' \\
+               --data-binary @transactions.ndjson \\
+               http://localhost:8080/api/transactions
+        {"accepted": 2, "duplicate": false}
+        ```
+        """
+
+        try:
+            rows = parse_rows(flask.request.get_data(), flask.request.mimetype)
+        except (orjson.JSONDecodeError, ValueError) as error:
+            flask_restful.abort(400, message=str(error))
+        if not rows:
+            flask_restful.abort(400, message="no transactions")
+        if len(rows) > ingest.MAX_REQUEST_ROWS:
+            flask_restful.abort(
+                413, message=f"at most {ingest.MAX_REQUEST_ROWS} per request"
+            )
+
+        try:
+            future = ingest.BUFFER.submit(
+                rows, flask.request.headers.get(IDEMPOTENCY_KEY_HEADER)
+            )
+        except ingest.BufferFull:
+            return (
+                {"message": "ingest buffer full, retry later"},
+                503,
+                {"Retry-After": "1"},
+            )
+
+        try:
+            result = future.result(timeout=ingest.ACK_TIMEOUT)
+        except concurrent.futures.TimeoutError:
+            # May still commit; a retry with the same key is safe
+            return {"message": "not yet committed, retry"}, 503
+        except (exc.IntegrityError, exc.DataError) as error:
+            flask_restful.abort(422, message=str(error.orig).strip())
+        except exc.SQLAlchemyError:
+            LOG.exception("Ingest failed")
+            return {"message": "ingest failed, retry"}, 503
+
+        return result._asdict(), 200 if result.duplicate else 201
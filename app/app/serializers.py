@@ -0,0 +1,101 @@
+"""Model serialization for the read path.
+
+Each model gets a `Serializer`, built once, that knows which columns to
+select and how to turn a Core row (or model instance) into a JSON-ready
+dict: UUIDs become strings, while datetimes and Decimals are left for the
+encoder. Encoding uses orjson, which handles datetimes natively; Decimals
+are written as exact JSON numbers rather than floats or strings.
+"""
+
+import decimal
+import functools
+import uuid
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Type
+
+import flask
+import orjson
+import sqlalchemy
+from sqlalchemy.dialects import postgresql
+
+_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, decimal.Decimal):
+        return orjson.Fragment(str(value).encode())
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(value: Any) -> bytes:
+    """Encode `value` as JSON."""
+    return orjson.dumps(value, default=_default, option=_OPTIONS)
+
+
+def loads(data: bytes) -> Any:
+    """Decode JSON."""
+    return orjson.loads(data)
+
+
+def output_json(
+    data: Any, code: int, headers: Optional[Dict[str, str]] = None
+) -> flask.Response:
+    """flask_restful representation for `application/json`."""
+    response = flask.make_response(dumps(data), code)
+    response.headers.extend(headers or {})
+    response.mimetype = "application/json"
+    return response
+
+
+def _converter(column: sqlalchemy.Column) -> Optional[Callable[[Any], Any]]:
+    if isinstance(column.type, postgresql.UUID) and column.type.as_uuid:
+        return str
+    return None
+
+
+class Serializer:
+    """Precomputed column list and converters for one model."""
+
+    def __init__(
+        self, model: Type[Any], columns: Sequence[str] = None
+    ) -> None:
+        table = model.__table__
+        names = columns or [column.name for column in table.columns]
+        self.model = model
+        self.columns: List[sqlalchemy.Column] = [
+            table.columns[name] for name in names
+        ]
+        self._fields: List[Tuple[str, Optional[Callable[[Any], Any]]]] = [
+            (column.name, _converter(column)) for column in self.columns
+        ]
+
+    def select(self) -> sqlalchemy.sql.Select:
+        """Core SELECT of just the serialized columns."""
+        return sqlalchemy.select(self.columns)
+
+    def row(self, row: Sequence[Any]) -> Dict[str, Any]:
+        """Serialize a row selected by `select()`."""
+        return {
+            name: value if convert is None or value is None else convert(value)
+            for (name, convert), value in zip(self._fields, row)
+        }
+
+    def instance(self, instance: Any) -> Dict[str, Any]:
+        """Serialize a model instance."""
+        return self.row([getattr(instance, name) for name, _ in self._fields])
+
+
+@functools.lru_cache(maxsize=None)
+def serializer_for(
+    model: Type[Any], columns: Tuple[str, ...] = None
+) -> Serializer:
+    """The shared serializer for `model` (and optionally a column subset)."""
+    return Serializer(model, columns)
@@ -0,0 +1,47 @@
+"""Application settings.
+
+Settings are read from `config.ini` (or the file named by `APP_CONFIG`).
+Any option can be overridden with an environment variable named
+`<SECTION>_<OPTION>` in upper case, e.g. `CACHE_MAXSIZE=50000`.
+"""
+
+import configparser
+import os
+import pathlib
+from typing import Optional
+
+CONFIG_PATH = os.environ.get(
+    "APP_CONFIG",
+    str(pathlib.Path(__file__).resolve().parent.parent / "config.ini"),
+)
+
+_parser = configparser.ConfigParser()
+_parser.read(CONFIG_PATH)
+
+
+def get(
+    section: str, option: str, fallback: Optional[str] = None
+) -> Optional[str]:
+    """Get a setting, preferring the environment over `config.ini`."""
+    env_value = os.environ.get(f"{section}_{option}".upper())
+    if env_value is not None:
+        return env_value
+    return _parser.get(section, option, fallback=fallback)
+
+
+def get_int(section: str, option: str, fallback: int) -> int:
+    """Get an integer setting."""
+    return int(get(section, option, str(fallback)))
+
+
+def get_float(section: str, option: str, fallback: float) -> float:
+    """Get a float setting."""
+    return float(get(section, option, str(fallback)))
+
+
+def get_bool(section: str, option: str, fallback: bool) -> bool:
+    """Get a boolean setting."""
+    value = get(section, option)
+    if value is None:
+        return fallback
+    return value.strip().lower() in ("1", "true", "yes", "on")
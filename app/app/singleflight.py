@@ -0,0 +1,318 @@
+"""Single-flight computation of expensive aggregates.
+
+When a popular cached value expires, every request that misses would
+recompute it at once, in every thread and every worker. A `SingleFlight`
+lets one caller compute while the rest wait for its result:
+
+- threads in a process queue on a per-key lock;
+- processes queue on a Postgres advisory lock taken through the pals
+  locker that `postgres.DatabaseConnection` builds (`models.Base.locker`);
+- the result is published in the `aggregate_result` table, so a waiter in
+  another process reads it there instead of computing it again. Rows
+  too stale for anyone to use are deleted as new ones are published.
+
+A caller that finds the computation already running and holds a value
+less than `max_stale` seconds past its TTL returns that instead of
+waiting. Values go through `serializers.dumps`/`loads` on their way to
+the shared table, so Decimals come back as floats.
+
+```python
+MONTH_TO_DATE = singleflight.register(
+    singleflight.SingleFlight("month_to_date", ttl=60)
+)
+total = MONTH_TO_DATE.get(f"{member_uuid}:{date}", compute)
+```
+
+`run_once()` does the same for work with no result, like a rollup
+rebuild: callers that find it running wait for it instead of repeating it.
+
+Counters are at `/_mgmt/singleflight` and in `/_mgmt/metrics`.
+"""
+
+import datetime
+import threading
+import time
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import pals
+import sqlalchemy
+from sqlalchemy.dialects import postgresql
+
+from app import cache
+from app import metrics
+from app import models
+from app import serializers
+from app import settings
+
+MAX_STALE = settings.get_float("singleflight", "max_stale_s", 30)
+LOCK_TIMEOUT_MS = settings.get_int("singleflight", "lock_timeout_ms", 10000)
+
+WAIT_DURATION = metrics.Histogram(
+    "app_singleflight_wait_seconds",
+    "Time spent waiting for another caller's computation.",
+    ["name"],
+)
+metrics.HISTOGRAMS.append(WAIT_DURATION)
+
+_COUNTERS = ("hits", "computed", "shared", "stale", "contended", "timeouts")
+
+
+def _wait_for(lock: pals.core.Lock, timeout_ms: int) -> bool:
+    acquired = lock.acquire(blocking=True, acquire_timeout=timeout_ms)
+    # pals leaves its lock_timeout set on the pooled connection
+    with lock.conn.begin():
+        lock.conn.execute("RESET lock_timeout")
+    return acquired
+
+
+class SingleFlight:
+    """Cached values of one kind, computed by one caller at a time."""
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        max_stale: float = MAX_STALE,
+        lock_timeout_ms: int = LOCK_TIMEOUT_MS,
+    ) -> None:
+        self.name = name
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.lock_timeout_ms = lock_timeout_ms
+        # entries are `(value, computed_at)`, kept until they're too stale
+        self.cache = cache.register(
+            cache.LRUCache(f"singleflight_{name}", ttl=ttl + max_stale)
+        )
+
+        self._flights: Dict[str, threading.Lock] = {}
+        self._flights_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._counts = dict.fromkeys(_COUNTERS, 0)
+        self._wait_seconds = 0.0
+        self._pruned_at: Optional[float] = None
+
+    def get(self, key: str, compute: Callable[[], Any]) -> Any:
+        """The value for `key`, calling `compute` only if nobody else is."""
+        entry = self.cache.get(key)
+        if self._fresh(entry):
+            self._count("hits")
+            return entry[0]
+
+        flight = self._flight(key)
+        if not flight.acquire(blocking=False):
+            self._count("contended")
+            if entry is not None:
+                self._count("stale")
+                return entry[0]
+            started = time.perf_counter()
+            flight.acquire()
+            self._waited(time.perf_counter() - started)
+        try:
+            entry = self.cache.get(key)
+            if self._fresh(entry):
+                self._count("hits")
+                return entry[0]
+            return self._get_across_processes(key, compute, entry)
+        finally:
+            flight.release()
+
+    def _get_across_processes(
+        self,
+        key: str,
+        compute: Callable[[], Any],
+        entry: Optional[Tuple[Any, float]],
+    ) -> Any:
+        if models.Base.locker is None:
+            # not connected through `DatabaseConnection`; this process only
+            value = compute()
+            self._count("computed")
+            self.cache.set(key, (value, time.time()))
+            return value
+
+        lock = models.Base.locker.lock(f"singleflight:{self.name}:{key}")
+        try:
+            if not lock.acquire(blocking=False):
+                self._count("contended")
+                if entry is not None:
+                    self._count("stale")
+                    return entry[0]
+                started = time.perf_counter()
+                acquired = _wait_for(lock, self.lock_timeout_ms)
+                self._waited(time.perf_counter() - started)
+                if not acquired:
+                    # computing it ourselves beats failing the request
+                    self._count("timeouts")
+
+            shared = self._load(key)
+            if self._fresh(shared):
+                self._count("shared")
+                self.cache.set(key, shared)
+                return shared[0]
+
+            value = compute()
+            self._count("computed")
+            self.cache.set(key, (value, time.time()))
+            self._publish(key, value)
+            return value
+        finally:
+            lock.release()
+
+    def invalidate(self, key: str) -> None:
+        """Drop `key` here; others recompute once their copy expires."""
+        self.cache.invalidate(key)
+
+    def _fresh(self, entry: Optional[Tuple[Any, float]]) -> bool:
+        return entry is not None and time.time() - entry[1] < self.ttl
+
+    def _flight(self, key: str) -> threading.Lock:
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                if len(self._flights) >= self.cache.maxsize:
+                    # idle flights are cheap to recreate
+                    self._flights = {
+                        name: lock
+                        for name, lock in self._flights.items()
+                        if lock.locked()
+                    }
+                flight = self._flights[key] = threading.Lock()
+            return flight
+
+    def _load(self, key: str) -> Optional[Tuple[Any, float]]:
+        table = models.AggregateResult.__table__
+        row = models.Base.locker.engine.execute(
+            sqlalchemy.select(
+                [
+                    table.c.value,
+                    sqlalchemy.func.extract(
+                        "epoch", sqlalchemy.func.now() - table.c.computed_at
+                    ),
+                ]
+            ).where(
+                sqlalchemy.and_(table.c.name == self.name, table.c.key == key)
+            )
+        ).first()
+        if row is None:
+            return None
+        value, age = row
+        return serializers.loads(value), time.time() - float(age)
+
+    def _publish(self, key: str, value: Any) -> None:
+        table = models.AggregateResult.__table__
+        insert = postgresql.insert(table).values(
+            name=self.name,
+            key=key,
+            value=serializers.dumps(value).decode(),
+            computed_at=sqlalchemy.func.now(),
+        )
+        models.Base.locker.engine.execute(
+            insert.on_conflict_do_update(
+                index_elements=[table.c.name, table.c.key],
+                set_={
+                    "value": insert.excluded.value,
+                    "computed_at": insert.excluded.computed_at,
+                },
+            )
+        )
+
+        # at most once per TTL + max_stale, so no row lasts twice that long
+        now = time.monotonic()
+        if (
+            self._pruned_at is None
+            or now - self._pruned_at >= self.ttl + self.max_stale
+        ):
+            self._pruned_at = now
+            self._prune()
+
+    def _prune(self) -> None:
+        """Delete this flight's shared values that are past `max_stale`."""
+        table = models.AggregateResult.__table__
+        models.Base.locker.engine.execute(
+            table.delete().where(
+                sqlalchemy.and_(
+                    table.c.name == self.name,
+                    table.c.computed_at
+                    < sqlalchemy.func.now()
+                    - datetime.timedelta(seconds=self.ttl + self.max_stale),
+                )
+            )
+        )
+
+    def _count(self, counter: str) -> None:
+        with self._stats_lock:
+            self._counts[counter] += 1
+
+    def _waited(self, seconds: float) -> None:
+        WAIT_DURATION.labels(self.name).observe(seconds)
+        with self._stats_lock:
+            self._wait_seconds += seconds
+
+    def stats(self) -> Dict[str, Any]:
+        """Contention counters and total wait time."""
+        with self._stats_lock:
+            return {
+                "name": self.name,
+                "ttl": self.ttl,
+                "max_stale": self.max_stale,
+                **self._counts,
+                "wait_seconds": self._wait_seconds,
+            }
+
+
+def run_once(
+    name: str,
+    run: Callable[[], Any],
+    lock_timeout_ms: int = LOCK_TIMEOUT_MS,
+) -> bool:
+    """Call `run` unless another caller, in any process, is already in it.
+
+    If one is, wait (up to `lock_timeout_ms`) for it to finish instead.
+    Returns whether this caller ran it.
+    """
+    lock = models.Base.locker.lock(f"singleflight:{name}")
+    try:
+        if lock.acquire(blocking=False):
+            run()
+            return True
+        started = time.perf_counter()
+        _wait_for(lock, lock_timeout_ms)
+        WAIT_DURATION.labels(name).observe(time.perf_counter() - started)
+        return False
+    finally:
+        lock.release()
+
+
+FLIGHTS: Dict[str, SingleFlight] = {}
+
+
+def register(flight: SingleFlight) -> SingleFlight:
+    """Expose a flight's stats by name."""
+    FLIGHTS[flight.name] = flight
+    return flight
+
+
+def stats() -> List[Dict[str, Any]]:
+    """Counters for every registered flight."""
+    return [flight.stats() for flight in FLIGHTS.values()]
+
+
+def _singleflight_metrics() -> List[str]:
+    lines = []
+    all_stats = stats()
+    for counter in _COUNTERS:
+        name = f"app_singleflight_{counter}_total"
+        lines.append(f"# TYPE {name} counter")
+        for flight_stats in all_stats:
+            lines.append(
+                f'{name}{{name="{flight_stats["name"]}"}} '
+                f"{flight_stats[counter]}"
+            )
+    return lines
+
+
+metrics.COLLECTORS.append(_singleflight_metrics)
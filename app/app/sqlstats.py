@@ -0,0 +1,316 @@
+"""Per-statement SQL statistics, slow query log and EXPLAIN capture.
+
+Opt in with `enabled = true` in the `[sqlstats]` section of `config.ini`
+(or `SQLSTATS_ENABLED=true`). Statements are normalized into fingerprints
+with literals and bind parameters replaced, and latency and row counts are
+kept per fingerprint for the life of the process.
+
+Statements slower than `slow_query_ms` are logged. A sample of slow
+`SELECT`s is re-run as `EXPLAIN (ANALYZE, BUFFERS)` on a background thread,
+inside a transaction that is rolled back, and the latest plan is kept with
+the fingerprint's stats. Reads with side effects (advisory locks,
+`nextval`, `pg_notify`, `FOR UPDATE`) only get a plain `EXPLAIN`; see
+`explain_command`.
+"""
+
+import collections
+import hashlib
+import logging
+import queue
+import random
+import re
+import threading
+import time
+from typing import Any
+from typing import Deque
+from typing import Dict
+from typing import List
+from typing import Optional
+
+import sqlalchemy
+
+from app import settings
+
+LOG = logging.getLogger(__name__)
+
+ENABLED = settings.get_bool("sqlstats", "enabled", False)
+SLOW_QUERY_SECONDS = (
+    settings.get_float("sqlstats", "slow_query_ms", 100) / 1000
+)
+EXPLAIN_SAMPLE_RATE = settings.get_float(
+    "sqlstats", "explain_sample_rate", 0.1
+)
+EXPLAIN_INTERVAL = settings.get_float("sqlstats", "explain_interval_s", 60)
+MAX_FINGERPRINTS = settings.get_int("sqlstats", "max_fingerprints", 1000)
+
+# Recent latencies kept per fingerprint for percentiles
+RESERVOIR_SIZE = 256
+
+_LIST = r"\(\s*\?(?:\s*,\s*\?)*\s*\)"
+_NORMALIZERS = [
+    # bind parameters, string literals, then numbers
+    (re.compile(r"%\(\w+\)s|%s|\$\d+"), "?"),
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b"), "?"),
+    # IN lists and multi-row VALUES collapse regardless of length
+    (re.compile(rf"\bIN\s*{_LIST}", re.IGNORECASE), "IN (?)"),
+    (
+        re.compile(rf"\bVALUES\s*({_LIST})(?:\s*,\s*{_LIST})+", re.IGNORECASE),
+        r"VALUES \1",
+    ),
+    (re.compile(r"\s+"), " "),
+]
+_EXPLAINABLE = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+# Reads that EXPLAIN ANALYZE can't safely run a second time: they take or
+# wait on locks (advisory locks, FOR UPDATE), use up sequence values,
+# publish notifications or write through a data-modifying CTE. These get
+# a plain EXPLAIN, which plans without executing.
+_SIDE_EFFECTS = re.compile(
+    r"\b(?:pg_(?:try_)?advisory\w*|nextval|setval|pg_notify|pg_sleep\w*"
+    r"|pg_cancel_backend|pg_terminate_backend|set_config|lo_\w+)\s*\("
+    r"|\bFOR\s+(?:NO\s+KEY\s+)?(?:UPDATE|SHARE|KEY\s+SHARE)\b"
+    r"|\b(?:INSERT|UPDATE|DELETE)\b",
+    re.IGNORECASE,
+)
+_READS_TABLE = re.compile(r"\bFROM\b", re.IGNORECASE)
+
+
+def explain_command(statement: str) -> Optional[str]:
+    """The EXPLAIN to capture `statement`'s plan with, or None to skip it.
+
+    Only plain reads are re-run with ANALYZE. Other reads are planned
+    without running them, and statements that read no table are skipped.
+    """
+    if not _EXPLAINABLE.match(statement) or not _READS_TABLE.search(statement):
+        return None
+    if _SIDE_EFFECTS.search(statement):
+        return "EXPLAIN"
+    return "EXPLAIN (ANALYZE, BUFFERS)"
+
+
+def normalize(statement: str) -> str:
+    """Replace literals and placeholders so equivalent statements match."""
+    for pattern, replacement in _NORMALIZERS:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+def fingerprint(normalized: str) -> str:
+    """Short stable id for a normalized statement."""
+    return hashlib.md5(normalized.encode()).hexdigest()[:16]
+
+
+class StatementStats:
+    """Accumulated stats for one fingerprint."""
+
+    def __init__(self, normalized: str) -> None:
+        self.fingerprint = fingerprint(normalized)
+        self.statement = normalized
+        self.calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.rows = 0
+        self.slow_calls = 0
+        self.recent: Deque[float] = collections.deque(maxlen=RESERVOIR_SIZE)
+        self.plan: Optional[str] = None
+        self.plan_captured_at: Optional[float] = None
+        self.last_explain_requested = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Report row for this fingerprint."""
+        recent = sorted(self.recent)
+
+        def pct(value: float) -> float:
+            if not recent:
+                return 0.0
+            return recent[min(len(recent) - 1, int(value * len(recent)))]
+
+        return {
+            "fingerprint": self.fingerprint,
+            "statement": self.statement,
+            "calls": self.calls,
+            "total_ms": self.total_time * 1000,
+            "mean_ms": self.total_time / self.calls * 1000,
+            "p50_ms": pct(0.50) * 1000,
+            "p95_ms": pct(0.95) * 1000,
+            "max_ms": self.max_time * 1000,
+            "rows": self.rows,
+            "rows_per_call": self.rows / self.calls,
+            "slow_calls": self.slow_calls,
+            "plan": self.plan,
+        }
+
+
+class StatementRegistry:
+    """Per-process table of statement stats."""
+
+    def __init__(self, max_fingerprints: int = MAX_FINGERPRINTS) -> None:
+        self.max_fingerprints = max_fingerprints
+        self.dropped = 0
+        self._stats: Dict[str, StatementStats] = {}
+        self._normalized: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self, statement: str, elapsed: float, rows: int
+    ) -> Optional[StatementStats]:
+        """Add one execution; returns None once the table is full."""
+        normalized = self._normalized.get(statement)
+        if normalized is None:
+            normalized = normalize(statement)
+            if len(self._normalized) < self.max_fingerprints * 4:
+                self._normalized[statement] = normalized
+
+        with self._lock:
+            stats = self._stats.get(normalized)
+            if stats is None:
+                if len(self._stats) >= self.max_fingerprints:
+                    self.dropped += 1
+                    return None
+                stats = self._stats[normalized] = StatementStats(normalized)
+            stats.calls += 1
+            stats.total_time += elapsed
+            stats.max_time = max(stats.max_time, elapsed)
+            stats.rows += max(rows, 0)
+            stats.recent.append(elapsed)
+            if elapsed >= SLOW_QUERY_SECONDS:
+                stats.slow_calls += 1
+        return stats
+
+    def top(
+        self, limit: int = 20, order_by: str = "total_ms"
+    ) -> List[Dict[str, Any]]:
+        """Fingerprints ranked by `order_by`, highest first."""
+        with self._lock:
+            rows = [stats.as_dict() for stats in self._stats.values()]
+        rows.sort(key=lambda row: row[order_by], reverse=True)
+        return rows[:limit]
+
+    def reset(self) -> None:
+        """Forget everything recorded so far."""
+        with self._lock:
+            self._stats.clear()
+            self.dropped = 0
+
+
+REGISTRY = StatementRegistry()
+
+
+class ExplainWorker(threading.Thread):
+    """Runs sampled EXPLAIN ANALYZE off the request path."""
+
+    def __init__(self, engine: sqlalchemy.engine.Engine) -> None:
+        super().__init__(name="sqlstats-explain", daemon=True)
+        self.engine = engine
+        self.queue: "queue.Queue[Any]" = queue.Queue(maxsize=100)
+
+    def submit(
+        self,
+        stats: StatementStats,
+        statement: str,
+        parameters: Any,
+        command: str = "EXPLAIN",
+    ) -> None:
+        """Queue a plan capture, dropping it if the worker is backed up."""
+        try:
+            self.queue.put_nowait((stats, statement, parameters, command))
+        except queue.Full:
+            pass
+
+    def run(self) -> None:
+        while True:
+            stats, statement, parameters, command = self.queue.get()
+            try:
+                stats.plan = self.explain(statement, parameters, command)
+                stats.plan_captured_at = time.time()
+            except Exception:  # pylint: disable=broad-except
+                LOG.exception(f"EXPLAIN failed for {stats.fingerprint}")
+
+    def explain(
+        self, statement: str, parameters: Any, command: str = "EXPLAIN"
+    ) -> str:
+        """Run `command` (see `explain_command`) and roll it back."""
+        raw = self.engine.raw_connection()
+        try:
+            with raw.cursor() as cursor:
+                cursor.execute(f"{command} {statement}", parameters)
+                return "\n".join(row[0] for row in cursor.fetchall())
+        finally:
+            raw.rollback()
+            raw.close()
+
+
+_explainer: Optional[ExplainWorker] = None
+
+
+def _should_explain(stats: StatementStats, statement: str) -> Optional[str]:
+    """The EXPLAIN command to sample `statement` with, if it's due one."""
+    if _explainer is None or random.random() >= EXPLAIN_SAMPLE_RATE:
+        return None
+    command = explain_command(statement)
+    if command is None:
+        return None
+    now = time.monotonic()
+    if now - stats.last_explain_requested < EXPLAIN_INTERVAL:
+        return None
+    stats.last_explain_requested = now
+    return command
+
+
+def _before_cursor_execute(
+    conn: Any, *args: Any  # pylint: disable=unused-argument
+) -> None:
+    conn.info.setdefault("sqlstats_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(
+    conn: Any,
+    cursor: Any,
+    statement: str,
+    parameters: Any,
+    context: Any,  # pylint: disable=unused-argument
+    executemany: bool,
+) -> None:
+    elapsed = time.perf_counter() - conn.info["sqlstats_started"].pop()
+    stats = REGISTRY.record(statement, elapsed, cursor.rowcount)
+    if elapsed < SLOW_QUERY_SECONDS:
+        return
+
+    LOG.warning(
+        f"Slow query {elapsed * 1000:.1f}ms "
+        f"[{stats.fingerprint if stats else 'untracked'}]: "
+        f"{normalize(statement)}"
+    )
+    if stats is None or executemany:
+        return
+    command = _should_explain(stats, statement)
+    if command is not None:
+        _explainer.submit(stats, statement, parameters, command)
+
+
+def _handle_error(context: Any) -> None:
+    if context.connection is not None:
+        started = context.connection.info.get("sqlstats_started")
+        if started:
+            started.pop()
+
+
+def instrument_engine(engine: sqlalchemy.engine.Engine) -> None:
+    """Collect statement stats for every statement run on `engine`."""
+    global _explainer  # pylint: disable=global-statement
+
+    sqlalchemy.event.listen(
+        engine, "before_cursor_execute", _before_cursor_execute
+    )
+    sqlalchemy.event.listen(
+        engine, "after_cursor_execute", _after_cursor_execute
+    )
+    sqlalchemy.event.listen(engine, "handle_error", _handle_error)
+
+    if EXPLAIN_SAMPLE_RATE > 0 and _explainer is None:
+        _explainer = ExplainWorker(engine)
+        _explainer.start()
+    LOG.info(
+        f"SQL statement stats enabled; slow queries over "
+        f"{SLOW_QUERY_SECONDS * 1000:.0f}ms are logged"
+    )
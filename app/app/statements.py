@@ -0,0 +1,271 @@
+"""Month-end statement batch job.
+
+Computes every member's totals for a month, one row per member, card and
+category, and writes them as CSV or Parquet. The `member_uuid` space is
+split into `--partitions` equal ranges, exported by a pool of worker
+processes. Each partition is a single grouped query, read through a
+server-side cursor and written to its own file, so memory stays flat
+however many members a range holds.
+
+A partition's file appears (by rename) only once it is complete, so an
+interrupted run picks up where it stopped when started again with the
+same options. `_SUCCESS` is written once every partition is done.
+
+Parquet output needs the `statements` extra (pyarrow).
+
+Example:
+```bash
+% app-statements --month 2021-09 --output statements --format parquet
+```
+"""
+
+import argparse
+import calendar
+import csv
+import datetime
+import json
+import logging
+import multiprocessing
+import os
+import time
+import uuid
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+from app import models
+from app import postgres
+
+try:
+    import pyarrow
+    from pyarrow import parquet
+except ImportError:
+    pyarrow = None
+    parquet = None
+
+LOG = logging.getLogger(__name__)
+
+COLUMNS = ("member_uuid", "card_id", "category", "transactions", "total")
+
+# Per-process connection, opened by `_init_worker`
+_conn: Optional[postgres.DatabaseConnection] = None
+
+
+def member_ranges(
+    partitions: int,
+) -> List[Tuple[Optional[str], Optional[str]]]:
+    """Split the UUID space into `partitions` `(low, high)` ranges.
+
+    The first range has no lower bound and the last no upper bound.
+    """
+    bounds = [
+        str(uuid.UUID(int=index * 2**128 // partitions))
+        for index in range(1, partitions)
+    ]
+    return list(zip([None] + bounds, bounds + [None]))
+
+
+def write_csv(path: str, batches: Iterable[Sequence[Any]]) -> int:
+    """Write row batches as CSV with a header; returns the row count."""
+    rows = 0
+    with open(path, "w", newline="") as output:
+        writer = csv.writer(output)
+        writer.writerow(COLUMNS)
+        for batch in batches:
+            writer.writerows(batch)
+            rows += len(batch)
+    return rows
+
+
+def write_parquet(path: str, batches: Iterable[Sequence[Any]]) -> int:
+    """Write row batches as one Parquet row group each."""
+    if pyarrow is None:
+        raise RuntimeError(
+            "Parquet output needs pyarrow; install .[statements]"
+        )
+    schema = pyarrow.schema(
+        [
+            ("member_uuid", pyarrow.string()),
+            ("card_id", pyarrow.int32()),
+            ("category", pyarrow.string()),
+            ("transactions", pyarrow.int64()),
+            ("total", pyarrow.decimal128(18, 2)),
+        ]
+    )
+    rows = 0
+    with parquet.ParquetWriter(path, schema) as writer:
+        for batch in batches:
+            columns = list(zip(*batch))
+            writer.write_table(
+                pyarrow.Table.from_arrays(
+                    [
+                        pyarrow.array(column, type=field.type)
+                        for column, field in zip(columns, schema)
+                    ],
+                    schema=schema,
+                )
+            )
+            rows += len(batch)
+    return rows
+
+
+WRITERS: Dict[str, Callable[[str, Iterable[Sequence[Any]]], int]] = {
+    "csv": write_csv,
+    "parquet": write_parquet,
+}
+
+
+def month_bounds(month: datetime.date) -> Tuple[datetime.date, datetime.date]:
+    """First day of `month` and of the month after."""
+    days = calendar.monthrange(month.year, month.month)[1]
+    start = month.replace(day=1)
+    return start, start + datetime.timedelta(days=days)
+
+
+def job_directory(options: argparse.Namespace) -> str:
+    """Where a month's partition files go."""
+    return os.path.join(options.output, options.month.strftime("%Y-%m"))
+
+
+def partition_path(options: argparse.Namespace, index: int) -> str:
+    """The finished file for partition `index`."""
+    return os.path.join(
+        job_directory(options), f"part-{index:05d}.{options.format}"
+    )
+
+
+def _init_worker() -> None:
+    global _conn  # pylint: disable=global-statement
+    _conn = postgres.DatabaseConnection()
+
+
+def export_partition(args: Tuple[Any, ...]) -> Tuple[int, int, float]:
+    """Export one `member_uuid` range to its file.
+
+    Returns `(index, rows, seconds)`.
+    """
+    options, index, low, high = args
+    started = time.monotonic()
+    start, end = month_bounds(options.month)
+    # Spread partitions over the replicas, if there are any
+    engines = _conn.replica_engines or [_conn.engine]
+    engine = engines[index % len(engines)]
+
+    path = partition_path(options, index)
+    partial = f"{path}.partial"
+    with engine.connect() as db:
+        result = db.execution_options(stream_results=True).execute(
+            models.Transactions.statement_select(start, end, low, high)
+        )
+        batches = iter(lambda: result.fetchmany(options.batch_size), [])
+        rows = WRITERS[options.format](partial, batches)
+    os.replace(partial, path)
+    return index, rows, time.monotonic() - started
+
+
+def _check_job(options: argparse.Namespace) -> None:
+    """Record the run's layout, or check a resumed run matches it."""
+    job = {
+        "month": options.month.isoformat(),
+        "partitions": options.partitions,
+        "format": options.format,
+    }
+    path = os.path.join(job_directory(options), "_job.json")
+    if os.path.exists(path):
+        with open(path) as existing:
+            previous = json.load(existing)
+        if previous != job:
+            raise SystemExit(
+                f"{job_directory(options)} holds a run with {previous}; "
+                "resume with the same options or use another --output"
+            )
+        return
+    with open(path, "w") as output:
+        json.dump(job, output)
+
+
+def run(options: argparse.Namespace) -> None:
+    """Export every partition not already written."""
+    os.makedirs(job_directory(options), exist_ok=True)
+    _check_job(options)
+
+    ranges = member_ranges(options.partitions)
+    work = [
+        (options, index, low, high)
+        for index, (low, high) in enumerate(ranges)
+        if not os.path.exists(partition_path(options, index))
+    ]
+    if len(work) < len(ranges):
+        LOG.info(f"Resuming: {len(ranges) - len(work)} partitions done")
+
+    started = time.monotonic()
+    done = len(ranges) - len(work)
+    total_rows = 0
+    with multiprocessing.Pool(
+        options.workers, initializer=_init_worker
+    ) as pool:
+        for index, rows, seconds in pool.imap_unordered(
+            export_partition, work
+        ):
+            done += 1
+            total_rows += rows
+            elapsed = time.monotonic() - started
+            LOG.info(
+                f"partition {index} ({done}/{len(ranges)}): {rows} rows "
+                f"in {seconds:.1f}s, {total_rows / elapsed:.0f} rows/s"
+            )
+
+    with open(os.path.join(job_directory(options), "_SUCCESS"), "w"):
+        pass
+    LOG.info(
+        f"Exported {total_rows} rows to {job_directory(options)} in "
+        f"{time.monotonic() - started:.1f}s"
+    )
+
+
+def _month(value: str) -> datetime.date:
+    return datetime.datetime.strptime(value, "%Y-%m").date()
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--month",
+        type=_month,
+        required=True,
+        help="statement month, as YYYY-MM",
+    )
+    parser.add_argument("--output", default="statements")
+    parser.add_argument("--format", choices=sorted(WRITERS), default="csv")
+    parser.add_argument(
+        "--partitions",
+        type=int,
+        default=64,
+        help="member_uuid ranges; also the unit of resumption",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=10_000,
+        help="rows fetched from the cursor, and per Parquet row group",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=multiprocessing.cpu_count()
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> None:
+    """Run the statement export."""
+    logging.basicConfig(level=logging.INFO)
+    run(parse_args(argv))
+
+
+if __name__ == "__main__":
+    main()
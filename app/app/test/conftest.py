@@ -1,20 +1,28 @@
 """Global fixtures and other test config."""
 
+import contextlib
 import logging
+import os
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from unittest import mock
 
+import faker
 import flask
 import pytest
-from petal.utils import faker
 import sqlalchemy
-from petal.utils.postgres import connection
-from petal.utils.postgres import models
-
 
+from app import cache
+from app import models
+from app import postgres
 from app.resources import server
-from app import settings
 
 # pylint: disable=redefined-outer-name
 
+# Members `seeded_template` generates
+SEED_MEMBERS = 500
+
 
 @pytest.fixture
 def debug(caplog):
@@ -23,8 +31,6 @@ def debug(caplog):
     caplog.set_level(logging.WARNING, logger="faker")
     caplog.set_level(logging.CRITICAL, logger="ddtrace")
     caplog.set_level(logging.CRITICAL, logger="datadog")
-    caplog.set_level(logging.INFO, logger="petal.config")
-    caplog.set_level(logging.INFO, logger="petal.svc_authnz")
     caplog.set_level(logging.WARNING, logger="botocore")
     yield caplog
 
@@ -35,40 +41,185 @@ def fake():
     yield faker.Faker()
 
 
-@pytest.fixture
-def database(postgresql_proc):
-    """Create a fake database connection."""
-    force_config = {
-        "postgres/schema": "postgresql+psycopg2",
-        "postgres/username": postgresql_proc.user,
-        "postgres/password": "Interviews",
-        "postgres/host": postgresql_proc.host,
-        "postgres/port": postgresql_proc.port,
-        "postgres/db_name": postgresql_proc.user,
+def _environment(postgresql_proc: Any, db_name: str) -> Dict[str, str]:
+    return {
+        "POSTGRES_HOST": postgresql_proc.host,
+        "POSTGRES_PORT": str(postgresql_proc.port),
+        "POSTGRES_USER": postgresql_proc.user,
+        "POSTGRES_PASSWORD": "Interviews",
+        "POSTGRES_DB": db_name,
     }
 
-    with settings.config.patch(**force_config):
-        conn = connection.DatabaseConnection(
-            settings.config.get_child("postgres")
-        )
-        models.Base.metadata.create_all(bind=conn.engine)
 
-        yield
+@contextlib.contextmanager
+def _connect(
+    postgresql_proc: Any, db_name: str
+) -> Iterator[postgres.DatabaseConnection]:
+    """Connect to `db_name`, with the environment pointing at it."""
+    with mock.patch.dict(os.environ, _environment(postgresql_proc, db_name)):
+        conn = postgres.DatabaseConnection()
+
+        yield conn
 
         conn.shutdown()
         sqlalchemy.orm.close_all_sessions()
-        models.Base.metadata.drop_all(bind=conn.engine)
-        conn.engine.dispose()
+        for engine in conn.engines:
+            engine.dispose()
+
+
+def _disconnect(admin: sqlalchemy.engine.Engine, db_name: str) -> None:
+    # a template can't be cloned, nor a database dropped, while in use
+    admin.execute(
+        "SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+        "WHERE datname = %(name)s AND pid <> pg_backend_pid()",
+        {"name": db_name},
+    )
+
+
+def _clone(
+    admin: sqlalchemy.engine.Engine, template: str, db_name: str
+) -> None:
+    admin.execute(f'DROP DATABASE IF EXISTS "{db_name}"')
+    admin.execute(f'CREATE DATABASE "{db_name}" TEMPLATE "{template}"')
+
+
+def _drop(admin: sqlalchemy.engine.Engine, db_name: str) -> None:
+    _disconnect(admin, db_name)
+    admin.execute(f'DROP DATABASE IF EXISTS "{db_name}"')
+
+
+def _db_name(*parts: str) -> str:
+    # one set of databases per xdist worker; identifiers max out at 63
+    worker = os.environ.get("PYTEST_XDIST_WORKER", "main")
+    return "_".join(("test", worker, *parts))[:63]
+
+
+@pytest.fixture(scope="session")
+def admin_engine(postgresql_proc):
+    """Autocommit engine for `CREATE DATABASE` and `DROP DATABASE`."""
+    force_env = _environment(postgresql_proc, postgresql_proc.user)
+    with mock.patch.dict(os.environ, force_env):
+        uri = postgres.DatabaseConnection(delay_connect=True).uri
+    engine = sqlalchemy.create_engine(uri, isolation_level="AUTOCOMMIT")
+
+    yield engine
+
+    engine.dispose()
+
+
+@pytest.fixture(scope="session")
+def schema_template(postgresql_proc, admin_engine):
+    """Template database holding the empty schema, built once."""
+    name = _db_name("schema")
+    admin_engine.execute(f'DROP DATABASE IF EXISTS "{name}"')
+    admin_engine.execute(f'CREATE DATABASE "{name}"')
+    with _connect(postgresql_proc, name) as conn:
+        models.Base.metadata.create_all(bind=conn.engine)
+
+    yield name
+
+    _drop(admin_engine, name)
+
+
+@pytest.fixture(scope="session")
+def seeded_template(postgresql_proc, admin_engine, schema_template):
+    """Template database seeded by `app.datagen`, built once."""
+    # numpy is a test requirement, but keep it off the unit tests' imports
+    from app import datagen  # pylint: disable=import-outside-toplevel
+
+    name = _db_name("seeded")
+    _clone(admin_engine, schema_template, name)
+    with mock.patch.dict(os.environ, _environment(postgresql_proc, name)):
+        datagen.generate(
+            datagen.parse_args(
+                [
+                    f"--members={SEED_MEMBERS}",
+                    "--transactions-per-card=20",
+                    "--chunk-size=250",
+                    "--workers=1",
+                ]
+            )
+        )
+    _disconnect(admin_engine, name)
+
+    yield name
+
+    _drop(admin_engine, name)
+
+
+@pytest.fixture
+def database(postgresql_proc, admin_engine, schema_template):
+    """Create a fake database connection to a fresh, empty database."""
+    name = _db_name("database")
+    _clone(admin_engine, schema_template, name)
+    # entries cached from the previous test's database
+    cache.clear_all()
+    with _connect(postgresql_proc, name) as conn:
+        yield conn
+    _drop(admin_engine, name)
+
+
+@pytest.fixture(scope="module")
+def seeded_database(request, postgresql_proc, admin_engine, seeded_template):
+    """Connect to this module's clone of the seeded template.
+
+    Use `seeded` in tests, so each one's writes are rolled back.
+    """
+    name = _db_name(request.module.__name__.rsplit(".", 1)[-1])
+    _clone(admin_engine, seeded_template, name)
+    with _connect(postgresql_proc, name) as conn:
+        yield conn
+    _drop(admin_engine, name)
+
+
+@pytest.fixture
+def seeded(seeded_database):
+    """The seeded database, inside a transaction rolled back after the test.
+
+    The model session is bound to one connection, and each of its commits
+    only releases a SAVEPOINT. Work on other connections (the engines
+    directly, a Flask `client`) is not covered and would leak into the
+    module's later tests.
+    """
+    session_factory = seeded_database.session
+    engine = seeded_database.engine
+    # another test's connection may have pointed the models elsewhere
+    models.Base.query = session_factory.query_property()
+    models.Base.locker = seeded_database.locker
+    cache.clear_all()
+    connection = engine.connect()
+    transaction = connection.begin()
+    session_factory.remove()
+    session_factory.configure(bind=connection, primary=connection)
+    session = session_factory()
+    session.begin_nested()
+
+    @sqlalchemy.event.listens_for(session, "after_transaction_end")
+    def _restart_savepoint(session, ended):
+        # pylint: disable=protected-access
+        if ended.nested and not ended._parent.nested:
+            session.begin_nested()
+
+    yield seeded_database
+
+    session_factory.remove()
+    session_factory.configure(bind=engine, primary=engine)
+    transaction.rollback()
+    connection.close()
 
 
 @pytest.fixture
 def client(database, fake):  # pylint: disable=unused-argument
     """Get a fake Flask client."""
-    force_config = {"flask/debug": True, "flask/secret_key": fake.word()}
-    with settings.config.patch(**force_config):
-        app = flask.Flask(__name__)
-        logging.getLogger().handlers = []
+    app = flask.Flask(__name__)
+    app.config.update(TESTING=True, SECRET_KEY=fake.word())
+    logging.getLogger().handlers = []
+
+    api = server.InterviewsServer(app=app)
+    api.warmup()
 
-        api = server.InterviewsServer(app=app, TESTING=True)
+    yield api.app.test_client()
 
-        yield api.app.test_client()
+    # before the database is dropped from under them
+    api.cache_listener.stop()
+    api.ingest_buffer.stop()
@@ -0,0 +1,119 @@
+"""ASGI server tests: same answers as the threaded server."""
+
+import datetime
+import decimal
+
+import pytest
+
+from app import models
+
+testclient = pytest.importorskip("starlette.testclient")
+
+# pylint: disable=redefined-outer-name,wrong-import-position
+from app import asgi  # noqa: E402
+
+MEMBER_UUID = "992a54a8-3d3d-43de-a852-4aa41f16cc27"
+UNKNOWN_UUID = "00000000-0000-0000-0000-000000000000"
+
+
+@pytest.fixture
+def clients(client):
+    """The threaded and ASGI clients, over a member with spend."""
+    models.Member.put(
+        models.Member(member_uuid=MEMBER_UUID, first_name="Bobby")
+    )
+    card = models.Card.put(models.Card(member_uuid=MEMBER_UUID))
+    models.Transactions.put_many(
+        [
+            {
+                "card_id": card.id,
+                "amount": decimal.Decimal("12.34") * day,
+                "transaction_date": datetime.datetime(2021, 9, day, 12),
+            }
+            for day in (1, 14, 28, 30)
+        ]
+    )
+    with testclient.TestClient(asgi.create_app()) as asgi_client:
+        yield client, asgi_client
+
+
+def test_member_matches(clients):
+    threaded, asgi_client = clients
+    body = {"json": {"member_uuid": MEMBER_UUID}}
+
+    assert (
+        asgi_client.request("GET", "/api/member", **body).json()
+        == threaded.get("/api/member", **body).get_json()
+    )
+
+
+def test_member_invalidated_during_load_is_not_cached(clients, monkeypatch):
+    _, asgi_client = clients
+    args = asgi.MEMBER_ROW.args
+
+    def invalidate_then_args(**params):
+        # as if a NOTIFY arrived while the row was being fetched
+        models.Member.__cache__.invalidate(MEMBER_UUID)
+        return args(**params)
+
+    monkeypatch.setattr(asgi.MEMBER_ROW, "args", invalidate_then_args)
+    asgi_client.request(
+        "GET", "/api/member", json={"member_uuid": MEMBER_UUID}
+    )
+
+    assert models.Member.__cache__.get(MEMBER_UUID) is None
+
+
+@pytest.mark.parametrize("verify", [False, True])
+@pytest.mark.parametrize("member_uuid", [MEMBER_UUID, UNKNOWN_UUID])
+def test_payments_match(clients, verify, member_uuid):
+    threaded, asgi_client = clients
+    body = {
+        "json": {
+            "member_uuid": member_uuid,
+            "date": "2021-09-28",
+            "verify": verify,
+        }
+    }
+
+    assert (
+        asgi_client.request("GET", "/api/payments", **body).json()
+        == threaded.get("/api/payments", **body).get_json()
+    )
+
+
+def test_created_member_reads_back(clients):
+    threaded, asgi_client = clients
+
+    member_uuid = asgi_client.post(
+        "/api/member", json={"first_name": "Rory", "last_name": "LaMendola"}
+    ).json()
+
+    member = threaded.get(
+        "/api/member", json={"member_uuid": member_uuid}
+    ).get_json()
+    assert member["last_name"] == "LaMendola"
+    assert (
+        asgi_client.request(
+            "GET", "/api/member", json={"member_uuid": member_uuid}
+        ).json()
+        == member
+    )
+
+
+@pytest.mark.parametrize("path", ["/api/member", "/api/payments"])
+def test_malformed_member_uuid(clients, path):
+    threaded, asgi_client = clients
+    body = {"json": {"member_uuid": "not-a-uuid", "date": "2021-09-28"}}
+
+    assert asgi_client.request("GET", path, **body).status_code == 400
+    assert threaded.get(path, **body).status_code == 400
+
+
+def test_missing_argument(clients):
+    _, asgi_client = clients
+
+    response = asgi_client.get("/api/payments", params={"date": "2021-09-28"})
+
+    assert response.status_code == 400
+    assert "member_uuid" in response.json()["message"]
@@ -0,0 +1,121 @@
+"""put_many and upsert_many tests."""
+
+import datetime
+import uuid
+
+import sqlalchemy
+
+from app import models
+
+
+def member_uuids(count):
+    """`count` new member UUIDs."""
+    return [str(uuid.uuid4()) for _ in range(count)]
+
+
+def count_inserts(engine, run):
+    """Run `run()`, returning how many INSERT statements it sent."""
+    inserts = []
+
+    def before_execute(_conn, _cursor, statement, *_args):
+        if statement.startswith("INSERT"):
+            inserts.append(statement)
+
+    sqlalchemy.event.listen(engine, "before_cursor_execute", before_execute)
+    try:
+        run()
+    finally:
+        sqlalchemy.event.remove(
+            engine, "before_cursor_execute", before_execute
+        )
+    return len(inserts)
+
+
+def test_put_many_in_batches(database):
+    uuids = member_uuids(5)
+
+    inserts = count_inserts(
+        database.engine,
+        lambda: models.Member.put_many(
+            [{"member_uuid": member_uuid} for member_uuid in uuids],
+            batch_size=2,
+            commit_every=2,
+        ),
+    )
+
+    assert inserts == 3
+    assert models.Member.query.count() == 5
+
+
+def test_put_many_return_ids(database):
+    # pylint: disable=unused-argument
+    uuids = member_uuids(3)
+    models.Member.put_many([{"member_uuid": value} for value in uuids])
+
+    cards = models.Card.put_many(
+        [models.Card(member_uuid=value) for value in uuids], return_ids=True
+    )
+
+    assert all(card.id is not None for card in cards)
+    stored = {card.id: card.member_uuid for card in models.Card.query.all()}
+    assert stored == {card.id: card.member_uuid for card in cards}
+
+
+def test_put_many_mixed_rows_keep_defaults(database):
+    # pylint: disable=unused-argument
+    created_at = datetime.datetime(2021, 9, 1)
+    first, second = member_uuids(2)
+
+    models.Member.put_many(
+        [
+            models.Member(member_uuid=first, created_at=created_at),
+            {"member_uuid": second, "first_name": None},
+        ]
+    )
+
+    assert models.Member.get_by(member_uuid=first).created_at == created_at
+    assert models.Member.get_by(member_uuid=second).created_at is not None
+    cards = models.Card.put_many(
+        [
+            {"member_uuid": first, "is_current": False},
+            {"member_uuid": second},
+        ]
+    )
+    assert len(cards) == 2
+    assert models.Card.get_by(member_uuid=second).is_current is True
+
+
+def test_upsert_many(database):
+    # pylint: disable=unused-argument
+    first, second = member_uuids(2)
+    models.Member.put_many(
+        [
+            {"member_uuid": first, "first_name": "A"},
+            {"member_uuid": second, "first_name": "B"},
+        ]
+    )
+
+    models.Member.upsert_many(
+        [{"member_uuid": first, "first_name": "C", "last_name": "D"}],
+        index_elements=["member_uuid"],
+        update_columns=["first_name"],
+    )
+    models.Member.upsert_many(
+        [{"member_uuid": second, "first_name": "E"}],
+        index_elements=["member_uuid"],
+    )
+
+    models.Member.query.session.expire_all()
+    updated = models.Member.get_by(member_uuid=first)
+    assert (updated.first_name, updated.last_name) == ("C", None)
+    assert models.Member.get_by(member_uuid=second).first_name == "B"
+
+
+def test_put_many_invalidates_cache(database):
+    # pylint: disable=unused-argument
+    (member_uuid,) = member_uuids(1)
+    assert models.Member.get_cached_member(member_uuid) is None
+
+    models.Member.put_many([{"member_uuid": member_uuid}])
+
+    assert models.Member.get_cached_member(member_uuid) is not None
@@ -0,0 +1,70 @@
+"""Model cache invalidation tests across connections."""
+
+import time
+
+import pytest
+import sqlalchemy
+
+from app import cache
+from app import models
+
+# pylint: disable=redefined-outer-name
+
+MEMBER_UUID = "992a54a8-3d3d-43de-a852-4aa41f16cc27"
+
+
+@pytest.fixture
+def listener(database):
+    """A running invalidation listener on the test database."""
+    listener = cache.InvalidationListener(database.engine, poll_interval=0.1)
+    listener.start()
+    assert listener.listening.wait(5)
+
+    yield listener
+
+    listener.stop()
+    listener.join(5)
+
+
+def test_write_on_another_connection_invalidates(database, listener):
+    # pylint: disable=unused-argument
+    models.Member.put(models.Member(member_uuid=MEMBER_UUID, first_name="A"))
+    assert models.Member.get_cached_member(MEMBER_UUID)["first_name"] == "A"
+
+    # as another process's `Member.put` would: the row and its NOTIFY
+    # commit together
+    with database.engine.begin() as other:
+        other.execute(
+            sqlalchemy.text(
+                "UPDATE member SET first_name = 'B' "
+                "WHERE member_uuid = :member_uuid"
+            ),
+            {"member_uuid": MEMBER_UUID},
+        )
+        other.execute(
+            sqlalchemy.select(
+                [
+                    sqlalchemy.func.pg_notify(
+                        cache.CHANNEL, f"member:{MEMBER_UUID}"
+                    )
+                ]
+            )
+        )
+
+    deadline = time.monotonic() + 5
+    while models.Member.__cache__.get(MEMBER_UUID) is not None:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert models.Member.get_cached_member(MEMBER_UUID)["first_name"] == "B"
+
+
+def test_cache_stats(client):
+    client.get("/api/member", json={"member_uuid": MEMBER_UUID})
+    client.get("/api/member", json={"member_uuid": MEMBER_UUID})
+
+    response = client.get("/_mgmt/cache")
+
+    assert response.status_code == 200
+    stats = {entry["name"]: entry for entry in response.json}
+    assert stats["member"]["hits"] + stats["member"]["misses"] >= 2
+    assert set(stats["member"]) >= {"size", "evictions", "stale_loads"}
@@ -0,0 +1,159 @@
+"""card_daily_spend trigger, rebuild and consistency check tests."""
+
+import datetime
+import decimal
+import threading
+import time
+
+import pytest
+import sqlalchemy
+
+from app import models
+
+# pylint: disable=redefined-outer-name
+
+MEMBER_UUID = "992a54a8-3d3d-43de-a852-4aa41f16cc27"
+
+
+@pytest.fixture
+def cards(database):
+    """Two cards of one member, lower id first."""
+    models.Member.put(models.Member(member_uuid=MEMBER_UUID))
+    first = models.Card.put(models.Card(member_uuid=MEMBER_UUID))
+    second = models.Card.put(models.Card(member_uuid=MEMBER_UUID))
+    yield first.id, second.id
+
+
+def spend(card_id, day, amount):
+    """Put one September 2021 transaction."""
+    return models.Transactions.put(
+        models.Transactions(
+            card_id=card_id,
+            amount=decimal.Decimal(amount),
+            transaction_date=datetime.datetime(2021, 9, day, 12),
+        )
+    )
+
+
+def rollup(card_id):
+    """`(spend_date day, amount, cumulative_amount)` rows for a card."""
+    return [
+        (row.spend_date.day, row.amount, row.cumulative_amount)
+        for row in models.CardDailySpend.query.filter_by(card_id=card_id)
+        .order_by(models.CardDailySpend.spend_date)
+        .all()
+    ]
+
+
+def test_back_dated_insert_shifts_later_days(cards):
+    card_id, _ = cards
+    spend(card_id, 10, "5.00")
+    spend(card_id, 20, "7.00")
+    spend(card_id, 5, "1.50")
+    spend(card_id, 10, "2.00")
+
+    assert rollup(card_id) == [
+        (5, decimal.Decimal("1.50"), decimal.Decimal("1.50")),
+        (10, decimal.Decimal("7.00"), decimal.Decimal("8.50")),
+        (20, decimal.Decimal("7.00"), decimal.Decimal("15.50")),
+    ]
+
+
+def test_update_and_delete(cards):
+    first, second = cards
+    moved = spend(first, 10, "5.00")
+    spend(first, 20, "7.00")
+    session = models.Transactions.query.session
+
+    moved.card_id = second
+    session.commit()
+    session.delete(moved)
+    session.commit()
+
+    assert rollup(first)[-1][2] == decimal.Decimal("7.00")
+    assert rollup(second)[-1][2] == decimal.Decimal("0.00")
+    assert models.CardDailySpend.check_consistency() == []
+
+
+def test_check_consistency_reports_and_rebuild_repairs(cards):
+    card_id, _ = cards
+    spend(card_id, 10, "5.00")
+    spend(card_id, 20, "7.00")
+    session = models.CardDailySpend.query.session
+    session.execute(
+        "UPDATE card_daily_spend SET amount = amount + 1 "
+        "WHERE spend_date = '2021-09-10'"
+    )
+    session.commit()
+
+    mismatches = models.CardDailySpend.check_consistency(card_id)
+    assert [(row.card_id, row.spend_date.day) for row in mismatches] == [
+        (card_id, 10)
+    ]
+    assert models.CardDailySpend.check_consistency(card_id + 1000) == []
+
+    models.CardDailySpend.rebuild()
+
+    assert models.CardDailySpend.check_consistency() == []
+
+
+def _wait_for_lock_wait(engine, pid):
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        waiting = engine.execute(
+            sqlalchemy.text(
+                "SELECT wait_event_type = 'Lock' FROM pg_stat_activity "
+                "WHERE pid = :pid"
+            ),
+            {"pid": pid},
+        ).scalar()
+        if waiting:
+            return
+        time.sleep(0.01)
+    raise AssertionError(f"backend {pid} never waited on a lock")
+
+
+def test_opposite_card_moves_do_not_deadlock(database, cards):
+    low, high = cards
+    low_row = spend(low, 10, "5.00")
+    high_row = spend(high, 11, "7.00")
+    engine = database.engine
+    update = sqlalchemy.text(
+        "UPDATE transactions SET card_id = :card_id WHERE id = :id"
+    )
+
+    first = engine.connect()
+    second = engine.connect()
+    first_transaction = first.begin()
+    # holds the lower card's lock
+    spend_on_low = models.Transactions.__table__.insert().values(
+        card_id=low,
+        amount=decimal.Decimal("1.00"),
+        transaction_date=datetime.datetime(2021, 9, 12),
+    )
+    first.execute(spend_on_low)
+
+    second_pid = second.execute("SELECT pg_backend_pid()").scalar()
+    errors = []
+
+    def move_high_to_low():
+        try:
+            with second.begin():
+                second.execute(update, {"card_id": low, "id": high_row.id})
+        except Exception as error:  # pylint: disable=broad-except
+            errors.append(error)
+
+    thread = threading.Thread(target=move_high_to_low)
+    thread.start()
+    _wait_for_lock_wait(engine, second_pid)
+
+    # needs the higher card's lock: deadlocks if the other move took it
+    # before waiting for the lower one
+    first.execute(update, {"card_id": high, "id": low_row.id})
+    first_transaction.commit()
+    thread.join(10)
+    first.close()
+    second.close()
+
+    assert errors == []
+    assert models.CardDailySpend.check_consistency() == []
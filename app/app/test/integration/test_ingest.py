@@ -0,0 +1,127 @@
+"""Transaction ingest endpoint tests."""
+
+import pytest
+from sqlalchemy import exc
+
+from app import ingest
+from app import models
+from app import serializers
+from app.resources import transactions
+
+# pylint: disable=redefined-outer-name
+
+MEMBER_UUID = "992a54a8-3d3d-43de-a852-4aa41f16cc27"
+
+
+@pytest.fixture
+def card(client):
+    """A member with one card."""
+    models.Member.put(models.Member(member_uuid=MEMBER_UUID))
+    card = models.Card.put(models.Card(member_uuid=MEMBER_UUID))
+    yield client, card.id
+
+
+def transaction(card_id, day=1):
+    """One posted transaction."""
+    return {
+        "card_id": card_id,
+        "amount": "12.34",
+        "merchant": "Acme",
+        "category": "gas",
+        "transaction_date": f"2021-09-{day:02d}T12:00:00+00:00",
+    }
+
+
+def count(card_id):
+    """Transactions stored for a card."""
+    return models.Transactions.get_transactions_by_card(card_id).count()
+
+
+def test_single_transaction(card):
+    client, card_id = card
+
+    response = client.post("/api/transactions", json=transaction(card_id))
+
+    assert response.status_code == 201, response.data
+    assert response.get_json() == {"accepted": 1, "duplicate": False}
+    assert count(card_id) == 1
+
+
+def test_ndjson_batch(card):
+    client, card_id = card
+    body = "\n".join(
+        f'{{"card_id": {card_id}, "amount": 1.5, '
+        f'"transaction_date": "2021-09-{day:02d}"}}'
+        for day in range(1, 11)
+    )
+
+    response = client.post(
+        "/api/transactions",
+        data=body,
+        content_type="application/x-ndjson",
+    )
+
+    assert response.get_json() == {"accepted": 10, "duplicate": False}
+    assert count(card_id) == 10
+
+
+def test_retry_with_idempotency_key(card):
+    client, card_id = card
+    headers = {"Idempotency-Key": "batch-42"}
+    body = [transaction(card_id, day) for day in (1, 2)]
+
+    first = client.post("/api/transactions", json=body, headers=headers)
+    retry = client.post("/api/transactions", json=body, headers=headers)
+
+    assert first.status_code == 201
+    assert retry.status_code == 200
+    assert retry.get_json() == {"accepted": 2, "duplicate": True}
+    assert count(card_id) == 2
+
+
+def test_bad_submission_fails_alone(card):
+    _, card_id = card
+    # submitted together, so they land in one group
+    futures = [
+        ingest.BUFFER.submit(
+            transactions.parse_rows(
+                serializers.dumps(transaction(submitted)), "application/json"
+            )
+        )
+        for submitted in (card_id, card_id + 1000, card_id)
+    ]
+
+    assert futures[0].result(timeout=10).accepted == 1
+    with pytest.raises(exc.IntegrityError):
+        futures[1].result(timeout=10)
+    assert futures[2].result(timeout=10).accepted == 1
+    assert count(card_id) == 2
+
+
+def test_bad_card_is_unprocessable(card):
+    client, card_id = card
+
+    response = client.post(
+        "/api/transactions", json=transaction(card_id + 1000)
+    )
+
+    assert response.status_code == 422
+    assert count(card_id) == 0
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        [],
+        [{"card_id": 1}],
+        [{"card_id": 1, "amount": "x", "transaction_date": "2021-09-01"}],
+        [{"card_id": 1, "amount": 1, "transaction_date": "yesterday"}],
+        [{"card_id": True, "amount": 1, "transaction_date": "2021-09-01"}],
+        [{"card_id": 1.9, "amount": 1, "transaction_date": "2021-09-01"}],
+        [{"card_id": "1", "amount": 1, "transaction_date": "2021-09-01"}],
+    ],
+)
+def test_invalid_body(client, body):
+    response = client.post("/api/transactions", json=body)
+
+    assert response.status_code == 400
@@ -0,0 +1,94 @@
+"""Member endpoint tests."""
+
+from app import models
+
+
+def test_created_member_reads_back(client):
+    member_uuid = client.post(
+        "/api/member", json={"first_name": "Bobby", "last_name": "Tables"}
+    ).get_json()
+
+    member = client.get(
+        "/api/member", json={"member_uuid": member_uuid}
+    ).get_json()
+
+    assert member["member_uuid"] == member_uuid
+    assert member["first_name"] == "Bobby"
+    assert member["address"] is None
+
+
+def test_unknown_member(client):
+    response = client.get(
+        "/api/member",
+        json={"member_uuid": "00000000-0000-0000-0000-000000000000"},
+    )
+
+    assert response.get_json() == {}
+
+
+def test_member_uuid_is_normalized(client):
+    member_uuid = client.post(
+        "/api/member", json={"first_name": "Bobby", "last_name": "Tables"}
+    ).get_json()
+
+    member = client.get(
+        "/api/member", json={"member_uuid": member_uuid.upper()}
+    ).get_json()
+
+    assert member["member_uuid"] == member_uuid
+    # cached under the key the invalidations use
+    assert models.Member.__cache__.get(member_uuid) == member
+
+
+def test_malformed_member_uuid(client):
+    response = client.get("/api/member", json={"member_uuid": "not-a-uuid"})
+
+    assert response.status_code == 400
+
+
+def test_search_prefix_and_fuzzy(client):
+    for first_name, last_name in [
+        ("Bobby", "Tables"),
+        ("Roberta", "Tabler"),
+        ("Alice", "Smith"),
+    ]:
+        client.post(
+            "/api/member",
+            json={"first_name": first_name, "last_name": last_name},
+        )
+
+    prefix = client.get("/api/member/search?q=bob").get_json()
+    fuzzy = client.get("/api/member/search?q=Tablez").get_json()
+
+    assert [member["first_name"] for member in prefix] == ["Bobby"]
+    assert {member["last_name"] for member in fuzzy} == {"Tables", "Tabler"}
+
+
+def test_search_ranks_prefix_matches_first(client):
+    for first_name, last_name in [
+        ("Carol", "Stables"),
+        ("Dave", "Tablesworthington"),
+    ]:
+        client.post(
+            "/api/member",
+            json={"first_name": first_name, "last_name": last_name},
+        )
+
+    found = client.get("/api/member/search?q=Tables").get_json()
+
+    # "Stables" is the closer trigram match but not a prefix match
+    assert [member["last_name"] for member in found] == [
+        "Tablesworthington",
+        "Stables",
+    ]
+
+
+def test_search_limit(client):
+    for _ in range(3):
+        client.post(
+            "/api/member", json={"first_name": "Bobby", "last_name": "Tables"}
+        )
+
+    assert len(client.get("/api/member/search?q=bob&limit=2").get_json()) == 2
+    assert client.get("/api/member/search?q=bob&limit=101").status_code == 400
+    assert client.get("/api/member/search?q=bo").status_code == 400
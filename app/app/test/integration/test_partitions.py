@@ -0,0 +1,115 @@
+"""Monthly transactions partition tests."""
+
+import datetime
+import decimal
+
+import pytest
+
+from app import models
+from app import partitions
+
+# pylint: disable=redefined-outer-name
+
+MEMBER_UUID = "992a54a8-3d3d-43de-a852-4aa41f16cc27"
+MONTHS = [datetime.date(2021, month, 1) for month in (8, 9, 10)]
+
+
+@pytest.fixture
+def card(database):
+    """A card with a transaction on the 15th of each month in `MONTHS`."""
+    with database.engine.begin() as conn:
+        for month in MONTHS:
+            partitions.create_partition(conn, month)
+
+    models.Member.put(models.Member(member_uuid=MEMBER_UUID))
+    card = models.Card.put(models.Card(member_uuid=MEMBER_UUID))
+    models.Transactions.put_many(
+        [
+            {
+                "card_id": card.id,
+                "amount": decimal.Decimal("10.00"),
+                "transaction_date": datetime.datetime(
+                    month.year, month.month, 15
+                ),
+            }
+            for month in MONTHS
+        ]
+    )
+    yield card
+
+
+def scanned_relations(database, query):
+    """Names of the tables a query's plan reads."""
+    statement = query.statement.compile(dialect=database.engine.dialect)
+    with database.engine.begin() as conn:
+        (plan,) = conn.execute(
+            f"EXPLAIN (FORMAT JSON) {statement}", statement.params
+        ).scalar()
+
+    def relations(node):
+        if "Relation Name" in node:
+            yield node["Relation Name"]
+        for child in node.get("Plans", []):
+            yield from relations(child)
+
+    return set(relations(plan["Plan"]))
+
+
+def test_rows_land_in_monthly_partitions(database, card):
+    # pylint: disable=unused-argument
+    rows = database.engine.execute(
+        "SELECT tableoid::regclass::text, count(*) FROM transactions "
+        "GROUP BY 1 ORDER BY 1"
+    ).fetchall()
+
+    assert rows == [
+        ("transactions_y2021m08", 1),
+        ("transactions_y2021m09", 1),
+        ("transactions_y2021m10", 1),
+    ]
+
+
+def test_transactions_by_card_prunes_partitions(database, card):
+    query = models.Transactions.get_transactions_by_card(
+        card.id, datetime.date(2021, 9, 1), datetime.date(2021, 9, 28)
+    )
+
+    assert query.count() == 1
+    assert scanned_relations(database, query) == {"transactions_y2021m09"}
+
+
+def test_create_partition_is_idempotent(database, card):
+    # pylint: disable=unused-argument
+    with database.engine.begin() as conn:
+        assert not partitions.create_partition(conn, MONTHS[0])
+
+
+def test_create_partition_refuses_rows_in_default(database, card):
+    models.Transactions.put(
+        models.Transactions(
+            card_id=card.id,
+            amount=decimal.Decimal("1.00"),
+            transaction_date=datetime.datetime(2021, 11, 2),
+        )
+    )
+
+    with pytest.raises(RuntimeError):
+        with database.engine.begin() as conn:
+            partitions.create_partition(conn, datetime.date(2021, 11, 1))
+
+
+def test_detach_partitions(database, card):
+    # pylint: disable=unused-argument
+    with database.engine.begin() as conn:
+        detached = partitions.detach_partitions(conn, MONTHS[1])
+        attached = [name for name, _ in partitions.list_partitions(conn)]
+
+    assert detached == ["transactions_y2021m08"]
+    assert attached == [
+        "transactions_default",
+        "transactions_y2021m09",
+        "transactions_y2021m10",
+    ]
+    # detached, not dropped
+    assert database.engine.has_table("transactions_y2021m08")
+    database.engine.execute("DROP TABLE transactions_y2021m08")
@@ -0,0 +1,254 @@
+"""Payments query tests."""
+
+import datetime
+import decimal
+import json
+import time
+from unittest import mock
+
+import pytest
+
+from app import cache
+from app import models
+from app.resources import payments
+
+# pylint: disable=redefined-outer-name
+
+MEMBER_UUID = "992a54a8-3d3d-43de-a852-4aa41f16cc27"
+UNKNOWN_UUID = "00000000-0000-0000-0000-000000000000"
+
+
+@pytest.fixture
+def reissued_member(database):
+    """Seed a member whose card was replaced mid-month."""
+    models.Member.put(models.Member(member_uuid=MEMBER_UUID))
+    old_card = models.Card.put(
+        models.Card(member_uuid=MEMBER_UUID, is_current=False)
+    )
+    new_card = models.Card.put(
+        models.Card(
+            member_uuid=MEMBER_UUID,
+            is_current=True,
+            date_activated=datetime.date(2021, 9, 15),
+        )
+    )
+    for card, day, amount in [
+        (old_card, 2, "100.05"),
+        (old_card, 14, "14.32"),
+        (old_card, 30, "58.68"),
+        (new_card, 15, "34.21"),
+        (new_card, 28, "320.10"),
+        (new_card, 29, "2.90"),
+    ]:
+        models.Transactions.put(
+            models.Transactions(
+                card_id=card.id,
+                amount=decimal.Decimal(amount),
+                transaction_date=datetime.datetime(2021, 9, day, 18, 30),
+            )
+        )
+
+    yield database
+
+
+@pytest.mark.parametrize("model", [models.Transactions, models.CardDailySpend])
+def test_month_to_date_covers_reissued_card(reissued_member, model):
+    # pylint: disable=unused-argument
+    total = model.month_to_date_for_member(
+        MEMBER_UUID, datetime.date(2021, 9, 28)
+    )
+
+    assert total == decimal.Decimal("468.68")
+
+
+@pytest.mark.parametrize("model", [models.Transactions, models.CardDailySpend])
+def test_month_to_date_unknown_member(database, model):
+    # pylint: disable=unused-argument
+    total = model.month_to_date_for_member(
+        "00000000-0000-0000-0000-000000000000", datetime.date(2021, 9, 28)
+    )
+
+    assert total is None
+
+
+def test_rollup_is_consistent(reissued_member):
+    # pylint: disable=unused-argument
+    assert models.CardDailySpend.check_consistency() == []
+
+
+@pytest.fixture
+def spender(client):
+    """A member with categorized spend at three merchants."""
+    models.Member.put(models.Member(member_uuid=MEMBER_UUID))
+    card = models.Card.put(models.Card(member_uuid=MEMBER_UUID))
+    models.Transactions.put_many(
+        [
+            {
+                "card_id": card.id,
+                "amount": decimal.Decimal(amount),
+                "merchant": merchant,
+                "category": category,
+                "transaction_date": datetime.datetime(2021, 9, day, 12),
+            }
+            for day, amount, merchant, category in [
+                (1, "10.00", "Acme", "gas"),
+                (2, "5.50", "Acme", "gas"),
+                (3, "40.00", "Grocer", "groceries"),
+                (4, "2.25", "Cafe", None),
+                # outside the period
+                (30, "99.00", "Acme", "gas"),
+            ]
+        ]
+    )
+    yield client, card.id
+
+
+def get_breakdown(client, **params):
+    """Request a breakdown for September 1-29."""
+    response = client.get(
+        "/api/payments/breakdown",
+        query_string={
+            "member_uuid": MEMBER_UUID,
+            "start": "2021-09-01",
+            "end": "2021-09-29",
+            **params,
+        },
+    )
+    assert response.status_code == 200, response.data
+    return response.json
+
+
+def test_breakdown(spender):
+    client, _ = spender
+
+    breakdown = get_breakdown(client, top=2)
+
+    assert breakdown["total"] == 57.75
+    assert breakdown["transactions"] == 4
+    assert breakdown["categories"] == [
+        {"category": "groceries", "transactions": 1, "total": 40.0},
+        {"category": "gas", "transactions": 2, "total": 15.5},
+        {"category": None, "transactions": 1, "total": 2.25},
+    ]
+    assert [row["merchant"] for row in breakdown["merchants"]] == [
+        "Grocer",
+        "Acme",
+        "Cafe",
+    ]
+    assert breakdown["top_merchants"] == breakdown["merchants"][:2]
+
+
+def settle_breakdown_invalidations():
+    """Wait for the listener to apply the notifications sent so far.
+
+    They arrive in commit order, so once a marker sent now is applied,
+    so are the earlier ones.
+    """
+    breakdowns = models.Transactions.BREAKDOWN_CACHE
+    before = breakdowns.generation(("marker",))
+    session = models.Transactions.query.session
+    cache.notify(session, breakdowns.name, "marker")
+    session.commit()
+    deadline = time.monotonic() + 5
+    while breakdowns.generation(("marker",)) == before:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_breakdown_cached_per_period_not_per_top(spender):
+    client, _ = spender
+    settle_breakdown_invalidations()
+    assert len(get_breakdown(client, top=1)["top_merchants"]) == 1
+
+    assert len(get_breakdown(client, top=3)["top_merchants"]) == 3
+    assert models.Transactions.BREAKDOWN_CACHE.stats()["size"] == 1
+
+
+def test_breakdown_cache_dropped_on_new_transaction(spender):
+    client, card_id = spender
+    assert get_breakdown(client)["total"] == 57.75
+    get_breakdown(client, end="2021-09-15")
+
+    models.Transactions.put(
+        models.Transactions(
+            card_id=card_id,
+            amount=decimal.Decimal("1.00"),
+            transaction_date=datetime.datetime(2021, 9, 5),
+        )
+    )
+
+    # the invalidation arrives through the cache listener
+    deadline = time.monotonic() + 5
+    while models.Transactions.BREAKDOWN_CACHE.stats()["size"]:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert get_breakdown(client)["total"] == 58.75
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"member_uuid": "not-a-uuid"},
+        {"start": "2021-09-30"},
+        {"top": 0},
+    ],
+)
+def test_breakdown_bad_request(client, params):
+    query = {
+        "member_uuid": MEMBER_UUID,
+        "start": "2021-09-01",
+        "end": "2021-09-29",
+        **params,
+    }
+
+    response = client.get("/api/payments/breakdown", query_string=query)
+
+    assert response.status_code == 400
+
+
+def post_batch(client, member_uuids, date="2021-09-29"):
+    """Request month-to-date totals for many members."""
+    return client.post(
+        "/api/payments/batch",
+        json={"member_uuids": member_uuids, "date": date},
+    )
+
+
+def test_batch_totals_in_request_order(spender, monkeypatch):
+    client, _ = spender
+    monkeypatch.setattr(payments, "BATCH_CHUNK_SIZE", 2)
+    lookup = mock.patch.object(
+        models.Transactions,
+        "spend_between_by_member",
+        wraps=models.Transactions.spend_between_by_member,
+    )
+
+    with lookup as spend_between_by_member:
+        response = post_batch(
+            client, [MEMBER_UUID.upper(), UNKNOWN_UUID, MEMBER_UUID]
+        )
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert [json.loads(line) for line in response.data.splitlines()] == [
+        {"member_uuid": MEMBER_UUID, "total": 57.75},
+        {"member_uuid": UNKNOWN_UUID, "total": None},
+        {"member_uuid": MEMBER_UUID, "total": 57.75},
+    ]
+    # one grouped query per chunk of two
+    assert spend_between_by_member.call_count == 2
+
+
+@pytest.mark.parametrize(
+    "member_uuids",
+    [
+        MEMBER_UUID,
+        [MEMBER_UUID, "not-a-uuid"],
+        [1],
+        {"member_uuid": MEMBER_UUID},
+    ],
+)
+def test_batch_bad_request(client, member_uuids):
+    response = post_batch(client, member_uuids)
+
+    assert response.status_code == 400
@@ -0,0 +1,129 @@
+"""Query plan regression tests for the payments hot path."""
+
+import datetime
+import json
+import random
+import uuid
+
+import pytest
+import sqlalchemy
+
+from app import models
+
+# pylint: disable=redefined-outer-name
+
+MEMBERS = 2000
+TRANSACTIONS_PER_CARD = 10
+
+
+@pytest.fixture
+def seeded(database):
+    """Seed enough rows that the planner has statistics to work with."""
+    rng = random.Random(0)
+    member_uuids = [
+        str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(MEMBERS)
+    ]
+
+    with database.engine.begin() as conn:
+        conn.execute(
+            models.Member.__table__.insert(),
+            [{"member_uuid": member_uuid} for member_uuid in member_uuids],
+        )
+        conn.execute(
+            models.Card.__table__.insert(),
+            [
+                {"member_uuid": member_uuid, "is_current": True}
+                for member_uuid in member_uuids
+            ],
+        )
+        card_ids = [
+            row.id for row in conn.execute(sqlalchemy.select([models.Card.id]))
+        ]
+        conn.execute(
+            models.Transactions.__table__.insert(),
+            [
+                {
+                    "card_id": card_id,
+                    "amount": round(rng.uniform(0, 1000), 2),
+                    "transaction_date": datetime.date(
+                        2021, 9, rng.randint(1, 30)
+                    ),
+                }
+                for card_id in card_ids
+                for _ in range(TRANSACTIONS_PER_CARD)
+            ],
+        )
+        conn.execute("ANALYZE")
+
+    yield database, member_uuids, card_ids
+
+
+def explain(database, query):
+    """Return the JSON plan for ``query``.
+
+    Sequential scans are disabled rather than forbidden, so the planner still
+    falls back to one when no index can serve the query. That keeps the
+    assertion meaningful on a table far smaller than production.
+    """
+    statement = query.statement.compile(dialect=database.engine.dialect)
+    with database.engine.begin() as conn:
+        conn.execute("SET LOCAL enable_seqscan = off")
+        (plan,) = conn.execute(
+            f"EXPLAIN (FORMAT JSON) {statement}", statement.params
+        ).scalar()
+    return plan["Plan"]
+
+
+def node_types(plan):
+    """Yield every node type in a plan tree."""
+    yield plan["Node Type"]
+    for child in plan.get("Plans", []):
+        yield from node_types(child)
+
+
+def test_card_by_member_uses_index(seeded):
+    database, member_uuids, _ = seeded
+
+    plan = explain(database, models.Card.get_card_by_member(member_uuids[0]))
+
+    assert "Seq Scan" not in set(node_types(plan)), json.dumps(plan)
+
+
+def test_transactions_by_card_uses_index(seeded):
+    database, _, card_ids = seeded
+
+    plan = explain(
+        database, models.Transactions.get_transactions_by_card(card_ids[0])
+    )
+
+    assert "Seq Scan" not in set(node_types(plan)), json.dumps(plan)
+
+
+def test_month_to_date_sum_uses_index(seeded):
+    database, _, card_ids = seeded
+
+    query = (
+        models.Transactions.get_transactions_by_card(card_ids[0])
+        .filter(
+            models.Transactions.transaction_date.between(
+                datetime.date(2021, 9, 1), datetime.date(2021, 9, 28)
+            )
+        )
+        .with_entities(sqlalchemy.func.sum(models.Transactions.amount))
+    )
+    plan = explain(database, query)
+
+    assert "Seq Scan" not in set(node_types(plan)), json.dumps(plan)
+
+
+def test_history_page_reads_index_in_order(seeded):
+    database, _, card_ids = seeded
+
+    query = models.Transactions.history(
+        card_id=card_ids[0], after=(datetime.datetime(2021, 9, 15), 0)
+    ).limit(50)
+    plan = explain(database, query)
+
+    nodes = set(node_types(plan))
+    assert "Seq Scan" not in nodes, json.dumps(plan)
+    assert "Sort" not in nodes, json.dumps(plan)
@@ -0,0 +1,184 @@
+"""Read-replica routing tests.
+
+A second database on the same Postgres instance stands in for the replica;
+nothing replicates into it, so a read that finds a freshly written row
+must have gone to the primary.
+"""
+
+import datetime
+import decimal
+import logging
+import os
+from unittest import mock
+
+import flask
+import pytest
+import sqlalchemy
+
+from app import models
+from app import postgres
+from app.resources import server
+
+# pylint: disable=redefined-outer-name
+
+MEMBER_UUID = "992a54a8-3d3d-43de-a852-4aa41f16cc27"
+REPLICA_DB = "interviews_replica"
+
+
+@pytest.fixture
+def replicated(postgresql_proc):
+    """Connect to a primary and a replica database, both with the schema."""
+    replica = f"{postgresql_proc.host}:{postgresql_proc.port}/{REPLICA_DB}"
+    force_env = {
+        "POSTGRES_HOST": postgresql_proc.host,
+        "POSTGRES_PORT": str(postgresql_proc.port),
+        "POSTGRES_USER": postgresql_proc.user,
+        "POSTGRES_PASSWORD": "Interviews",
+        "POSTGRES_DB": postgresql_proc.user,
+        # listed twice to exercise round-robin
+        "POSTGRES_REPLICAS": f"{replica},{replica}",
+    }
+
+    with mock.patch.dict(os.environ, force_env):
+        admin = postgres.DatabaseConnection(delay_connect=True)
+        admin_engine = sqlalchemy.create_engine(
+            admin.uri, isolation_level="AUTOCOMMIT"
+        )
+        admin_engine.execute(f"CREATE DATABASE {REPLICA_DB}")
+
+        conn = postgres.DatabaseConnection()
+        for engine in [conn.engine, conn.replica_engines[0]]:
+            models.Base.metadata.create_all(bind=engine)
+
+        yield conn
+
+        conn.shutdown()
+        sqlalchemy.orm.close_all_sessions()
+        models.Base.metadata.drop_all(bind=conn.engine)
+        for engine in [conn.engine, *conn.replica_engines]:
+            engine.dispose()
+        admin_engine.execute(f"DROP DATABASE {REPLICA_DB}")
+        admin_engine.dispose()
+
+
+@pytest.fixture
+def replicated_client(replicated, fake):
+    """Flask client for a server with a replica configured."""
+    app = flask.Flask(__name__)
+    app.config.update(TESTING=True, SECRET_KEY=fake.word())
+    logging.getLogger().handlers = []
+
+    api = server.InterviewsServer(app=app)
+    api.warmup()
+
+    yield api.app.test_client()
+
+    # the replica database can't be dropped while these are open
+    for engine in api.conn.replica_engines:
+        engine.dispose()
+
+
+def test_replicas_are_configured(replicated):
+    assert len(replicated.replica_engines) == 2
+    assert all(
+        engine.url.database == REPLICA_DB
+        for engine in replicated.replica_engines
+    )
+
+
+def test_sessions_default_to_primary(replicated):
+    models.Member.put(models.Member(member_uuid=MEMBER_UUID))
+    replicated.session.remove()
+
+    assert models.Member.get_member(MEMBER_UUID).first() is not None
+
+
+def test_routed_reads_go_to_replica(replicated):
+    models.Member.put(models.Member(member_uuid=MEMBER_UUID))
+    replicated.session.remove()
+
+    replicated.session().route_reads()
+
+    assert models.Member.get_member(MEMBER_UUID).first() is None
+
+
+def test_session_reads_its_own_writes(replicated):
+    session = replicated.session()
+    session.route_reads()
+
+    models.Member.put(models.Member(member_uuid=MEMBER_UUID))
+
+    assert not session.reads_from_replica
+    assert models.Member.get_member(MEMBER_UUID).first() is not None
+
+
+def test_explicit_primary(replicated):
+    models.Member.put(models.Member(member_uuid=MEMBER_UUID))
+    replicated.session.remove()
+    replicated.session().route_reads()
+
+    with replicated.primary():
+        assert models.Member.get_member(MEMBER_UUID).first() is not None
+
+
+def test_cached_member_loads_from_primary(replicated):
+    models.Member.put(models.Member(member_uuid=MEMBER_UUID, first_name="A"))
+    models.Member.__cache__.clear()
+    replicated.session.remove()
+    session = replicated.session()
+    session.route_reads()
+
+    assert models.Member.get_cached_member(MEMBER_UUID)["first_name"] == "A"
+    assert session.reads_from_replica
+    assert models.Member.get_member(MEMBER_UUID).first() is None
+
+
+def test_replicas_are_used_round_robin(replicated):
+    replicas = []
+    for _ in range(4):
+        session = replicated.session()
+        session.route_reads()
+        models.Member.get_member(MEMBER_UUID).first()
+        replicas.append(session.info["replica"])
+        replicated.session.remove()
+
+    assert replicas == replicated.replica_engines * 2
+
+
+def test_get_reads_from_replica_unless_asked(replicated_client):
+    models.Member.put(models.Member(member_uuid=MEMBER_UUID))
+    card = models.Card.put(models.Card(member_uuid=MEMBER_UUID))
+    models.Transactions.put(
+        models.Transactions(
+            card_id=card.id,
+            amount=decimal.Decimal("12.50"),
+            transaction_date=datetime.datetime(2021, 9, 3, 12, 0),
+        )
+    )
+    query = {"member_uuid": MEMBER_UUID, "date": "2021-09-28"}
+
+    from_replica = replicated_client.get("/api/payments", json=query)
+    from_primary = replicated_client.get(
+        "/api/payments",
+        json=query,
+        headers={"X-Read-Your-Writes": "true"},
+    )
+
+    assert from_replica.get_json() == {}
+    assert from_primary.get_json() == "12.5"
+
+
+def test_after_fork_replaces_pools(replicated):
+    pools = [engine.pool for engine in replicated.engines]
+    for engine in replicated.engines:
+        engine.execute("SELECT 1")
+
+    replicated.after_fork()
+
+    for engine, old_pool in zip(replicated.engines, pools):
+        assert engine.pool is not old_pool
+        assert engine.pool.metrics_name == old_pool.metrics_name
+        assert engine.pool.checkedin() == 0
+        assert engine.execute("SELECT 1").scalar() == 1
+        # as the parent process would
+        old_pool.dispose()
@@ -0,0 +1,24 @@
+"""Tests against the seeded template database."""
+
+import pytest
+
+from app import models
+
+MEMBER_UUID = "992a54a8-3d3d-43de-a852-4aa41f16cc27"
+
+
+def test_seeded_rollup_is_consistent(seeded):
+    # pylint: disable=unused-argument
+    assert models.Member.query.count() > 0
+    assert models.CardDailySpend.check_consistency() == []
+
+
+@pytest.mark.parametrize("attempt", [1, 2])
+def test_writes_are_rolled_back(seeded, attempt):
+    # pylint: disable=unused-argument
+    # a member left over from the other attempt would fail on member_uuid
+    before = models.Member.query.count()
+    models.Member.put(models.Member(member_uuid=MEMBER_UUID))
+    models.Card.put(models.Card(member_uuid=MEMBER_UUID))
+
+    assert models.Member.query.count() == before + 1
@@ -0,0 +1,80 @@
+"""Single-flight tests across processes, through the advisory lock."""
+
+import datetime
+import decimal
+
+import sqlalchemy
+
+from app import models
+from app import singleflight
+
+
+def test_result_shared_with_other_processes(database):
+    # pylint: disable=unused-argument
+    # Two flights of one name stand in for two worker processes
+    first = singleflight.SingleFlight("it_shared", ttl=60)
+    second = singleflight.SingleFlight("it_shared", ttl=60)
+
+    assert first.get("key", lambda: decimal.Decimal("12.50")) == 12.5
+    assert second.get("key", lambda: 0) == 12.5
+
+    assert first.stats()["computed"] == 1
+    assert second.stats()["computed"] == 0
+    assert second.stats()["shared"] == 1
+
+
+def test_held_lock_serves_stale_value(database):
+    flight = singleflight.SingleFlight("it_stale", ttl=0, max_stale=60)
+    flight.get("key", lambda: "old")
+
+    lock = database.locker.lock("singleflight:it_stale:key")
+    assert lock.acquire(blocking=False)
+    try:
+        assert flight.get("key", lambda: "new") == "old"
+    finally:
+        lock.release()
+
+    assert flight.stats()["contended"] == 1
+    assert flight.stats()["stale"] == 1
+    assert flight.get("key", lambda: "new") == "new"
+
+
+def test_run_once_runs_when_uncontended(database):
+    # pylint: disable=unused-argument
+    calls = []
+    assert singleflight.run_once("it_run_once", lambda: calls.append(1))
+    assert calls == [1]
+
+
+def test_publish_prunes_stale_results(database):
+    table = models.AggregateResult.__table__
+    database.engine.execute(
+        table.insert().values(
+            [
+                {
+                    "name": name,
+                    "key": key,
+                    "value": "0",
+                    "computed_at": sqlalchemy.func.now()
+                    - datetime.timedelta(seconds=age),
+                }
+                for name, key, age in [
+                    ("it_prune", "expired", 3600),
+                    ("it_prune", "usable", 0),
+                    ("it_other", "expired", 3600),
+                ]
+            ]
+        )
+    )
+    flight = singleflight.SingleFlight("it_prune", ttl=60, max_stale=60)
+
+    flight.get("new", lambda: 1)
+
+    rows = database.engine.execute(
+        sqlalchemy.select([table.c.name, table.c.key])
+    ).fetchall()
+    assert sorted(map(tuple, rows)) == [
+        ("it_other", "expired"),
+        ("it_prune", "new"),
+        ("it_prune", "usable"),
+    ]
@@ -0,0 +1,24 @@
+"""Lazy startup and readiness tests."""
+
+import logging
+
+import flask
+
+from app.resources import server
+
+
+def test_ready_after_first_request(database, fake):
+    # pylint: disable=unused-argument
+    app = flask.Flask(__name__)
+    app.config.update(TESTING=True, SECRET_KEY=fake.word())
+    logging.getLogger().handlers = []
+    api = server.InterviewsServer(app=app)
+    client = api.app.test_client()
+
+    assert api.conn.engine is None
+    assert client.get("/_mgmt/ready").status_code == 503
+    assert client.get("/_mgmt/health").status_code == 200
+
+    client.get("/api/member", json={"member_uuid": fake.uuid4()})
+
+    assert client.get("/_mgmt/ready").json == {"ready": True}
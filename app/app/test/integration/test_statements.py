@@ -0,0 +1,90 @@
+"""Statement export tests."""
+
+import csv
+import datetime
+import decimal
+import os
+
+from app import models
+from app import statements
+
+MEMBER_UUIDS = [
+    "1c9f1a8e-6b4f-4a57-9d0e-6f2e0c1b7a10",
+    "d2a4b3c1-0e5f-4c6d-8a7b-9f8e7d6c5b40",
+]
+
+
+def seed():
+    """Two members in different ranges, with gas and grocery spend."""
+    for member_uuid in MEMBER_UUIDS:
+        models.Member.put(models.Member(member_uuid=member_uuid))
+        card = models.Card.put(models.Card(member_uuid=member_uuid))
+        models.Transactions.put_many(
+            [
+                {
+                    "card_id": card.id,
+                    "amount": decimal.Decimal("2.50"),
+                    "category": "gas" if day % 2 else "groceries",
+                    "transaction_date": datetime.datetime(2021, 9, day, 12),
+                }
+                for day in (1, 2, 3, 30)
+            ]
+            # outside the month
+            + [
+                {
+                    "card_id": card.id,
+                    "amount": decimal.Decimal("100.00"),
+                    "category": "gas",
+                    "transaction_date": datetime.datetime(2021, 10, 1),
+                }
+            ]
+        )
+
+
+def read_rows(directory):
+    rows = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".csv"):
+            with open(os.path.join(directory, name), newline="") as part:
+                rows.extend(csv.DictReader(part))
+    return rows
+
+
+def test_export_and_resume(database, tmp_path):
+    # pylint: disable=unused-argument
+    seed()
+    options = statements.parse_args(
+        [
+            "--month=2021-09",
+            f"--output={tmp_path}",
+            "--partitions=4",
+            "--workers=2",
+        ]
+    )
+    directory = os.path.join(tmp_path, "2021-09")
+
+    statements.run(options)
+
+    rows = read_rows(directory)
+    assert [row["member_uuid"] for row in rows] == [
+        MEMBER_UUIDS[0],
+        MEMBER_UUIDS[0],
+        MEMBER_UUIDS[1],
+        MEMBER_UUIDS[1],
+    ]
+    assert {
+        (row["category"], row["transactions"], row["total"]) for row in rows
+    } == {
+        ("gas", "2", "5.00"),
+        ("groceries", "2", "5.00"),
+    }
+    assert os.path.exists(os.path.join(directory, "_SUCCESS"))
+
+    # A rerun only redoes the partition whose file is missing
+    last = statements.partition_path(options, 3)
+    first = statements.partition_path(options, 0)
+    os.remove(last)
+    written = os.path.getmtime(first)
+    statements.run(options)
+    assert read_rows(directory) == rows
+    assert os.path.getmtime(first) == written
@@ -0,0 +1,113 @@
+"""Transaction history endpoint tests."""
+
+import datetime
+import decimal
+import json
+
+import pytest
+
+from app import models
+
+# pylint: disable=redefined-outer-name
+
+MEMBER_UUID = "992a54a8-3d3d-43de-a852-4aa41f16cc27"
+
+
+@pytest.fixture
+def history(client):
+    """A member with two cards and a week of transactions on each."""
+    models.Member.put(models.Member(member_uuid=MEMBER_UUID))
+    cards = [
+        models.Card.put(models.Card(member_uuid=MEMBER_UUID)) for _ in range(2)
+    ]
+    models.Transactions.put_many(
+        [
+            {
+                "card_id": card.id,
+                "amount": decimal.Decimal("1.25") * day,
+                "merchant": "Acme",
+                "category": "gas" if day % 2 else "groceries",
+                # same timestamp on both cards, so ties break on id
+                "transaction_date": datetime.datetime(2021, 9, day, 12),
+            }
+            for day in range(1, 8)
+            for card in cards
+        ]
+    )
+    yield client, cards
+
+
+def get_rows(client, **params):
+    """Request transactions and parse the NDJSON body."""
+    response = client.get("/api/transactions", query_string=params)
+    assert response.status_code == 200, response.data
+    assert response.mimetype == "application/x-ndjson"
+    return [json.loads(line) for line in response.data.splitlines()]
+
+
+def test_member_history_is_ordered(history):
+    client, _ = history
+
+    rows = get_rows(client, member_uuid=MEMBER_UUID)
+
+    keys = [(row["transaction_date"], row["id"]) for row in rows]
+    assert len(rows) == 14
+    assert keys == sorted(keys)
+    assert rows[0]["amount"] == 1.25
+
+
+def test_member_uuid_is_normalized(history):
+    client, _ = history
+
+    assert get_rows(client, member_uuid=MEMBER_UUID.upper()) == get_rows(
+        client, member_uuid=MEMBER_UUID
+    )
+
+
+def test_filters(history):
+    client, cards = history
+
+    rows = get_rows(
+        client,
+        card_id=cards[1].id,
+        start="2021-09-02",
+        end="2021-09-05",
+        category="gas",
+    )
+
+    assert [(row["card_id"], row["transaction_date"]) for row in rows] == [
+        (cards[1].id, "2021-09-03T12:00:00"),
+        (cards[1].id, "2021-09-05T12:00:00"),
+    ]
+
+
+def test_keyset_pages_cover_history_once(history):
+    client, _ = history
+    everything = get_rows(client, member_uuid=MEMBER_UUID)
+
+    pages = []
+    params = {"member_uuid": MEMBER_UUID, "limit": 3}
+    while True:
+        page = get_rows(client, **params)
+        if not page:
+            break
+        pages.extend(page)
+        params.update(
+            after_date=page[-1]["transaction_date"], after_id=page[-1]["id"]
+        )
+
+    assert pages == everything
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {},
+        {"card_id": 1, "after_id": 5},
+        {"member_uuid": "not-a-uuid"},
+    ],
+)
+def test_bad_requests(client, params):
+    response = client.get("/api/transactions", query_string=params)
+
+    assert response.status_code == 400
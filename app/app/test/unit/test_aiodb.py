@@ -0,0 +1,38 @@
+"""asyncpg statement compilation tests."""
+
+import pytest
+import sqlalchemy
+
+from app import models
+
+aiodb = pytest.importorskip("app.aiodb")
+
+
+def test_numbered_parameters():
+    start = sqlalchemy.bindparam("start", type_=sqlalchemy.DateTime)
+    end = sqlalchemy.bindparam("end", type_=sqlalchemy.DateTime)
+    statement = aiodb.Statement(
+        models.CardDailySpend.month_to_date_select(
+            sqlalchemy.bindparam("member_uuid"), start, end
+        )
+    )
+
+    args = statement.args(member_uuid="m", start="s", end="e")
+
+    assert "$1" in statement.sql and "%(" not in statement.sql
+    assert statement.sql.count("$") == len(args)
+    # placeholders used twice are passed twice; literals keep their values
+    assert args.count("e") == 2
+    assert args.count("m") == 1
+    assert 0 in args and 1 in args
+
+
+def test_insert_leaves_out_serial_id():
+    statement = aiodb.Statement(
+        models.Member.__table__.insert(inline=True).values(
+            member_uuid=sqlalchemy.bindparam("member_uuid")
+        )
+    )
+
+    assert statement.sql == "INSERT INTO member (member_uuid) VALUES ($1)"
+    assert statement.args(member_uuid="m") == ["m"]
@@ -0,0 +1,59 @@
+"""Bulk write statement tests."""
+
+import datetime
+
+import sqlalchemy
+from sqlalchemy.dialects import postgresql
+
+from app import models
+
+MEMBER_UUID = "992a54a8-3d3d-43de-a852-4aa41f16cc27"
+
+
+def compile_insert(model, rows):
+    """The multi-row INSERT `put_many` would send for `rows`."""
+    # pylint: disable=protected-access
+    statement = sqlalchemy.insert(model.__table__).values(
+        model._values_for(rows)
+    )
+    return statement.compile(dialect=postgresql.dialect())
+
+
+def test_unset_columns_use_server_default():
+    created_at = datetime.datetime(2021, 9, 1)
+    compiled = compile_insert(
+        models.Card,
+        [
+            {"member_uuid": MEMBER_UUID},
+            models.Card(member_uuid=MEMBER_UUID, created_at=created_at),
+        ],
+    )
+
+    sql = str(compiled)
+    # created_at is set on one row only; the other gets now()
+    assert "(DEFAULT, %(member_uuid_m0)s" in sql
+    assert compiled.params["created_at_m1"] == created_at
+
+
+def test_explicit_none_is_written():
+    # pylint: disable=protected-access
+    values = models.Card._values_for(
+        [
+            models.Card(member_uuid=MEMBER_UUID, date_activated=None),
+            {"member_uuid": MEMBER_UUID, "date_activated": None},
+        ]
+    )
+
+    assert [row["date_activated"] for row in values] == [None, None]
+
+
+def test_python_defaults_are_left_to_sqlalchemy():
+    # pylint: disable=protected-access
+    values = models.Card._values_for(
+        [
+            {"member_uuid": MEMBER_UUID, "is_current": False},
+            {"member_uuid": MEMBER_UUID},
+        ]
+    )
+
+    assert values[1] == {"member_uuid": MEMBER_UUID}
@@ -0,0 +1,166 @@
+"""Model cache tests."""
+
+import pytest
+
+from app import cache
+
+# pylint: disable=redefined-outer-name
+
+
+class Clock:
+    """Stand-in for `time.monotonic`."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    yield clock
+
+
+def test_get_and_set():
+    lru = cache.LRUCache("unit", maxsize=10, ttl=60)
+
+    assert lru.get("a") is None
+    assert lru.get("a", "default") == "default"
+    lru.set("a", 1)
+
+    assert lru.get("a") == 1
+    stats = lru.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 2, 1)
+    assert stats["hit_ratio"] == pytest.approx(1 / 3)
+
+
+def test_evicts_least_recently_used():
+    lru = cache.LRUCache("unit", maxsize=2, ttl=60)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    lru.get("a")
+
+    lru.set("c", 3)
+
+    assert lru.get("b") is None
+    assert (lru.get("a"), lru.get("c")) == (1, 3)
+    assert lru.stats()["evictions"] == 1
+
+
+def test_entries_expire(clock):
+    lru = cache.LRUCache("unit", maxsize=10, ttl=5)
+    lru.set("a", 1)
+
+    clock.now += 4.9
+    assert lru.get("a") == 1
+    clock.now += 0.2
+    assert lru.get("a") is None
+    assert lru.stats()["expirations"] == 1
+    assert lru.stats()["size"] == 0
+
+
+def test_invalidate_and_clear():
+    lru = cache.LRUCache("unit", maxsize=10, ttl=60)
+    lru.set("a", 1)
+    lru.set("b", 2)
+
+    lru.invalidate("a")
+    lru.invalidate("missing")
+    assert lru.get("a") is None
+    assert lru.stats()["invalidations"] == 1
+
+    lru.clear()
+    assert lru.get("b") is None
+    assert lru.stats()["invalidations"] == 2
+
+
+def test_get_or_load_caches_none():
+    lru = cache.LRUCache("unit", maxsize=10, ttl=60)
+    calls = []
+
+    def loader():
+        calls.append(1)
+
+    assert lru.get_or_load("a", loader) is None
+    assert lru.get_or_load("a", loader) is None
+    assert calls == [1]
+
+
+def test_invalidation_during_load_is_not_overwritten():
+    lru = cache.LRUCache("unit", maxsize=10, ttl=60)
+
+    def loader():
+        # the row was read; its change commits and is published now
+        lru.invalidate("a")
+        return "stale"
+
+    assert lru.get_or_load("a", loader) == "stale"
+    assert lru.get("a") is None
+    assert lru.stats()["stale_loads"] == 1
+    assert lru.get_or_load("a", lambda: "fresh") == "fresh"
+    assert lru.get("a") == "fresh"
+
+
+def test_clear_voids_loads_under_way():
+    lru = cache.LRUCache("unit", maxsize=10, ttl=60)
+    generation = lru.generation("a")
+
+    lru.clear()
+
+    assert not lru.set("a", "stale", generation)
+    assert lru.set("a", "fresh", lru.generation("a"))
+
+
+def test_generations_stay_bounded():
+    lru = cache.LRUCache("unit", maxsize=2, ttl=60)
+    generation = lru.generation("a")
+    for key in "bcd":
+        lru.invalidate(key)
+
+    # pylint: disable=protected-access
+    assert len(lru._generations) <= 2
+    # pruning voids every generation, so the load can't be trusted
+    assert not lru.set("a", "maybe stale", generation)
+
+
+def test_apply_notification(monkeypatch):
+    lru = cache.LRUCache("unit", maxsize=10, ttl=60)
+    monkeypatch.setitem(cache.CACHES, "unit", lru)
+    lru.set("992a54a8-3d3d-43de-a852-4aa41f16cc27", 1)
+
+    cache.apply_notification("unit:992a54a8-3d3d-43de-a852-4aa41f16cc27")
+    cache.apply_notification("unknown:key")
+
+    assert lru.get("992a54a8-3d3d-43de-a852-4aa41f16cc27") is None
+
+
+def test_grouped_invalidation():
+    lru = cache.LRUCache("unit", maxsize=10, ttl=60, group=lambda key: key[0])
+    lru.set(("a", 1), "a1")
+    lru.set(("a", 2), "a2")
+    lru.set(("b", 1), "b1")
+    generation = lru.generation(("a", 3))
+
+    lru.invalidate("a")
+
+    assert (lru.get(("a", 1)), lru.get(("a", 2))) == (None, None)
+    assert lru.get(("b", 1)) == "b1"
+    assert lru.stats()["invalidations"] == 2
+    # a load for another key of the group, under way, is voided too
+    assert not lru.set(("a", 3), "stale", generation)
+    assert lru.set(("b", 2), "b2", lru.generation(("b", 2)))
+
+
+def test_grouped_keys_forgotten_on_eviction():
+    lru = cache.LRUCache("unit", maxsize=1, ttl=60, group=lambda key: key[0])
+    lru.set(("a", 1), "a1")
+    lru.set(("b", 1), "b1")
+
+    lru.invalidate("a")
+
+    # pylint: disable=protected-access
+    assert lru._grouped == {"b": {("b", 1)}}
+    assert lru.stats()["invalidations"] == 0
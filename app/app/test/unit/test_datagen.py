@@ -0,0 +1,82 @@
+"""Synthetic data generator tests."""
+
+import datetime
+import uuid
+
+from app import datagen
+
+VOCABULARY = {
+    "first_names": [
+        f"First{index}" for index in range(datagen.VOCABULARY_SIZE)
+    ],
+    "last_names": [f"Last{index}" for index in range(datagen.VOCABULARY_SIZE)],
+    "streets": [f"Street{index}" for index in range(datagen.VOCABULARY_SIZE)],
+    "merchants": [
+        f"Merchant{index}" for index in range(datagen.VOCABULARY_SIZE)
+    ],
+}
+CARD_ID_BASE = 1000
+
+
+def options(*argv):
+    """Generator options for a small run."""
+    return datagen.parse_args(
+        [
+            "--members=25",
+            "--chunk-size=10",
+            "--transactions-per-card=8",
+            "--reissue-rate=0.5",
+            *argv,
+        ]
+    )
+
+
+def lines(payload):
+    """TSV payload as lists of fields."""
+    return [line.split("\t") for line in payload.splitlines()]
+
+
+def test_chunks_are_deterministic():
+    first = datagen.generate_chunk(options(), VOCABULARY, CARD_ID_BASE, 1)
+    again = datagen.generate_chunk(options(), VOCABULARY, CARD_ID_BASE, 1)
+    other_chunk = datagen.generate_chunk(
+        options(), VOCABULARY, CARD_ID_BASE, 0
+    )
+    other_seed = datagen.generate_chunk(
+        options("--seed=1"), VOCABULARY, CARD_ID_BASE, 1
+    )
+
+    assert first == again
+    assert first[0] != other_chunk[0]
+    assert first[0] != other_seed[0]
+
+
+def test_chunk_shape():
+    # the last chunk holds what's left: members 20-24
+    members, cards, transactions, count = datagen.generate_chunk(
+        options(), VOCABULARY, CARD_ID_BASE, 2
+    )
+
+    member_rows = lines(members)
+    assert len(member_rows) == 5
+    assert all(len(row) == 5 for row in member_rows)
+    member_uuids = [row[0] for row in member_rows]
+    assert all(uuid.UUID(value).version == 4 for value in member_uuids)
+    assert member_rows[0][4].endswith("20@example.com")
+
+    card_rows = lines(cards)
+    assert {row[1] for row in card_rows} == set(member_uuids)
+    # two ids reserved per member, counted from the member's index
+    card_ids = {int(row[0]) for row in card_rows}
+    assert card_ids <= set(range(CARD_ID_BASE + 40, CARD_ID_BASE + 50))
+    assert sum(row[3] == "t" for row in card_rows) == 5
+
+    transaction_rows = lines(transactions)
+    assert len(transaction_rows) == count
+    assert {int(row[0]) for row in transaction_rows} <= card_ids
+    assert all(row[3] in datagen.CATEGORIES for row in transaction_rows)
+    dates = {
+        datetime.datetime.fromisoformat(row[4]).date().replace(day=1)
+        for row in transaction_rows
+    }
+    assert dates <= {datetime.date(2021, 9, 1)}
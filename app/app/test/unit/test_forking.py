@@ -0,0 +1,30 @@
+"""Fork-safety tests."""
+
+import os
+
+import sqlalchemy
+from sqlalchemy import pool
+
+from app import postgres
+
+
+def test_child_gets_its_own_connection(tmp_path):
+    engine = sqlalchemy.create_engine(
+        f"sqlite:///{tmp_path / 'fork.db'}", poolclass=pool.QueuePool
+    )
+    postgres.guard_fork(engine)
+    with engine.connect() as db:
+        inherited = id(db.connection.connection)
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover - child
+        with engine.connect() as db:
+            reused = id(db.connection.connection) == inherited
+        os.write(write_fd, b"1" if reused else b"0")
+        os._exit(0)  # pylint: disable=protected-access
+    os.waitpid(pid, 0)
+
+    assert os.read(read_fd, 1) == b"0"
+    with engine.connect() as db:
+        assert id(db.connection.connection) == inherited
@@ -0,0 +1,133 @@
+"""Ingest buffer grouping and backpressure tests."""
+
+import contextlib
+import datetime
+
+import pytest
+from psycopg2 import errors
+from sqlalchemy import exc
+from sqlalchemy.dialects import postgresql
+
+from app import ingest
+
+
+def rows(count):
+    """`count` placeholder rows."""
+    return [{"card_id": 1}] * count
+
+
+def test_full_buffer_rejects():
+    # never started, so nothing drains it
+    buffer = ingest.IngestBuffer(None, max_pending_rows=10)
+    buffer.submit(rows(8))
+
+    with pytest.raises(ingest.BufferFull):
+        buffer.submit(rows(3), timeout=0.01)
+    assert buffer.pending_rows == 8
+
+
+def test_start_rejects_requests_larger_than_the_buffer(monkeypatch):
+    monkeypatch.setattr(ingest, "MAX_REQUEST_ROWS", 11)
+    monkeypatch.setattr(ingest, "MAX_PENDING_ROWS", 10)
+    running = ingest.BUFFER
+
+    with pytest.raises(ValueError, match="max_request_rows"):
+        ingest.start(None)
+    assert ingest.BUFFER is running
+
+
+def test_groups_respect_batch_size():
+    buffer = ingest.IngestBuffer(None, max_batch_rows=5, max_delay=0)
+    for count in (2, 3, 4):
+        buffer.submit(rows(count))
+
+    # pylint: disable=protected-access
+    first = buffer._take_group()
+    second = buffer._take_group()
+
+    assert [len(submission.rows) for submission in first] == [2, 3]
+    assert [len(submission.rows) for submission in second] == [4]
+    assert buffer.pending_rows == 0
+
+
+def deadlock():
+    """What psycopg2 raises, wrapped by SQLAlchemy, for a lost deadlock."""
+    return exc.OperationalError(
+        "INSERT", {}, errors.DeadlockDetected("deadlock detected")
+    )
+
+
+def test_deadlocked_group_is_retried_once(monkeypatch):
+    buffer = ingest.IngestBuffer(None)
+    submission = ingest.Submission(rows(2), None)
+    outcomes = [deadlock(), [ingest.IngestResult(2, False)]]
+
+    def commit(group):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(buffer, "_commit", commit)
+    buffer._flush([submission])  # pylint: disable=protected-access
+
+    assert submission.future.result(0) == ingest.IngestResult(2, False)
+
+
+def test_second_deadlock_fails_the_group(monkeypatch):
+    buffer = ingest.IngestBuffer(None)
+    submissions = [ingest.Submission(rows(1), None) for _ in range(2)]
+    calls = []
+
+    def commit(group):
+        calls.append(len(group))
+        raise deadlock()
+
+    monkeypatch.setattr(buffer, "_commit", commit)
+    buffer._flush(submissions)  # pylint: disable=protected-access
+
+    assert calls == [2, 2]
+    for submission in submissions:
+        with pytest.raises(exc.OperationalError):
+            submission.future.result(0)
+
+
+class RecordingEngine:
+    """Engine stand-in that keeps the statements run in `begin()`."""
+
+    def __init__(self):
+        self.statements = []
+
+    @contextlib.contextmanager
+    def begin(self):
+        yield self
+
+    def execute(self, statement):
+        self.statements.append(statement)
+
+
+def test_rows_are_written_in_card_and_date_order():
+    engine = RecordingEngine()
+    buffer = ingest.IngestBuffer(engine)
+    group = [
+        ingest.Submission(
+            [
+                {"card_id": 2, "transaction_date": datetime.date(2021, 9, 1)},
+                {"card_id": 1, "transaction_date": datetime.date(2021, 9, 5)},
+            ],
+            None,
+        ),
+        ingest.Submission(
+            [{"card_id": 1, "transaction_date": datetime.date(2021, 9, 2)}],
+            None,
+        ),
+    ]
+
+    buffer._commit(group)  # pylint: disable=protected-access
+
+    (statement,) = engine.statements
+    params = statement.compile(dialect=postgresql.dialect()).params
+    assert [
+        (params[f"card_id_m{index}"], params[f"transaction_date_m{index}"].day)
+        for index in range(3)
+    ] == [(1, 2), (1, 5), (2, 1)]
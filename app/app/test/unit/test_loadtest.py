@@ -0,0 +1,84 @@
+"""Load-test harness helper tests."""
+
+import random
+
+import pytest
+
+from app.loadtest import harness
+from app.loadtest import scenarios
+
+
+@pytest.mark.parametrize(
+    "size, pct, expected",
+    [
+        (150, 99, 148),
+        (100, 99, 98),
+        (100, 7, 6),
+        (10, 50, 4),
+        (10, 95, 9),
+        (10, 100, 9),
+        (10, 0, 0),
+        (1, 99, 0),
+    ],
+)
+def test_percentile_is_nearest_rank(size, pct, expected):
+    assert harness.percentile(list(range(size)), pct) == expected
+
+
+def test_percentile_of_nothing():
+    assert harness.percentile([], 99) == 0.0
+
+
+def test_zipf_keys_are_skewed_and_repeatable():
+    keys = [f"key-{index}" for index in range(100)]
+    zipf = scenarios.ZipfKeys(keys, exponent=1.1, seed=7)
+
+    rng = random.Random(1)
+    draws = [zipf.draw(rng) for _ in range(5000)]
+
+    rng = random.Random(1)
+    assert [zipf.draw(rng) for _ in range(5000)] == draws
+    assert set(draws) <= set(keys)
+    # the hottest key alone takes far more than a uniform 1%
+    assert max(draws.count(key) for key in set(draws)) > 5000 * 0.1
+    # the same seed shuffles keys the same way in every worker
+    assert scenarios.ZipfKeys(keys, seed=7).keys == zipf.keys
+
+
+def test_zipf_keys_needs_keys():
+    with pytest.raises(ValueError):
+        scenarios.ZipfKeys([])
+
+
+def test_compare_against_baseline():
+    baseline = {
+        "commit": "abc123",
+        "results": [
+            {
+                "scenario": "member-get",
+                "throughput_rps": 200.0,
+                "latency_ms": {"p50": 10.0, "p99": 0.0},
+            }
+        ],
+    }
+    results = [
+        {
+            "scenario": "member-get",
+            "throughput_rps": 250.0,
+            "latency_ms": {"p50": 8.0, "p99": 5.0},
+        },
+        {
+            "scenario": "payments-get",
+            "throughput_rps": 1.0,
+            "latency_ms": {"p50": 1.0},
+        },
+    ]
+
+    assert harness.compare(results, baseline) == [
+        {
+            "scenario": "member-get",
+            "baseline_commit": "abc123",
+            "throughput_rps": pytest.approx(0.25),
+            "latency_ms": {"p50": pytest.approx(-0.2), "p99": 0.0},
+        }
+    ]
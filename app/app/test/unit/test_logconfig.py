@@ -0,0 +1,34 @@
+"""Log sampling and rate limiting tests."""
+
+import logging
+
+from app import logconfig
+
+
+def record(level):
+    """A record at `level` from a hot-path logger."""
+    return logging.LogRecord(
+        "app.models.lookups",
+        level,
+        __file__,
+        1,
+        "Getting member: %s",
+        (1,),
+        None,
+    )
+
+
+def test_sampling_never_drops_warnings():
+    sampler = logconfig.SamplingFilter(0.0)
+
+    assert not sampler.filter(record(logging.INFO))
+    assert sampler.filter(record(logging.WARNING))
+
+
+def test_rate_limit():
+    limiter = logconfig.RateLimitFilter(5)
+
+    kept = [limiter.filter(record(logging.INFO)) for _ in range(20)]
+
+    assert kept.count(True) == 5
+    assert limiter.filter(record(logging.ERROR))
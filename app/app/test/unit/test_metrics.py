@@ -0,0 +1,153 @@
+"""Request metrics tests."""
+
+import time
+
+import flask
+import flask_restful
+import pytest
+import sqlalchemy
+
+from app import metrics
+from app.resources import base
+
+# pylint: disable=redefined-outer-name
+
+
+@pytest.fixture
+def engine():
+    """An instrumented in-memory database."""
+    engine = sqlalchemy.create_engine("sqlite://")
+    metrics.instrument_engine(engine)
+    yield engine
+    engine.dispose()
+
+
+def series(histogram, resource, method="POST"):
+    """`(count, sum)` of one request series."""
+    counts, total = histogram.labels(resource, method).snapshot()
+    return sum(counts), total
+
+
+def test_histogram_render():
+    histogram = metrics.Histogram(
+        "unit_seconds", "Unit test.", ["name"], buckets=(0.1, 1.0)
+    )
+    histogram.labels("a").observe(0.05)
+    histogram.labels("a").observe(0.5)
+    histogram.labels("a").observe(5)
+
+    lines = histogram.render()
+
+    assert 'unit_seconds_bucket{name="a",le="0.1"} 1' in lines
+    assert 'unit_seconds_bucket{name="a",le="1.0"} 2' in lines
+    assert 'unit_seconds_bucket{name="a",le="+Inf"} 3' in lines
+    assert 'unit_seconds_count{name="a"} 3' in lines
+    assert 'unit_seconds_sum{name="a"} 5.55' in lines
+
+
+def test_statements_count_against_current_request(engine):
+    engine.execute("SELECT 1")
+    stats = metrics.start_request()
+    engine.execute("SELECT 1")
+    engine.execute("SELECT 2")
+    metrics.finish_request("UnitResource", "GET", 0.0, stats)
+    engine.execute("SELECT 3")
+
+    assert stats.statements == 2
+    assert stats.db_time > 0
+    assert metrics.current_request() is None
+
+
+@pytest.fixture
+def client(engine):
+    """App with a plain and a streaming resource that query `engine`."""
+
+    class UnitPlainResource(base.BasePetalResource):
+        read_only_methods = ()
+
+        def post(self):  # pylint: disable=no-self-use
+            engine.execute("SELECT 1")
+            return {"ok": True}
+
+    class UnitStreamResource(base.BasePetalResource):
+        read_only_methods = ()
+
+        def post(self):  # pylint: disable=no-self-use
+            def generate():
+                for index in range(3):
+                    engine.execute("SELECT 1")
+                    time.sleep(0.01)
+                    yield f"{index}\n"
+
+            return flask.Response(generate(), mimetype="text/plain")
+
+    class UnitAbortResource(base.BasePetalResource):
+        read_only_methods = ()
+
+        def post(self):  # pylint: disable=no-self-use
+            flask_restful.abort(400, message="bad")
+
+    class UnitPoolTimeoutResource(base.BasePetalResource):
+        read_only_methods = ()
+
+        def post(self):  # pylint: disable=no-self-use
+            raise sqlalchemy.exc.TimeoutError("QueuePool limit reached")
+
+    app = flask.Flask(__name__)
+    api = flask_restful.Api(app)
+    api.add_resource(UnitPlainResource, "/plain")
+    api.add_resource(UnitStreamResource, "/stream")
+    api.add_resource(UnitAbortResource, "/abort")
+    api.add_resource(UnitPoolTimeoutResource, "/pool-timeout")
+    yield app.test_client()
+
+
+def test_plain_request_recorded(client):
+    before = series(metrics.REQUEST_DB_STATEMENTS, "UnitPlainResource")
+
+    assert client.post("/plain").status_code == 200
+
+    after = series(metrics.REQUEST_DB_STATEMENTS, "UnitPlainResource")
+    assert after[0] == before[0] + 1
+    assert after[1] == before[1] + 1
+
+
+def test_streamed_request_recorded_when_closed(client):
+    duration = metrics.REQUEST_DURATION
+    before = series(duration, "UnitStreamResource")
+    statements = series(metrics.REQUEST_DB_STATEMENTS, "UnitStreamResource")
+
+    response = client.post("/stream", buffered=False)
+    # nothing is recorded until the body has been sent
+    assert series(duration, "UnitStreamResource") == before
+    assert response.get_data() == b"0\n1\n2\n"
+    response.close()
+
+    count, total = series(duration, "UnitStreamResource")
+    assert count == before[0] + 1
+    assert total - before[1] >= 0.03
+    assert series(metrics.REQUEST_DB_STATEMENTS, "UnitStreamResource") == (
+        statements[0] + 1,
+        statements[1] + 3,
+    )
+    assert metrics.current_request() is None
+
+
+def test_aborted_request_recorded(client):
+    before = series(metrics.REQUEST_DURATION, "UnitAbortResource")
+
+    assert client.post("/abort").status_code == 400
+
+    after = series(metrics.REQUEST_DURATION, "UnitAbortResource")
+    assert after[0] == before[0] + 1
+
+
+def test_pool_timeout_is_503(client):
+    before = series(metrics.REQUEST_DURATION, "UnitPoolTimeoutResource")
+
+    response = client.post("/pool-timeout")
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    after = series(metrics.REQUEST_DURATION, "UnitPoolTimeoutResource")
+    assert after[0] == before[0] + 1
@@ -0,0 +1,26 @@
+"""Partition naming and month arithmetic tests."""
+
+import datetime
+
+import pytest
+
+from app import partitions
+
+
+@pytest.mark.parametrize(
+    "month, months, expected",
+    [
+        (datetime.date(2021, 9, 1), 1, datetime.date(2021, 10, 1)),
+        (datetime.date(2021, 12, 1), 1, datetime.date(2022, 1, 1)),
+        (datetime.date(2021, 1, 1), -1, datetime.date(2020, 12, 1)),
+        (datetime.date(2021, 9, 1), 24, datetime.date(2023, 9, 1)),
+    ],
+)
+def test_add_months(month, months, expected):
+    assert partitions.add_months(month, months) == expected
+
+
+def test_partition_name():
+    month = partitions.month_start(datetime.date(2021, 9, 28))
+
+    assert partitions.partition_name(month) == "transactions_y2021m09"
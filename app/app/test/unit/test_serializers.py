@@ -0,0 +1,56 @@
+"""Serializer and encoder tests."""
+
+import datetime
+import decimal
+import json
+
+from app import models
+from app import serializers
+
+
+def test_as_dict_keeps_types():
+    created_at = datetime.datetime(2021, 9, 28, 19, 18, 23)
+    member = models.Member(
+        id=1,
+        created_at=created_at,
+        member_uuid="992a54a8-3d3d-43de-a852-4aa41f16cc27",
+        first_name="Bobby",
+    )
+
+    row = member.as_dict()
+
+    assert row["id"] == 1
+    assert row["created_at"] == created_at
+    assert row["last_name"] is None
+
+
+def test_decimals_encode_exactly():
+    encoded = serializers.dumps({"amount": decimal.Decimal("12.50")})
+
+    assert encoded == b'{"amount":12.50}'
+    assert json.loads(encoded, parse_float=decimal.Decimal) == {
+        "amount": decimal.Decimal("12.50")
+    }
+
+
+def test_row_serializer_uses_column_subset():
+    serializer = serializers.serializer_for(
+        models.Transactions, models.Transactions.HISTORY_COLUMNS
+    )
+    row = (
+        7,
+        1001,
+        datetime.datetime(2021, 9, 3, 12),
+        decimal.Decimal("1.25"),
+        "Acme",
+        None,
+    )
+
+    assert json.loads(serializers.dumps(serializer.row(row))) == {
+        "id": 7,
+        "card_id": 1001,
+        "transaction_date": "2021-09-03T12:00:00",
+        "amount": 1.25,
+        "merchant": "Acme",
+        "category": None,
+    }
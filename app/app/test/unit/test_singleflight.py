@@ -0,0 +1,76 @@
+"""Single-flight tests, within one process."""
+
+import threading
+import time
+
+import pytest
+
+from app import models
+from app import singleflight
+
+
+@pytest.fixture(autouse=True)
+def no_locker(monkeypatch):
+    monkeypatch.setattr(models.Base, "locker", None)
+
+
+def test_concurrent_misses_compute_once():
+    flight = singleflight.SingleFlight("unit_once", ttl=60)
+    started = threading.Event()
+    finish = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        finish.wait(5)
+        return 42
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(flight.get("key", compute))
+        )
+        for _ in range(8)
+    ]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    time.sleep(0.05)
+    finish.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == [42] * 8
+    assert len(calls) == 1
+    stats = flight.stats()
+    assert stats["computed"] == 1
+    assert stats["contended"] == 7
+    assert stats["wait_seconds"] > 0
+
+
+def test_expired_value_served_while_recomputing():
+    flight = singleflight.SingleFlight("unit_stale", ttl=0.01, max_stale=60)
+    assert flight.get("key", lambda: "old") == "old"
+    time.sleep(0.02)
+
+    started = threading.Event()
+    finish = threading.Event()
+
+    def compute():
+        started.set()
+        finish.wait(5)
+        return "new"
+
+    recompute = threading.Thread(target=flight.get, args=("key", compute))
+    recompute.start()
+    started.wait(5)
+    assert flight.get("key", compute) == "old"
+    finish.set()
+    recompute.join(5)
+
+    assert flight.cache.get("key")[0] == "new"
+    stats = flight.stats()
+    assert stats["stale"] == 1
+    assert stats["computed"] == 2
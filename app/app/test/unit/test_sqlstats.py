@@ -0,0 +1,131 @@
+"""SQL statement stats tests."""
+
+import pytest
+
+from app import sqlstats
+
+
+@pytest.mark.parametrize(
+    "statement,expected",
+    [
+        (
+            "SELECT * FROM members WHERE member_uuid = %(member_uuid_1)s",
+            "SELECT * FROM members WHERE member_uuid = ?",
+        ),
+        (
+            "SELECT * FROM cards WHERE id = 42 AND name = 'o''brien'",
+            "SELECT * FROM cards WHERE id = ? AND name = ?",
+        ),
+        (
+            "SELECT * FROM cards WHERE id IN (%s, %s, %s)",
+            "SELECT * FROM cards WHERE id IN (?)",
+        ),
+        (
+            "INSERT INTO cards (member_uuid) VALUES (%s), (%s), (%s)",
+            "INSERT INTO cards (member_uuid) VALUES (?)",
+        ),
+        (
+            "SELECT amount\n    FROM transactions\n  WHERE card_id = $1",
+            "SELECT amount FROM transactions WHERE card_id = ?",
+        ),
+        ("SELECT t1.id FROM t1", "SELECT t1.id FROM t1"),
+    ],
+)
+def test_normalize(statement, expected):
+    assert sqlstats.normalize(statement) == expected
+
+
+def test_fingerprint_is_short_and_stable():
+    normalized = sqlstats.normalize("SELECT * FROM cards WHERE id = 1")
+
+    assert sqlstats.fingerprint(normalized) == sqlstats.fingerprint(
+        sqlstats.normalize("SELECT *  FROM cards WHERE id = 2")
+    )
+    assert len(sqlstats.fingerprint(normalized)) == 16
+    assert sqlstats.fingerprint(normalized) != sqlstats.fingerprint(
+        "SELECT * FROM members"
+    )
+
+
+def test_registry_groups_by_fingerprint():
+    registry = sqlstats.StatementRegistry(max_fingerprints=10)
+    registry.record("SELECT * FROM cards WHERE id = 1", 0.002, 1)
+    registry.record("SELECT * FROM cards WHERE id = 2", 0.004, 1)
+    registry.record("SELECT * FROM members", 0.001, -1)
+
+    top = registry.top()
+
+    assert [row["statement"] for row in top] == [
+        "SELECT * FROM cards WHERE id = ?",
+        "SELECT * FROM members",
+    ]
+    assert top[0]["calls"] == 2
+    assert top[0]["total_ms"] == pytest.approx(6)
+    assert top[0]["max_ms"] == pytest.approx(4)
+    assert top[0]["rows_per_call"] == 1
+    # rowcount is -1 when the driver doesn't know it
+    assert top[1]["rows"] == 0
+    assert registry.top(order_by="calls", limit=1)[0]["calls"] == 2
+
+
+def test_registry_counts_slow_calls(monkeypatch):
+    monkeypatch.setattr(sqlstats, "SLOW_QUERY_SECONDS", 0.1)
+    registry = sqlstats.StatementRegistry()
+
+    registry.record("SELECT 1", 0.05, 1)
+    stats = registry.record("SELECT 1", 0.2, 1)
+
+    assert stats.slow_calls == 1
+
+
+def test_registry_drops_new_fingerprints_when_full():
+    registry = sqlstats.StatementRegistry(max_fingerprints=2)
+    registry.record("SELECT * FROM cards", 0.001, 1)
+    registry.record("SELECT * FROM members", 0.001, 1)
+
+    assert registry.record("SELECT * FROM transactions", 0.001, 1) is None
+    assert registry.record("SELECT * FROM cards", 0.001, 1).calls == 2
+    assert registry.dropped == 1
+
+    registry.reset()
+
+    assert registry.top() == []
+    assert registry.dropped == 0
+    assert registry.record("SELECT * FROM transactions", 0.001, 1)
+
+
+@pytest.mark.parametrize(
+    "statement,expected",
+    [
+        (
+            "SELECT * FROM transactions WHERE card_id = %(card_id)s",
+            "EXPLAIN (ANALYZE, BUFFERS)",
+        ),
+        (
+            "WITH spend AS (SELECT card_id FROM transactions) "
+            "SELECT * FROM spend",
+            "EXPLAIN (ANALYZE, BUFFERS)",
+        ),
+        (
+            "SELECT pg_advisory_lock(20211001, id) FROM cards",
+            "EXPLAIN",
+        ),
+        ("SELECT nextval('cards_id_seq') FROM cards", "EXPLAIN"),
+        (
+            "SELECT pg_notify('model_cache', member_uuid::text) FROM members",
+            "EXPLAIN",
+        ),
+        ("SELECT * FROM cards WHERE id = 1 FOR UPDATE", "EXPLAIN"),
+        (
+            "WITH moved AS (UPDATE cards SET member_uuid = NULL RETURNING id) "
+            "SELECT * FROM moved",
+            "EXPLAIN",
+        ),
+        ("SELECT pg_advisory_lock(1)", None),
+        ("SELECT 1", None),
+        ("INSERT INTO cards DEFAULT VALUES", None),
+        ("DELETE FROM cards", None),
+    ],
+)
+def test_explain_command(statement, expected):
+    assert sqlstats.explain_command(statement) == expected
@@ -0,0 +1,133 @@
+"""Startup cost tests.
+
+The app must import quickly and without a database: connecting is left to
+`PostgresMixin.warmup()`.
+"""
+
+import os
+import subprocess
+import sys
+from unittest import mock
+
+import flask
+import pytest
+
+from app import postgres
+
+# pylint: disable=redefined-outer-name
+
+# Cumulative import time of the server and everything it pulls in. Generous
+# so a loaded CI machine doesn't fail it; set STARTUP_IMPORT_BUDGET_S to
+# tighten it when measuring.
+SERVER_IMPORT_BUDGET_S = float(os.environ.get("STARTUP_IMPORT_BUDGET_S", 5))
+
+# Kept off the import path; imported on first use or by other entry points
+DEFERRED_MODULES = ("healthcheck", "numpy", "asyncpg", "starlette", "alembic")
+
+UNREACHABLE = {
+    "POSTGRES_HOST": "127.0.0.1",
+    "POSTGRES_PORT": "1",
+    "POSTGRES_USER": "nobody",
+    "POSTGRES_PASSWORD": "nobody",
+    "POSTGRES_DB": "nobody",
+}
+
+
+def import_times(module):
+    """Run `import module` under `-X importtime`; cumulative seconds each."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env={**os.environ, **UNREACHABLE},
+        capture_output=True,
+        text=True,
+        timeout=60,
+        check=False,
+    )
+    assert result.returncode == 0, result.stderr
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def test_main_imports_without_database():
+    times = import_times("app.main")
+
+    assert "app.main" in times
+    for module in DEFERRED_MODULES:
+        assert module not in times
+
+
+def test_server_import_budget():
+    times = import_times("app.resources.server")
+
+    for module in DEFERRED_MODULES:
+        assert module not in times
+    assert times["app.resources.server"] < SERVER_IMPORT_BUDGET_S, times
+
+
+class Clock:
+    """Stand-in for `time.monotonic`."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def unreachable(monkeypatch):
+    """A `PostgresMixin` app whose database connect always fails."""
+    for name, value in UNREACHABLE.items():
+        monkeypatch.setenv(name, value)
+    clock = Clock()
+    monkeypatch.setattr(postgres.time, "monotonic", clock)
+
+    server = postgres.PostgresMixin()
+    server.app = flask.Flask(__name__)
+    server.db_connect()
+    server.conn.connect = mock.Mock(side_effect=OSError("unreachable"))
+
+    @server.app.route("/ping")
+    def ping():  # pylint: disable=unused-variable
+        return "pong"
+
+    yield server, clock
+
+
+def test_warmup_backs_off_after_failure(unreachable):
+    server, clock = unreachable
+
+    with pytest.raises(OSError):
+        server.warmup()
+    with pytest.raises(postgres.WarmupPending):
+        server.warmup()
+    assert server.conn.connect.call_count == 1
+
+    clock.now += postgres.WARMUP_BACKOFF_S
+    with pytest.raises(OSError):
+        server.warmup()
+    assert server.conn.connect.call_count == 2
+
+    # doubled
+    clock.now += postgres.WARMUP_BACKOFF_S
+    with pytest.raises(postgres.WarmupPending):
+        server.warmup()
+
+
+def test_requests_during_backoff_get_503(unreachable):
+    server, clock = unreachable
+    with pytest.raises(OSError):
+        server.warmup()
+    client = server.app.test_client()
+
+    clock.now += 0.5
+    response = client.get("/ping")
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert server.conn.connect.call_count == 1
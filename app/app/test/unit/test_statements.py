@@ -0,0 +1,63 @@
+"""Statement export tests."""
+
+import csv
+import datetime
+import decimal
+import uuid
+
+import pytest
+
+from app import statements
+
+ROWS = [
+    (
+        "0f3c2e4a-0000-4000-8000-000000000000",
+        1,
+        "gas",
+        2,
+        decimal.Decimal("12.50"),
+    ),
+    (
+        "0f3c2e4a-0000-4000-8000-000000000000",
+        1,
+        None,
+        1,
+        decimal.Decimal("3.00"),
+    ),
+]
+
+
+def test_member_ranges_cover_uuid_space():
+    ranges = statements.member_ranges(4)
+
+    assert ranges[0][0] is None and ranges[-1][1] is None
+    for (_, high), (low, _) in zip(ranges, ranges[1:]):
+        assert high == low
+    assert uuid.UUID(ranges[2][0]).int == 2**127
+
+
+def test_month_bounds():
+    assert statements.month_bounds(datetime.date(2021, 2, 1)) == (
+        datetime.date(2021, 2, 1),
+        datetime.date(2021, 3, 1),
+    )
+
+
+def test_write_csv(tmp_path):
+    path = str(tmp_path / "part.csv")
+
+    assert statements.write_csv(path, [ROWS[:1], ROWS[1:]]) == 2
+    with open(path, newline="") as written:
+        rows = list(csv.reader(written))
+    assert rows[0] == list(statements.COLUMNS)
+    assert rows[1][4] == "12.50" and rows[2][2] == ""
+
+
+def test_write_parquet(tmp_path):
+    parquet = pytest.importorskip("pyarrow.parquet")
+    path = str(tmp_path / "part.parquet")
+
+    assert statements.write_parquet(path, [ROWS]) == 2
+    table = parquet.read_table(path).to_pylist()
+    assert table[0]["total"] == decimal.Decimal("12.50")
+    assert table[1]["category"] is None
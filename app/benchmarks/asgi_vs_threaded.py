@@ -0,0 +1,84 @@
+"""Benchmark the asyncio server against the threaded one.
+
+Spawns each server in turn, the threaded app under uWSGI
+(`--uwsgi-ini`) and `app.asgi` under uvicorn with the same number of
+processes. Each one gets the load-test scenarios at every `--concurrency`
+level, so throughput and p99 latency show where each server saturates.
+Arguments after `--` go to `app-loadtest`.
+
+Example:
+```bash
+% python benchmarks/asgi_vs_threaded.py --concurrency 32,128,512 \\
+      -- --duration 30 member-get payments-get > asgi_vs_threaded.json
+```
+"""
+
+import argparse
+import copy
+import json
+import logging
+import sys
+from typing import Any
+from typing import Dict
+from typing import List
+
+from app.loadtest import harness
+
+LOG = logging.getLogger(__name__)
+
+SERVERS = ("uwsgi", "asgi")
+
+
+def _levels(value: str) -> List[int]:
+    return [int(level) for level in value.split(",")]
+
+
+def run(options: argparse.Namespace) -> Dict[str, Any]:
+    """Run every server at every concurrency level."""
+    base = harness.parse_args(options.loadtest)
+    base.spawn = True
+    runs = []
+    for server in SERVERS:
+        for concurrency in options.concurrency:
+            loadtest = copy.copy(base)
+            loadtest.server = server
+            loadtest.concurrency = concurrency
+            LOG.info(f"Running {server} at concurrency {concurrency}")
+            for result in harness.run(loadtest)["results"]:
+                runs.append(
+                    {
+                        "server": server,
+                        "scenario": result["scenario"],
+                        "concurrency": concurrency,
+                        "throughput_rps": result["throughput_rps"],
+                        "errors": result["errors"],
+                        "latency_ms": result["latency_ms"],
+                    }
+                )
+    return {"commit": harness.git_commit(), "runs": runs}
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--concurrency",
+        type=_levels,
+        default="32,128,512",
+        help="comma separated client concurrency levels",
+    )
+    parser.add_argument(
+        "loadtest", nargs="*", help="app-loadtest arguments, after --"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> None:
+    """Run the benchmark and print the JSON report."""
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    json.dump(run(parse_args(argv)), sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
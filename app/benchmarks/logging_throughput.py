@@ -0,0 +1,143 @@
+"""Benchmark hot-path logging from many threads.
+
+Each mode has `--threads` threads (as under uWSGI) log `--messages`
+lookup lines each to a file, and reports how many lines per second the
+callers get through, plus the time for the queue to drain. Every write
+sleeps `--write-delay-us` to stand in for a log pipe or disk that is
+momentarily slow; set it to 0 to measure against the page cache alone.
+
+- `sync_eager`: f-string messages straight to a StreamHandler, as with
+  the old `logging.basicConfig` setup.
+- `queued_lazy`: %-style messages through a QueueHandler, written by a
+  QueueListener thread, as `app.logconfig` sets up.
+- `queued_sampled`: as above, keeping `--sample` of the records.
+
+Example:
+```bash
+% python benchmarks/logging_throughput.py --threads 128 --messages 2000
+```
+"""
+
+import argparse
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import tempfile
+import threading
+import time
+from typing import Any
+from typing import Dict
+from typing import List
+
+from app import logconfig
+
+MEMBER_UUID = "992a54a8-3d3d-43de-a852-4aa41f16cc27"
+
+
+class _SlowStream:
+    """File wrapper whose writes block for a while, releasing the GIL."""
+
+    def __init__(self, stream: Any, delay: float) -> None:
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, text: str) -> int:
+        if self.delay:
+            time.sleep(self.delay)
+        return self.stream.write(text)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+
+def _eager(logger: logging.Logger, count: int) -> None:
+    for index in range(count):
+        logger.info(f"Getting member: {MEMBER_UUID} ({index})")
+
+
+def _lazy(logger: logging.Logger, count: int) -> None:
+    for index in range(count):
+        logger.info("Getting member: %s (%d)", MEMBER_UUID, index)
+
+
+def run_mode(
+    mode: str, options: argparse.Namespace, path: str
+) -> Dict[str, Any]:
+    """Log from every thread in one mode and time it."""
+    with open(path, "w") as stream:
+        handler = logging.StreamHandler(
+            _SlowStream(stream, options.write_delay_us / 1e6)
+        )
+        handler.setFormatter(logging.Formatter(logconfig.FORMAT))
+        logger = logging.getLogger(f"bench.{mode}")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+
+        listener = None
+        if mode == "sync_eager":
+            logger.addHandler(handler)
+            emit = _eager
+        else:
+            records: "queue.SimpleQueue[Any]" = queue.SimpleQueue()
+            logger.addHandler(logging.handlers.QueueHandler(records))
+            listener = logging.handlers.QueueListener(records, handler)
+            listener.start()
+            emit = _lazy
+            if mode == "queued_sampled":
+                logger.addFilter(logconfig.SamplingFilter(options.sample))
+
+        threads = [
+            threading.Thread(target=emit, args=(logger, options.messages))
+            for _ in range(options.threads)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        callers_done = time.perf_counter() - started
+        if listener is not None:
+            listener.stop()
+        drained = time.perf_counter() - started
+
+    total = options.threads * options.messages
+    return {
+        "mode": mode,
+        "messages": total,
+        "caller_messages_per_s": total / callers_done,
+        "caller_s": callers_done,
+        "drained_s": drained,
+    }
+
+
+def run(options: argparse.Namespace) -> List[Dict[str, Any]]:
+    """Run every mode."""
+    with tempfile.NamedTemporaryFile(suffix=".log") as log_file:
+        return [
+            run_mode(mode, options, log_file.name)
+            for mode in ("sync_eager", "queued_lazy", "queued_sampled")
+        ]
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--threads", type=int, default=128)
+    parser.add_argument(
+        "--messages", type=int, default=1000, help="per thread"
+    )
+    parser.add_argument("--sample", type=float, default=0.01)
+    parser.add_argument("--write-delay-us", type=float, default=50.0)
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> None:
+    """Run the benchmark and print the JSON report."""
+    json.dump(run(parse_args(argv)), sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Benchmark `GET /api/member/search` queries at a million members.
+
+Seed first, e.g. `app-datagen --members 1000000`. Search terms are built
+from sampled members: 3-5 character prefixes of first names, last names
+and emails, and last names with one character dropped (fuzzy matches).
+Each kind is timed through `Member.search` with the trigram indexes, then
+again with index scans disabled for the session, which is what the lookup
+cost before the indexes existed.
+
+Example:
+```bash
+% python benchmarks/member_search.py --samples 500 > member_search.json
+```
+"""
+
+import argparse
+import json
+import logging
+import random
+import sys
+import time
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+
+import sqlalchemy
+
+from app import models
+from app import postgres
+
+LOG = logging.getLogger(__name__)
+
+
+def _summary(timings: List[float]) -> Dict[str, float]:
+    ordered = sorted(timings)
+
+    def pct(value: float) -> float:
+        return ordered[min(len(ordered) - 1, int(value * len(ordered)))]
+
+    return {
+        "p50_ms": pct(0.50) * 1000,
+        "p95_ms": pct(0.95) * 1000,
+        "p99_ms": pct(0.99) * 1000,
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+    }
+
+
+def _drop_one(value: str, rng: random.Random) -> str:
+    index = rng.randrange(len(value))
+    return value[:index] + value[index + 1 :]
+
+
+TERMS: Dict[str, Callable[[Any, random.Random], str]] = {
+    "first_name_prefix": lambda row, rng: row[0][: rng.randint(3, 5)],
+    "last_name_prefix": lambda row, rng: row[1][: rng.randint(3, 5)],
+    "email_prefix": lambda row, rng: row[2][: rng.randint(3, 5)],
+    "last_name_fuzzy": lambda row, rng: _drop_one(row[1], rng),
+}
+
+
+def search_latency(
+    conn: postgres.DatabaseConnection,
+    terms: List[str],
+    limit: int,
+    use_indexes: bool,
+) -> Dict[str, Any]:
+    """Latency of `Member.search` for each term, in one session."""
+    session = conn.session()
+    if not use_indexes:
+        session.execute("SET LOCAL enable_bitmapscan = off")
+        session.execute("SET LOCAL enable_indexscan = off")
+    timings = []
+    found = 0
+    try:
+        for term in terms:
+            started = time.perf_counter()
+            found += len(models.Member.search(term, limit))
+            timings.append(time.perf_counter() - started)
+    finally:
+        conn.session.remove()
+    return {**_summary(timings), "mean_results": found / len(terms)}
+
+
+def run(options: argparse.Namespace) -> Dict[str, Any]:
+    """Time every kind of search term, with and without the indexes."""
+    conn = postgres.DatabaseConnection()
+    rng = random.Random(options.seed)
+    members = conn.engine.execute(
+        sqlalchemy.text(
+            "SELECT first_name, last_name, email FROM member "
+            "TABLESAMPLE SYSTEM (1) "
+            "WHERE first_name <> '' AND last_name <> '' AND email <> '' "
+            "LIMIT :limit"
+        ),
+        {"limit": options.samples},
+    ).fetchall()
+    total = conn.engine.execute("SELECT count(*) FROM member").scalar()
+
+    results: Dict[str, Any] = {"members": total, "limit": options.limit}
+    for kind, make_term in TERMS.items():
+        terms = [make_term(row, rng) for row in members]
+        LOG.info(f"Benchmarking {kind}")
+        # one untimed pass to warm the cache
+        search_latency(conn, terms, options.limit, True)
+        results[kind] = {
+            "trigram_index": search_latency(conn, terms, options.limit, True)
+        }
+        if not options.skip_scan:
+            results[kind]["sequential_scan"] = search_latency(
+                conn, terms[: options.scan_samples], options.limit, False
+            )
+    return results
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--samples", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument(
+        "--scan-samples",
+        type=int,
+        default=20,
+        help="terms timed without indexes (each scans the whole table)",
+    )
+    parser.add_argument("--skip-scan", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> None:
+    """Run the benchmark and print the JSON report."""
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    json.dump(run(parse_args(argv)), sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""Benchmark month-to-date queries and vacuum on partitioned transactions.
+
+Compares the partitioned `transactions` table against an unpartitioned copy
+of the same rows (`bench_transactions_heap`, built on first run with the
+same covering index). Seed the database with `app-datagen` first; the copy
+is kept between runs unless `--drop-copy` is given.
+
+Query latency is the month-to-date sum for randomly sampled members. Vacuum
+cost is measured after touching `--churn` of the month's rows in both
+tables: the heap has to be vacuumed whole, the partitioned table only in
+the month's partition.
+
+Example:
+```bash
+% python benchmarks/partitioning.py --month 2021-09 --samples 2000 \\
+      > partitioning.json
+```
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import random
+import sys
+import time
+from typing import Any
+from typing import Dict
+from typing import List
+
+import sqlalchemy
+
+from app import partitions
+from app import postgres
+
+LOG = logging.getLogger(__name__)
+
+HEAP = "bench_transactions_heap"
+
+MONTH_TO_DATE = """
+SELECT COALESCE(SUM(t.amount), 0)
+FROM card c
+LEFT JOIN {table} t
+    ON t.card_id = c.id
+   AND t.transaction_date >= :start
+   AND t.transaction_date < :end
+WHERE c.member_uuid = :member_uuid
+"""
+
+
+def build_heap(engine: sqlalchemy.engine.Engine) -> None:
+    """Copy transactions into an unpartitioned table, if not done yet."""
+    with engine.begin() as db:
+        exists = db.execute(
+            sqlalchemy.text("SELECT to_regclass(:name) IS NOT NULL"),
+            {"name": HEAP},
+        ).scalar()
+        if exists:
+            return
+        LOG.info(f"Copying transactions into {HEAP}")
+        db.execute(f"CREATE TABLE {HEAP} AS SELECT * FROM transactions")
+        db.execute(f"ALTER TABLE {HEAP} ADD PRIMARY KEY (id)")
+        db.execute(
+            f"CREATE INDEX ix_{HEAP}_card_id_transaction_date "
+            f"ON {HEAP} (card_id, transaction_date) INCLUDE (amount)"
+        )
+    _autocommit(engine, f"VACUUM ANALYZE {HEAP}")
+    _autocommit(engine, "VACUUM ANALYZE transactions")
+
+
+def _autocommit(engine: sqlalchemy.engine.Engine, statement: str) -> float:
+    started = time.perf_counter()
+    engine.execution_options(isolation_level="AUTOCOMMIT").execute(statement)
+    return time.perf_counter() - started
+
+
+def _summary(timings: List[float]) -> Dict[str, float]:
+    ordered = sorted(timings)
+
+    def pct(value: float) -> float:
+        return ordered[min(len(ordered) - 1, int(value * len(ordered)))]
+
+    return {
+        "p50_ms": pct(0.50) * 1000,
+        "p95_ms": pct(0.95) * 1000,
+        "p99_ms": pct(0.99) * 1000,
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+    }
+
+
+def query_latency(
+    engine: sqlalchemy.engine.Engine,
+    table: str,
+    member_uuids: List[str],
+    month: datetime.date,
+    day: int,
+) -> Dict[str, float]:
+    """Month-to-date query latency against `table`."""
+    statement = sqlalchemy.text(MONTH_TO_DATE.format(table=table))
+    params = {
+        "start": month,
+        "end": month + datetime.timedelta(days=day),
+    }
+    timings = []
+    with engine.connect() as db:
+        for member_uuid in member_uuids:
+            started = time.perf_counter()
+            db.execute(statement, member_uuid=member_uuid, **params).scalar()
+            timings.append(time.perf_counter() - started)
+    return _summary(timings)
+
+
+def vacuum_cost(
+    engine: sqlalchemy.engine.Engine,
+    table: str,
+    vacuum_target: str,
+    month: datetime.date,
+    churn: float,
+) -> Dict[str, float]:
+    """Touch `churn` of the month's rows in `table`, then vacuum."""
+    with engine.begin() as db:
+        touched = db.execute(
+            sqlalchemy.text(
+                f"UPDATE {table} SET merchant = merchant "
+                "WHERE transaction_date >= :start AND transaction_date < :end "
+                "AND random() < :churn"
+            ),
+            {
+                "start": month,
+                "end": partitions.add_months(month, 1),
+                "churn": churn,
+            },
+        ).rowcount
+        size = db.execute(
+            sqlalchemy.text("SELECT pg_total_relation_size(:name)"),
+            {"name": vacuum_target},
+        ).scalar()
+    return {
+        "rows_touched": touched,
+        "vacuumed_bytes": size,
+        "vacuum_s": _autocommit(engine, f"VACUUM {vacuum_target}"),
+    }
+
+
+def run(options: argparse.Namespace) -> Dict[str, Any]:
+    """Run both benchmarks against both tables."""
+    engine = postgres.DatabaseConnection().engine
+    build_heap(engine)
+
+    member_uuids = [
+        row[0]
+        for row in engine.execute(
+            sqlalchemy.text(
+                "SELECT member_uuid FROM member "
+                "TABLESAMPLE SYSTEM (1) LIMIT :limit"
+            ),
+            {"limit": options.samples},
+        )
+    ]
+    random.Random(options.seed).shuffle(member_uuids)
+    partition = partitions.partition_name(options.month)
+
+    results: Dict[str, Any] = {"month": f"{options.month:%Y-%m}"}
+    for label, table, vacuum_target in [
+        ("unpartitioned", HEAP, HEAP),
+        ("partitioned", "transactions", partition),
+    ]:
+        LOG.info(f"Benchmarking {label}")
+        # one untimed pass to warm the cache
+        query_latency(engine, table, member_uuids, options.month, options.day)
+        results[label] = {
+            "query": query_latency(
+                engine, table, member_uuids, options.month, options.day
+            ),
+            "vacuum": vacuum_cost(
+                engine, table, vacuum_target, options.month, options.churn
+            ),
+        }
+
+    if options.drop_copy:
+        engine.execute(f"DROP TABLE {HEAP}")
+    return results
+
+
+def _month(value: str) -> datetime.date:
+    return datetime.datetime.strptime(value, "%Y-%m").date()
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--month", type=_month, default="2021-09")
+    parser.add_argument(
+        "--day", type=int, default=28, help="month-to-date through this day"
+    )
+    parser.add_argument("--samples", type=int, default=1000)
+    parser.add_argument(
+        "--churn",
+        type=float,
+        default=0.05,
+        help="fraction of the month's rows to update before vacuuming",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--drop-copy", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> None:
+    """Run the benchmark and print the JSON report."""
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    json.dump(run(parse_args(argv)), sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Micro-benchmark of the member read and serialization path.
+
+Compares CPU time per lookup for the old path (hydrate a `Member` through
+the ORM, stringify every column, encode with the stdlib `json` that
+flask_restful uses) against the new one (select the columns as a Core row,
+serialize with the precomputed `Serializer`, encode with orjson). Each
+lookup runs in a fresh session, as it would per request.
+
+`--encode-only` skips the database and times just the encoding of
+already-loaded rows.
+
+Example:
+```bash
+% python benchmarks/serialization.py --lookups 5000 > serialization.json
+```
+"""
+
+import argparse
+import datetime
+import decimal
+import json
+import logging
+import sys
+import time
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+
+import sqlalchemy
+
+from app import models
+from app import postgres
+from app import serializers
+
+LOG = logging.getLogger(__name__)
+
+
+def old_member(member_uuid: str) -> str:
+    """Today's path before the serializers: ORM instance, str() per column."""
+    member = models.Member.get_member(member_uuid).first()
+    row = {
+        column.name: str(getattr(member, column.name))
+        for column in member.__table__.columns
+    }
+    return json.dumps(row) + "\n"
+
+
+def new_member(member_uuid: str) -> bytes:
+    """Core row, precomputed serializer, orjson."""
+    return serializers.dumps(models.Member.get_member_row(member_uuid))
+
+
+def cpu_per_call(
+    function: Callable[[Any], Any],
+    arguments: List[Any],
+    session: Any = None,
+) -> Dict[str, float]:
+    """CPU and wall microseconds per call of `function`."""
+    cpu = wall = 0.0
+    for argument in arguments:
+        wall_started = time.perf_counter()
+        cpu_started = time.process_time()
+        function(argument)
+        if session is not None:
+            session.remove()
+        cpu += time.process_time() - cpu_started
+        wall += time.perf_counter() - wall_started
+    return {
+        "cpu_us": cpu / len(arguments) * 1e6,
+        "wall_us": wall / len(arguments) * 1e6,
+    }
+
+
+def encode_only(iterations: int) -> Dict[str, Any]:
+    """Time encoding a member and a transaction page, no database."""
+    member = {
+        "id": 1,
+        "created_at": datetime.datetime(2021, 9, 28, 19, 18, 23, 154455),
+        "member_uuid": "992a54a8-3d3d-43de-a852-4aa41f16cc27",
+        "first_name": "Bobby",
+        "last_name": "DropTables",
+        "address": "123 Main Street",
+        "email": "bobby@example.com",
+    }
+    page = [
+        {
+            "id": index,
+            "card_id": 1001,
+            "transaction_date": datetime.datetime(2021, 9, 1 + index % 28),
+            "amount": decimal.Decimal("12.34"),
+            "merchant": "Acme",
+            "category": "gas",
+        }
+        for index in range(100)
+    ]
+    results = {}
+    for name, payload in [("member", member), ("transactions_100", page)]:
+        for encoder, encode in [
+            ("stdlib", lambda value: json.dumps(value, default=str)),
+            ("orjson", serializers.dumps),
+        ]:
+            started = time.process_time()
+            for _ in range(iterations):
+                encode(payload)
+            elapsed = time.process_time() - started
+            results[f"{name}_{encoder}_us"] = elapsed / iterations * 1e6
+    return results
+
+
+def run(options: argparse.Namespace) -> Dict[str, Any]:
+    """Run the benchmark."""
+    report: Dict[str, Any] = {"encode": encode_only(options.iterations)}
+    if options.encode_only:
+        return report
+
+    conn = postgres.DatabaseConnection()
+    member_uuids = [
+        row[0]
+        for row in conn.engine.execute(
+            sqlalchemy.text("SELECT member_uuid FROM member LIMIT :limit"),
+            {"limit": options.lookups},
+        )
+    ]
+    # warm the connection pool and statement caches
+    cpu_per_call(old_member, member_uuids[:100], conn.session)
+    cpu_per_call(new_member, member_uuids[:100], conn.session)
+
+    old = cpu_per_call(old_member, member_uuids, conn.session)
+    new = cpu_per_call(new_member, member_uuids, conn.session)
+    report["lookup"] = {
+        "lookups": len(member_uuids),
+        "orm_stdlib": old,
+        "core_orjson": new,
+        "cpu_saved_us": old["cpu_us"] - new["cpu_us"],
+    }
+    return report
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--encode-only", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> None:
+    """Run the benchmark and print the JSON report."""
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    json.dump(run(parse_args(argv)), sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Benchmark uWSGI process/thread layouts with the load-test harness.
+
+Starts the app under uWSGI once per layout (`processes x threads`, in
+preloaded and, with `--lazy-apps`, lazy-apps mode) and runs the given
+load-test scenarios against it. Each process's connection pool is sized
+to its thread count so layouts hold comparable connection budgets.
+Arguments after `--` go to `app-loadtest`.
+
+Example:
+```bash
+% python benchmarks/uwsgi_layouts.py --layouts 1x128,2x64,4x32,8x16 \\
+      --lazy-apps -- --concurrency 128 --duration 30 member-get \\
+      > uwsgi_layouts.json
+```
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Tuple
+from unittest import mock
+
+from app.loadtest import harness
+
+LOG = logging.getLogger(__name__)
+
+
+def _layouts(value: str) -> List[Tuple[int, int]]:
+    layouts = []
+    for layout in value.split(","):
+        processes, _, threads = layout.partition("x")
+        layouts.append((int(processes), int(threads)))
+    return layouts
+
+
+def run_layout(
+    processes: int, threads: int, lazy: bool, loadtest: argparse.Namespace
+) -> Dict[str, Any]:
+    """Spawn uWSGI with one layout and load-test it."""
+    env = {
+        "UWSGI_PROCESSES": str(processes),
+        "UWSGI_THREADS": str(threads),
+        "POSTGRES_POOL_SIZE": str(threads),
+        "POSTGRES_MAX_OVERFLOW": "0",
+    }
+    if lazy:
+        env["UWSGI_LAZY_APPS"] = "1"
+    LOG.info(f"Running {processes}x{threads} lazy={lazy}")
+    with mock.patch.dict(os.environ, env):
+        report = harness.run(loadtest)
+    return {
+        "processes": processes,
+        "threads": threads,
+        "lazy_apps": lazy,
+        "results": report["results"],
+    }
+
+
+def run(options: argparse.Namespace) -> Dict[str, Any]:
+    """Run every layout in every mode."""
+    loadtest = harness.parse_args(options.loadtest)
+    loadtest.spawn = True
+    modes = [False, True] if options.lazy_apps else [False]
+    return {
+        "commit": harness.git_commit(),
+        "layouts": [
+            run_layout(processes, threads, lazy, loadtest)
+            for processes, threads in options.layouts
+            for lazy in modes
+        ],
+    }
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--layouts",
+        type=_layouts,
+        default="1x128,2x64,4x32,8x16",
+        help="comma separated PROCESSESxTHREADS",
+    )
+    parser.add_argument(
+        "--lazy-apps",
+        action="store_true",
+        help="also run each layout with lazy-apps",
+    )
+    parser.add_argument(
+        "loadtest", nargs="*", help="app-loadtest arguments, after --"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> None:
+    """Run the benchmark and print the JSON report."""
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    json.dump(run(parse_args(argv)), sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
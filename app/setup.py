@@ -13,6 +13,7 @@ install_reqs = [
     "faker",
     "flask",
     "flask_restful",
+    "orjson>=3.9",
     "psycopg2-binary",
     "sqlalchemy",
     "uwsgi",
@@ -31,16 +32,35 @@ tests_require = [
     "flake8-tidy-imports",
     "isort",
     "mypy",
+    "numpy",
     "pylint",
     "pytest",
     "pytest-cov",
     "pytest-postgresql",
     "pytest-randomly",
+    "pytest-xdist",
     "tox",
     "tox-pyenv",
     "yamllint",
 ]
 
+# synthetic data generation and benchmarking
+bench_require = [
+    "numpy",
+]
+
+# asyncio serving mode (app.asgi)
+asgi_require = [
+    "asyncpg",
+    "starlette",
+    "uvicorn",
+]
+
+# Parquet output for the statement job (app.statements)
+statements_require = [
+    "pyarrow",
+]
+
 setuptools.setup(
     name="app",
     packages=setuptools.find_namespace_packages(
@@ -55,7 +75,24 @@ setuptools.setup(
     author="Petal Card Inc.",
     install_requires=install_reqs,
     tests_require=tests_require,
-    extras_require={"test": tests_require},
-    entry_points={"loadtest.scenario": []},
+    extras_require={
+        "test": tests_require,
+        "bench": bench_require,
+        "asgi": asgi_require,
+        "statements": statements_require,
+    },
+    entry_points={
+        "console_scripts": [
+            "app-datagen = app.datagen:main",
+            "app-loadtest = app.loadtest.harness:main",
+            "app-partitions = app.partitions:main",
+            "app-statements = app.statements:main",
+        ],
+        "loadtest.scenario": [
+            "member-get = app.loadtest.scenarios:MemberGet",
+            "member-post = app.loadtest.scenarios:MemberPost",
+            "payments-get = app.loadtest.scenarios:PaymentsGet",
+        ],
+    },
     zip_safe=False,
 )